@@ -0,0 +1,321 @@
+# RU4590111 Daniel Elias de Souza
+
+# Agregações dos gráficos calculadas no DuckDB, com cache por (conjunto de dados, filtros, parâmetros)
+import threading
+
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache
+
+from query_engine import build_where, quote_identifier
+
+AGGREGATIONS = {"Soma": "sum", "Média": "avg", "Contagem": "count"}
+
+# Granularidade -> (unidade do date_trunc, rótulo do período a partir do seu início)
+PERIODS = {
+    "mensal": ("month", "strftime(inicio, '%Y-%m')"),
+    "trimestral": ("quarter", "CAST(year(inicio) AS VARCHAR) || '-T' || CAST(quarter(inicio) AS VARCHAR)"),
+}
+
+# Pontos enviados ao gráfico de dispersão; acima disso, uma amostra aleatória
+SCATTER_MAX_POINTS = 5_000
+
+# Filtros que os agregados gravados com o Parquet atendem (o ano é uma das dimensões)
+ROLLUP_FILTERS = {"anos"}
+
+_cache = LRUCache(maxsize=256)
+_cache_lock = threading.Lock()
+
+
+def _freeze(filtros):
+    """Estado dos filtros em forma imutável, para compor a chave do cache"""
+    return tuple(sorted(
+        (nome, tuple(valor) if isinstance(valor, (list, tuple)) else valor)
+        for nome, valor in filtros.items()
+    ))
+
+
+def _cached(key, compute):
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+    result = compute()
+    with _cache_lock:
+        _cache[key] = result
+    return result
+
+
+def _where_not_null(column, filtros):
+    """WHERE dos filtros acrescido de "coluna IS NOT NULL" (como value_counts/groupby do pandas)"""
+    where, params = build_where(**filtros)
+    condition = f"{quote_identifier(column)} IS NOT NULL"
+    where = f"{where} AND {condition}" if where else f"WHERE {condition}"
+    return where, params
+
+
+def _columns(conn, table_name):
+    return [col[0] for col in conn.execute(f"SELECT * FROM {quote_identifier(table_name)} LIMIT 0").description]
+
+
+def category_counts(conn, dataset_key, table_name, column, top_n, filtros):
+    """
+    Top N categorias de uma coluna com a contagem de cada uma, mais o número total
+    de categorias e de linhas (para percentuais), em uma única consulta.
+    Retorna (DataFrame categoria/contagem, total de categorias).
+    """
+    def compute():
+        where, params = _where_not_null(column, filtros)
+        df = conn.execute(f"""
+            WITH counts AS (
+                SELECT CAST({quote_identifier(column)} AS VARCHAR) AS categoria, count(*) AS contagem
+                FROM {quote_identifier(table_name)} {where}
+                GROUP BY 1
+            )
+            SELECT categoria, contagem, count(*) OVER () AS total_categorias
+            FROM counts
+            ORDER BY contagem DESC, categoria
+            LIMIT ?
+        """, params + [int(top_n)]).fetchdf()
+        total_categorias = int(df["total_categorias"].iloc[0]) if len(df) else 0
+        return df[["categoria", "contagem"]], total_categorias
+
+    key = (dataset_key, table_name, "category_counts", column, top_n, _freeze(filtros))
+    return _cached(key, compute)
+
+
+def category_counts_with_others(conn, dataset_key, table_name, column, limit, filtros):
+    """
+    As `limit` maiores categorias e, se houver mais, uma fatia "Outros" com a soma
+    das demais. Retorna DataFrame categoria/valor, na ordem das fatias.
+    """
+    def compute():
+        where, params = _where_not_null(column, filtros)
+        return conn.execute(f"""
+            WITH counts AS (
+                SELECT CAST({quote_identifier(column)} AS VARCHAR) AS categoria, count(*) AS contagem
+                FROM {quote_identifier(table_name)} {where}
+                GROUP BY 1
+            ),
+            ranked AS (
+                SELECT categoria, contagem,
+                       least(row_number() OVER (ORDER BY contagem DESC, categoria), ? + 1) AS grupo
+                FROM counts
+            )
+            SELECT CASE WHEN grupo <= ? THEN min(categoria) ELSE 'Outros' END AS categoria,
+                   CAST(sum(contagem) AS BIGINT) AS valor
+            FROM ranked
+            GROUP BY grupo
+            ORDER BY grupo
+        """, params + [int(limit), int(limit)]).fetchdf()
+
+    key = (dataset_key, table_name, "category_counts_with_others", column, limit, _freeze(filtros))
+    return _cached(key, compute)
+
+
+def yearly_series(conn, dataset_key, table_name, column, agg_func, filtros):
+    """
+    Série anual de uma coluna numérica (Soma, Média ou Contagem) com a variação
+    percentual em relação ao ano anterior ('Variação %', nula quando o anterior é 0).
+    """
+    def compute():
+        where, params = _where_not_null("Ano", filtros)
+        col = quote_identifier(column)
+        aggregate = AGGREGATIONS[agg_func]
+        value = f"coalesce(sum({col}), 0)" if aggregate == "sum" else f"{aggregate}({col})"
+        return conn.execute(f"""
+            WITH series AS (
+                SELECT "Ano", {value} AS valor
+                FROM {quote_identifier(table_name)} {where}
+                GROUP BY "Ano"
+            )
+            SELECT "Ano", valor AS {col},
+                   CASE WHEN lag(valor) OVER w <> 0
+                        THEN (valor - lag(valor) OVER w) / lag(valor) OVER w * 100 END AS "Variação %"
+            FROM series
+            WINDOW w AS (ORDER BY "Ano")
+            ORDER BY "Ano"
+        """, params).fetchdf()
+
+    key = (dataset_key, table_name, "yearly_series", column, agg_func, _freeze(filtros))
+    return _cached(key, compute)
+
+
+def periodic_series(conn, dataset_key, table_name, date_column, column, agg_func, granularidade,
+                    filtros, rollup_table=None):
+    """
+    Série mensal ou trimestral (chave de PERIODS) de uma coluna numérica pela coluna
+    de data, com a variação percentual em relação ao período anterior. Se houver
+    agregado gravado (rollup_table) e os filtros forem só de ano, a série sai dele,
+    sem ler as linhas; senão é calculada sobre a tabela.
+    """
+    unit, label = PERIODS[granularidade]
+    use_rollup = (rollup_table is not None and set(filtros) <= ROLLUP_FILTERS
+                  and f"{column}__soma" in _columns(conn, rollup_table))
+
+    def compute():
+        if use_rollup:
+            where, params = build_where(**filtros)
+            soma = quote_identifier(f"{column}__soma")
+            contagem = quote_identifier(f"{column}__contagem")
+            value = {
+                "sum": f"coalesce(sum({soma}), 0)",
+                "avg": f"sum({soma}) / nullif(sum({contagem}), 0)",
+                "count": f"CAST(sum({contagem}) AS BIGINT)",
+            }[AGGREGATIONS[agg_func]]
+            source = f'SELECT "Período" AS inicio, {value} AS valor FROM {quote_identifier(rollup_table)} {where}'
+        else:
+            where, params = _where_not_null(date_column, filtros)
+            col = quote_identifier(column)
+            aggregate = AGGREGATIONS[agg_func]
+            value = f"coalesce(sum({col}), 0)" if aggregate == "sum" else f"{aggregate}({col})"
+            source = (f"SELECT date_trunc('{unit}', {quote_identifier(date_column)}) AS inicio, {value} AS valor "
+                      f"FROM {quote_identifier(table_name)} {where}")
+        return conn.execute(f"""
+            WITH series AS ({source} GROUP BY 1)
+            SELECT {label} AS "Período", valor AS {quote_identifier(column)},
+                   CASE WHEN lag(valor) OVER w <> 0
+                        THEN (valor - lag(valor) OVER w) / lag(valor) OVER w * 100 END AS "Variação %"
+            FROM series
+            WINDOW w AS (ORDER BY inicio)
+            ORDER BY inicio
+        """, params).fetchdf()
+
+    key = (dataset_key, table_name, "periodic_series", date_column, column, agg_func, granularidade,
+           use_rollup, _freeze(filtros))
+    return _cached(key, compute)
+
+
+def histogram(conn, dataset_key, table_name, column, bins, filtros):
+    """
+    Histograma de uma coluna numérica com `bins` faixas de mesma largura entre o mínimo
+    e o máximo, calculado em uma consulta junto com as estatísticas básicas (os valores
+    filtrados são lidos uma vez). Retorna (DataFrame inicio/fim/contagem, estatísticas)
+    ou (None, None) se não houver valores; o tamanho do resultado não depende do
+    número de linhas.
+    """
+    def compute():
+        where, params = _where_not_null(column, filtros)
+        rows = conn.execute(f"""
+            WITH valores AS MATERIALIZED (
+                SELECT CAST({quote_identifier(column)} AS DOUBLE) AS v
+                FROM {quote_identifier(table_name)} {where}
+            ),
+            resumo AS (
+                SELECT count(*) AS n, avg(v) AS media, median(v) AS mediana,
+                       min(v) AS minimo, max(v) AS maximo
+                FROM valores
+            ),
+            contagens AS (
+                SELECT CASE WHEN r.maximo = r.minimo THEN 0
+                            ELSE least(CAST(floor((v - r.minimo) / (r.maximo - r.minimo) * ?) AS BIGINT), ? - 1)
+                       END AS faixa,
+                       count(*) AS contagem
+                FROM valores, resumo r
+                GROUP BY 1
+            )
+            SELECT faixa, contagem, n, media, mediana, minimo, maximo
+            FROM contagens, resumo
+            ORDER BY faixa
+        """, params + [int(bins), int(bins)]).fetchall()
+        if not rows:
+            return None, None
+
+        _, _, n, media, mediana, minimo, maximo = rows[0]
+        stats = {"n": n, "media": media, "mediana": mediana, "minimo": minimo, "maximo": maximo}
+        # Valor único: uma só faixa
+        num_bins = int(bins) if maximo > minimo else 1
+        edges = np.linspace(minimo, maximo, num_bins + 1)
+        counts = np.zeros(num_bins, dtype=np.int64)
+        for faixa, contagem, *_ in rows:
+            counts[faixa] = contagem
+        return pd.DataFrame({"inicio": edges[:-1], "fim": edges[1:], "contagem": counts}), stats
+
+    key = (dataset_key, table_name, "histogram", column, bins, _freeze(filtros))
+    return _cached(key, compute)
+
+
+# Quantis de describe() do pandas (interpolação linear, como quantile_cont)
+DESCRIBE_QUANTILES = (0.25, 0.5, 0.75)
+
+
+def describe_numeric(conn, dataset_key, table_name, columns, filtros):
+    """
+    Equivalente a describe() do pandas para colunas numéricas (contagem, média,
+    desvio padrão, mínimo, quartis e máximo), calculado em uma consulta no DuckDB.
+    Retorna DataFrame com as estatísticas nas linhas e as colunas nas colunas.
+    """
+    def compute():
+        where, params = build_where(**filtros)
+        quantiles = ", ".join(str(q) for q in DESCRIBE_QUANTILES)
+        select = []
+        for column in columns:
+            col = f"CAST({quote_identifier(column)} AS DOUBLE)"
+            select += [f"count({col})", f"avg({col})", f"stddev_samp({col})", f"min({col})",
+                       f"quantile_cont({col}, [{quantiles}])", f"max({col})"]
+        row = conn.execute(f"SELECT {', '.join(select)} FROM {quote_identifier(table_name)} {where}",
+                           params).fetchone()
+
+        index = ["count", "mean", "std", "min"] + [f"{q:.0%}" for q in DESCRIBE_QUANTILES] + ["max"]
+        data = {}
+        for i, column in enumerate(columns):
+            count, mean, std, minimum, quartis, maximum = row[i * 6:(i + 1) * 6]
+            quartis = quartis if quartis is not None else [None] * len(DESCRIBE_QUANTILES)
+            data[column] = [float(count), mean, std, minimum, *quartis, maximum]
+        return pd.DataFrame(data, index=index, dtype="float64")
+
+    key = (dataset_key, table_name, "describe_numeric", tuple(columns), _freeze(filtros))
+    return _cached(key, compute)
+
+
+def correlation_matrix(conn, dataset_key, table_name, columns, filtros):
+    """
+    Matriz de correlação de Pearson entre colunas numéricas, como corr() do pandas
+    (cada par usa as linhas em que os dois valores existem), calculada no DuckDB.
+    """
+    def compute():
+        where, params = build_where(**filtros)
+        pairs = [(a, b) for i, a in enumerate(columns) for b in columns[i:]]
+        select = ", ".join(
+            f"corr(CAST({quote_identifier(a)} AS DOUBLE), CAST({quote_identifier(b)} AS DOUBLE))"
+            for a, b in pairs
+        )
+        row = conn.execute(f"SELECT {select} FROM {quote_identifier(table_name)} {where}", params).fetchone()
+
+        matrix = pd.DataFrame(np.nan, index=list(columns), columns=list(columns))
+        for (a, b), value in zip(pairs, row):
+            value = np.nan if value is None else value
+            # Na diagonal, pandas dá 1 exato para colunas com variação
+            if a == b and not np.isnan(value):
+                value = 1.0
+            matrix.loc[a, b] = matrix.loc[b, a] = value
+        return matrix
+
+    key = (dataset_key, table_name, "correlation_matrix", tuple(columns), _freeze(filtros))
+    return _cached(key, compute)
+
+
+def scatter_sample(conn, dataset_key, table_name, x_col, y_col, color_col, max_points, filtros):
+    """
+    Pontos do gráfico de dispersão (linhas com X e Y não nulos): todos, se couberem
+    em max_points, ou uma amostra aleatória (reservatório, repetível) desse tamanho.
+    Retorna (DataFrame, total de pontos).
+    """
+    def compute():
+        where, params = _where_not_null(x_col, filtros)
+        where += f" AND {quote_identifier(y_col)} IS NOT NULL"
+        columns = [x_col, y_col] + ([color_col] if color_col is not None else [])
+        select = ", ".join(quote_identifier(col) for col in columns)
+        source = f"SELECT {select} FROM {quote_identifier(table_name)} {where}"
+        total = conn.execute(f"SELECT count(*) FROM ({source})", params).fetchone()[0]
+        if total > max_points:
+            # Amostra das linhas já filtradas (na mesma consulta, o DuckDB amostraria antes do WHERE)
+            source = f"SELECT * FROM ({source}) USING SAMPLE reservoir({int(max_points)} ROWS) REPEATABLE (42)"
+        return conn.execute(source, params).fetchdf(), total
+
+    key = (dataset_key, table_name, "scatter_sample", x_col, y_col, color_col, max_points, _freeze(filtros))
+    return _cached(key, compute)
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
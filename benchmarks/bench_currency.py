@@ -0,0 +1,69 @@
+# RU4590111 Daniel Elias de Souza
+
+"""
+Benchmark do conversor de valores monetários: função escalar (célula a célula)
+versus a versão vetorizada usada em convert_numeric_columns.
+
+Uso: python benchmarks/bench_currency.py [--rows 10000 1000000 10000000] [--skip-scalar-above N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import convert_brazilian_currency, convert_brazilian_currency_series
+
+
+def generate_currency_column(rows, seed=42):
+    """Gera uma coluna no formato do portal ("1.234,56"), com alguns "-", "N/A" e vazios"""
+    rng = np.random.default_rng(seed)
+    cents = rng.integers(0, 50_000_000, size=rows)
+    values = pd.Series(cents // 100).map('{:,}'.format).str.replace(',', '.', regex=False)
+    values = values + ',' + pd.Series(cents % 100).map('{:02d}'.format)
+    values = values.astype(object)
+    special = rng.random(rows)
+    values[special < 0.01] = '-'
+    values[(special >= 0.01) & (special < 0.015)] = 'N/A'
+    values[(special >= 0.015) & (special < 0.02)] = np.nan
+    prefixed = (special >= 0.02) & (special < 0.05)
+    values[prefixed] = 'R$ ' + values[prefixed]
+    return values
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do conversor de moeda brasileira")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument("--skip-scalar-above", type=int, default=1_000_000,
+                        help="Não mede a versão escalar acima deste número de linhas (muito lenta)")
+    args = parser.parse_args()
+
+    print(f"{'linhas':>12} {'escalar (s)':>12} {'vetorizado (s)':>15} {'linhas/s (vet.)':>16} {'ganho':>7}")
+    for rows in args.rows:
+        column = generate_currency_column(rows)
+
+        vectorized = time_call(convert_brazilian_currency_series, column)
+
+        if rows <= args.skip_scalar_above:
+            scalar = time_call(lambda col: [convert_brazilian_currency(v) for v in col], column)
+            scalar_str = f"{scalar:12.3f}"
+            speedup = f"{scalar / vectorized:6.1f}x"
+        else:
+            scalar_str = f"{'-':>12}"
+            speedup = f"{'-':>7}"
+
+        print(f"{rows:>12,} {scalar_str} {vectorized:15.3f} {rows / vectorized:16,.0f} {speedup}")
+
+
+if __name__ == "__main__":
+    main()
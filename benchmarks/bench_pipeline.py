@@ -0,0 +1,196 @@
+# RU4590111 Daniel Elias de Souza
+
+"""
+Benchmark das etapas do pipeline com dados sintéticos no formato do portal:
+conversão de moeda, renomeação e tipagem, gravação e carga (CSV e Parquet),
+cadeia de filtros do dashboard e cálculos dos gráficos. O resultado vai para um
+JSON (por commit), que pode ser comparado com o de outro commit.
+
+Uso: python benchmarks/bench_pipeline.py [--rows 10000 1000000 10000000] [--repeat 3]
+                                         [--output resultado.json] [--compare base.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import duckdb
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import aggregations
+import data_loader
+import storage
+from query_engine import fetch_filtered, fetch_page
+from schemas import EMPENHOS, apply_schema, rename_to_display
+from search_index import clear_cache as clear_search_cache, register_matches
+from synthetic import generate_portal_records
+from utils import convert_brazilian_currency, convert_brazilian_currency_series, convert_numeric_columns
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT_DIR, "benchmarks", "resultados")
+
+# Nome de um conjunto de dados real, para usar o esquema e os agregados dele
+DATASET = "despesacovid_dados.csv"
+TABLE = "despesacovid_dados"
+
+
+def measure(func, repeat, setup=None):
+    """Menor tempo de `repeat` execuções (setup roda antes de cada uma, fora da medição)"""
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecido"
+
+
+def bench_rows(rows, repeat, skip_scalar_above, data_dir):
+    """Tempos (segundos) de cada etapa para `rows` linhas"""
+    results = {}
+    raw = generate_portal_records(rows)
+
+    # Conversão e tipagem
+    if rows <= skip_scalar_above:
+        results["moeda_escalar"] = measure(
+            lambda: [convert_brazilian_currency(v) for v in raw["ValorPago"]], repeat)
+    results["moeda_vetorizada"] = measure(lambda: convert_brazilian_currency_series(raw["ValorPago"]), repeat)
+    results["rename_to_display"] = measure(lambda: rename_to_display(raw, EMPENHOS), repeat)
+    renamed = rename_to_display(raw, EMPENHOS)
+    results["convert_numeric_columns"] = measure(lambda: convert_numeric_columns(renamed.copy()), repeat)
+    results["apply_schema"] = measure(lambda: apply_schema(renamed, EMPENHOS), repeat)
+
+    # Gravação e carga: o CSV como os scrapers salvam, depois o Parquet tipado
+    storage.DATA_DIR = data_dir
+    for name in os.listdir(data_dir):
+        os.remove(os.path.join(data_dir, name))
+    renamed.to_csv(os.path.join(data_dir, DATASET), index=False)
+    results["load_dataset_csv"] = measure(lambda: data_loader.load_dataset(DATASET), repeat,
+                                          setup=data_loader.clear_cache)
+    results["write_parquet"] = measure(lambda: storage.write_parquet(renamed, DATASET), repeat)
+    results["load_dataset_parquet"] = measure(lambda: data_loader.load_dataset(DATASET), repeat,
+                                              setup=data_loader.clear_cache)
+    results["load_dataset_cache"] = measure(lambda: data_loader.load_dataset(DATASET), repeat)
+    df = data_loader.load_dataset(DATASET)
+    del raw, renamed
+
+    # Cadeia de filtros do dashboard: ano, busca (índice + DuckDB) e faixa numérica
+    conn = duckdb.connect()
+    data_loader.register_dataset(conn, TABLE, DATASET, df)
+    rollups = data_loader.register_rollups(conn, TABLE, DATASET)
+    dataset_key = data_loader.dataset_version(DATASET)
+    columns = list(df.columns)
+    text_columns = ["Modalidade", "Nome do Fornecedor", "Programa", "Unidade Orçamentária"]
+    filtros = {"anos": [2022, 2023], "busca": "saude", "colunas_busca": text_columns,
+               "faixa": ("Valor Pago", 1_000.0, 2_000_000.0)}
+
+    def filter_chain():
+        indexed = register_matches(conn, f"busca_{TABLE}", dataset_key, df, filtros["busca"], text_columns)
+        return fetch_filtered(conn, TABLE, columns, tabela_busca=f"busca_{TABLE}",
+                              colunas_indexadas=indexed, **filtros)
+
+    results["indice_busca"] = measure(filter_chain, 1, setup=clear_search_cache)
+    results["cadeia_filtros"] = measure(filter_chain, repeat)
+    indexed = register_matches(conn, f"busca_{TABLE}", dataset_key, df, filtros["busca"], text_columns)
+    filtros.update({"tabela_busca": f"busca_{TABLE}", "colunas_indexadas": indexed})
+    results["pagina_ordenada"] = measure(
+        lambda: fetch_page(conn, TABLE, columns, 100, 0, sort_column="Valor Pago", descending=True, **filtros),
+        repeat)
+    df_filtered = fetch_filtered(conn, TABLE, columns, **filtros)
+
+    # Gráficos em pandas sobre o resultado filtrado (a correlação ainda é feita assim)
+    numeric = df_filtered.select_dtypes(include=["number"]).columns
+    results["value_counts"] = measure(lambda: df_filtered["Modalidade"].value_counts().head(10), repeat)
+    results["groupby_ano"] = measure(lambda: df_filtered.groupby("Ano")["Valor Pago"].sum(), repeat)
+    results["corr"] = measure(lambda: df_filtered[numeric].corr(), repeat)
+
+    # Gráficos no DuckDB (sem o cache de aggregations)
+    sem_filtros = {"anos": [2022, 2023]}
+    charts = {
+        "category_counts": lambda: aggregations.category_counts(
+            conn, dataset_key, TABLE, "Modalidade", 10, filtros),
+        "yearly_series": lambda: aggregations.yearly_series(
+            conn, dataset_key, TABLE, "Valor Pago", "Soma", filtros),
+        "histogram": lambda: aggregations.histogram(conn, dataset_key, TABLE, "Valor Pago", 30, filtros),
+        "periodic_series": lambda: aggregations.periodic_series(
+            conn, dataset_key, TABLE, "Data do Empenho", "Valor Pago", "Soma", "mensal", sem_filtros),
+        "periodic_series_agregado": lambda: aggregations.periodic_series(
+            conn, dataset_key, TABLE, "Data do Empenho", "Valor Pago", "Soma", "mensal", sem_filtros,
+            rollup_table=rollups.get("mensal")),
+    }
+    for name, func in charts.items():
+        results[name] = measure(func, repeat, setup=aggregations.clear_cache)
+
+    conn.close()
+    data_loader.clear_cache()
+    return results
+
+
+def compare(current, base_path):
+    """Tabela com os tempos do commit base, os atuais e a razão atual/base"""
+    with open(base_path, encoding="utf-8") as f:
+        base = json.load(f)
+    print(f"\nComparação com {base['commit']} ({base_path}):")
+    print(f"{'linhas':>12} | {'etapa':<26} | {'base (s)':>10} | {'atual (s)':>10} | razão")
+    for rows, stages in current["resultados"].items():
+        for stage, elapsed in stages.items():
+            before = base["resultados"].get(rows, {}).get(stage)
+            if before:
+                print(f"{int(rows):>12,} | {stage:<26} | {before:>10.4f} | {elapsed:>10.4f} | {elapsed / before:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3, help="Execuções por etapa (vale a menor)")
+    parser.add_argument("--skip-scalar-above", type=int, default=1_000_000,
+                        help="Não mede a conversão escalar de moeda acima deste número de linhas")
+    parser.add_argument("--output", help="Arquivo JSON do resultado (padrão: benchmarks/resultados/pipeline_<commit>.json)")
+    parser.add_argument("--compare", help="JSON de outro commit para comparar")
+    args = parser.parse_args()
+
+    commit = current_commit()
+    report = {
+        "commit": commit,
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "repeticoes": args.repeat,
+        "resultados": {},
+    }
+    with tempfile.TemporaryDirectory() as data_dir:
+        for rows in args.rows:
+            print(f"\n{rows:>12,} linhas")
+            results = bench_rows(rows, args.repeat, args.skip_scalar_above, data_dir)
+            for stage, elapsed in results.items():
+                print(f"{stage:>28}: {elapsed:9.4f}s")
+            report["resultados"][str(rows)] = results
+
+    output = args.output or os.path.join(RESULTS_DIR, f"pipeline_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nResultado salvo em: {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
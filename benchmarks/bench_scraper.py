@@ -0,0 +1,155 @@
+# RU4590111 Daniel Elias de Souza
+
+"""
+Benchmark de carga dos scrapers contra o servidor simulado (mock_portal): para cada
+número de páginas em paralelo, coleta uma visão da Prefeitura e mede páginas/s,
+retentativas, erros, limite final de conexões (ajuste adaptativo), tamanho de página
+escolhido pela sondagem e tempo total.
+Também mede a coleta da Câmara.
+
+Uso: python benchmarks/bench_scraper.py [--workers 1 2 4 8] [--anos 2020 2021]
+                                        [--rows-per-year 10000] [--latency 0.05] [--p524 0.01]
+                                        [--row-latency 0.00002] [--max-page-size 2000]
+                                        [--output resultado.json]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import requests
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mock_portal import MockPortal
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT_DIR, "benchmarks", "resultados")
+
+VISAO = {
+    "chave_modulo": "despesa_covid",
+    "nome_visao": "despesacovid",
+    "periodicidade": "ANUAL",
+    "ordenacao": [{"ColunaOrdem": "NroEmpenho", "Ordem": 1}],
+}
+
+
+def clear_dir(path):
+    for name in os.listdir(path):
+        full = os.path.join(path, name)
+        shutil.rmtree(full) if os.path.isdir(full) else os.remove(full)
+
+
+def run(func, verbose):
+    """Executa a coleta (sem as mensagens de progresso, a menos que verbose); retorna (resultado, segundos)"""
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    start = time.perf_counter()
+    with output:
+        result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--anos", type=int, nargs="+", default=[2020, 2021])
+    parser.add_argument("--rows-per-year", type=int, default=10_000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.5)
+    parser.add_argument("--p524", type=float, default=0.01)
+    parser.add_argument("--p-error", type=float, default=0.0)
+    parser.add_argument("--row-latency", type=float, default=0.00002)
+    parser.add_argument("--max-page-size", type=int, default=2000)
+    parser.add_argument("--verbose", action="store_true", help="Mostra as mensagens dos scrapers")
+    parser.add_argument("--output", help="Arquivo JSON do resultado (padrão: benchmarks/resultados/scraper_<commit>.json)")
+    args = parser.parse_args()
+
+    portal = MockPortal(args.rows_per_year, args.latency, args.jitter, args.p524, args.p_error,
+                        row_latency=args.row_latency, max_page_size=args.max_page_size)
+    prefeitura_url, camara_url = portal.start()
+    data_dir = tempfile.mkdtemp()
+
+    # config lê os endereços e a pasta de dados na importação: os scrapers são
+    # importados só depois de apontar tudo para o servidor simulado
+    os.environ.update({
+        "PREFEITURA_API_URL": prefeitura_url,
+        "CAMARA_API_URL": camara_url,
+        "DASHBOARD_DATA_DIR": data_dir,
+        # Teto do limite adaptativo de conexões: quem limita é o número de páginas em paralelo
+        "PREFEITURA_MAX_CONEXOES": str(max(args.workers)),
+    })
+    from bench_pipeline import current_commit
+    from scraping.camara_api import scrape_camara_despesas_2020_2023
+    from scraping.host_budget import host_limit, reset_limits
+    from scraping.page_size import remembered_size
+    from scraping.retry import reset_breakers
+    from scraping.universal_scraper import scrape_visao
+
+    commit = current_commit()
+    report = {
+        "commit": commit,
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "servidor": {"linhas_por_ano": args.rows_per_year, "latencia": args.latency, "jitter": args.jitter,
+                     "p524": args.p524, "p_erro": args.p_error, "latencia_por_linha": args.row_latency,
+                     "tamanho_maximo": args.max_page_size},
+        "prefeitura": {},
+    }
+
+    print(f"{'paralelo':>8} | {'páginas':>7} | {'páginas/s':>9} | {'retent.':>7} | {'524':>4} | {'500':>4} | "
+          f"{'limite':>6} | {'tam. pág.':>9} | {'coleta (s)':>10} | {'total (s)':>9} | linhas")
+    try:
+        for workers in args.workers:
+            clear_dir(data_dir)
+            portal.reset_stats()
+            reset_limits()
+            reset_breakers()
+            rows, elapsed = run(lambda: scrape_visao(**VISAO, anos=args.anos, max_workers=workers), args.verbose)
+            stats = portal.snapshot()
+            stats.update({
+                "linhas_salvas": rows,
+                "tempo_total": elapsed,
+                "paginas_por_segundo": stats["paginas"] / elapsed if elapsed else 0.0,
+                "limite_final": int(host_limit(prefeitura_url).limit),
+                "tamanho_pagina": remembered_size(VISAO["chave_modulo"]),
+            })
+            report["prefeitura"][str(workers)] = stats
+            print(f"{workers:>8} | {stats['paginas']:>7} | {stats['paginas_por_segundo']:>9.1f} | "
+                  f"{stats['retentativas']:>7} | {stats['erros_524']:>4} | {stats['erros_500']:>4} | "
+                  f"{stats['limite_final']:>6} | {stats['tamanho_pagina']:>9} | {stats['tempo_coleta']:>10.2f} | {elapsed:>9.2f} | {rows:,}")
+
+        # A Câmara segue a política de novas tentativas; um erro que persiste interrompe a coleta
+        portal.reset_stats()
+        reset_limits()
+        reset_breakers()
+        try:
+            _, elapsed = run(scrape_camara_despesas_2020_2023, args.verbose)
+            erro = None
+        except requests.exceptions.RequestException as e:
+            elapsed, erro = None, str(e)
+        report["camara"] = dict(portal.snapshot(), tempo_total=elapsed, erro=erro)
+        if erro:
+            print(f"\nCâmara: coleta interrompida ({erro})")
+        else:
+            print(f"\nCâmara: {report['camara']['paginas']} anos em {elapsed:.2f}s")
+    finally:
+        portal.stop()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"scraper_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nResultado salvo em: {output}")
+
+
+if __name__ == "__main__":
+    main()
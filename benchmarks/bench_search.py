@@ -0,0 +1,95 @@
+# RU4590111 Daniel Elias de Souza
+
+"""
+Benchmark da busca textual do dashboard: varredura com str.contains (como era feito)
+e no DuckDB versus o índice de trigramas de search_index.
+
+Uso: python benchmarks/bench_search.py [--rows 10000 1000000] [--queries saude "hosp*" ...]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from query_engine import fetch_filtered
+from search_index import clear_cache, column_index, register_matches, search_rows
+from synthetic import PALAVRAS
+
+
+def generate_text_frame(rows, seed=42):
+    """Colunas de texto no formato do portal, com a cardinalidade típica de cada uma"""
+    rng = np.random.default_rng(seed)
+
+    def vocabulary(size, words):
+        picks = rng.integers(0, len(PALAVRAS), size=(size, words))
+        return np.array([" ".join(PALAVRAS[i] for i in row) + f" {n}" for n, row in enumerate(picks)], dtype=object)
+
+    columns = {
+        "Nome do Fornecedor": vocabulary(50_000, 3),
+        "Programa": vocabulary(300, 3),
+        "Unidade Orçamentária": vocabulary(60, 2),
+        "Modalidade": np.array(["PREGÃO PRESENCIAL", "DISPENSADA", "CONVITE", "CONCORRÊNCIA",
+                                "INEXIGÍVEL", "Outros/Não Aplicavel"], dtype=object),
+    }
+    return pd.DataFrame({
+        name: values[rng.integers(0, len(values), size=rows)] for name, values in columns.items()
+    })
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def pandas_scan(df, query, columns):
+    """Busca como o dashboard fazia: str.contains em cada coluna, combinando as máscaras"""
+    mask = pd.Series(False, index=df.index)
+    for col in columns:
+        mask |= df[col].astype(str).str.contains(query, case=False, na=False)
+    return np.flatnonzero(mask.to_numpy())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 1_000_000])
+    parser.add_argument("--queries", nargs="+", default=["saude", "hospital municipal", "assist*", "ltda 123"])
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        df = generate_text_frame(rows)
+        columns = list(df.columns)
+        dataset_key = ("bench", rows)
+        conn = duckdb.connect()
+        conn.register("dados", df)
+        clear_cache()
+
+        build_time, _ = time_call(lambda: [column_index(dataset_key, df, col) for col in columns])
+        print(f"\n{rows:>12,} linhas | índice construído em {build_time:.2f}s")
+        print(f"{'busca':>20} | {'pandas':>9} | {'duckdb':>9} | {'índice':>9} | {'índice+duckdb':>13} | linhas")
+        for query in args.queries:
+            pandas_time, _ = time_call(pandas_scan, df, query, columns)
+            scan_time, scanned = time_call(
+                lambda: fetch_filtered(conn, "dados", ["Modalidade"], busca=query, colunas_busca=columns)
+            )
+            index_time, found = time_call(search_rows, dataset_key, df, query, columns)
+
+            def indexed_query():
+                indexed = register_matches(conn, "busca_dados", dataset_key, df, query, columns)
+                return fetch_filtered(conn, "dados", ["Modalidade"], busca=query, colunas_busca=columns,
+                                      tabela_busca="busca_dados", colunas_indexadas=indexed)
+
+            combined_time, combined = time_call(indexed_query)
+            assert len(found) == len(scanned) == len(combined)
+            print(f"{query:>20} | {pandas_time:>8.3f}s | {scan_time:>8.3f}s | {index_time:>8.3f}s | "
+                  f"{combined_time:>12.3f}s | {len(found):,}")
+
+
+if __name__ == "__main__":
+    main()
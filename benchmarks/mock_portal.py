@@ -0,0 +1,226 @@
+# RU4590111 Daniel Elias de Souza
+
+"""
+Servidor local que simula as duas APIs coletadas, para medir e ajustar os scrapers
+sem acessar os servidores reais:
+
+- portal da Prefeitura: POST /paiportalserver/modulovisao/filter, com paginação
+  (Pagina, QuantidadeRegistros -> Valores, QuantidadePaginas, QuantidadeRegistros)
+- API da Câmara (GeoSIAP): GET .../detalhamento_despesas?ano=...
+
+Latência (fixa por requisição e por linha da página), erros 524 (tempo esgotado,
+como no portal, também para páginas acima de um tamanho máximo) e outros erros são
+configuráveis.
+
+Uso: python benchmarks/mock_portal.py [--port 8765] [--latency 0.05] [--p524 0.02]
+Depois: PREFEITURA_API_URL=... CAMARA_API_URL=... python run_scraping.py
+"""
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from synthetic import generate_portal_records
+
+PREFEITURA_PATH = "/paiportalserver/modulovisao/filter"
+CAMARA_PATH = "/portal-transparencia/api/default/execucao/detalhamento_despesas/detalhamento_despesas"
+
+_MESES = ["jan", "fev", "mar", "abr", "mai", "jun", "jul", "ago", "set", "out", "nov", "dez"]
+_FASES = ["emp", "liq", "pag"]
+
+
+class MockPortal:
+    """
+    Estado do servidor simulado: configuração das falhas, dados gerados por
+    (visão, ano) e contadores das requisições recebidas
+    """
+
+    def __init__(self, rows_per_year=10_000, latency=0.05, jitter=0.5, p524=0.0, p_error=0.0,
+                 camara_rows=28, seed=42, row_latency=0.0, max_page_size=None):
+        self.rows_per_year = rows_per_year
+        self.latency = latency
+        self.jitter = jitter
+        self.p524 = p524
+        self.p_error = p_error
+        self.row_latency = row_latency
+        self.max_page_size = max_page_size
+        self.camara_rows = camara_rows
+        self.seed = seed
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._data = {}
+        self._server = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"requisicoes": 0, "erros_524": 0, "erros_500": 0, "paginas": 0, "linhas": 0}
+            self._requested = set()
+            self._first = self._last = None
+
+    def snapshot(self):
+        """Contadores atuais; retentativas = requisições além da primeira de cada página"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["retentativas"] = stats["requisicoes"] - len(self._requested)
+            stats["tempo_coleta"] = (self._last - self._first) if self._first is not None else 0.0
+        return stats
+
+    def _visao_records(self, nome_visao, ano):
+        key = (nome_visao, ano)
+        with self._lock:
+            if key not in self._data:
+                df = generate_portal_records(self.rows_per_year, seed=self.seed + ano)
+                df["Ano"] = str(ano)
+                self._data[key] = df
+            return self._data[key]
+
+    def _camara_records(self, ano):
+        rng = np.random.default_rng(self.seed + ano)
+        rows = []
+        for i in range(self.camara_rows):
+            row = {"natureza": f"3.3.90.{i:02d} - NATUREZA {i}", "elemento": f"{i:02d}.00 - ELEMENTO {i}"}
+            mensal = {f"vl_{mes}_{fase}": round(float(rng.uniform(0, 100_000)), 2)
+                      for fase in _FASES for mes in _MESES}
+            row.update(mensal)
+            for fase in _FASES:
+                row[f"vl_total_{fase}"] = round(sum(mensal[f"vl_{mes}_{fase}"] for mes in _MESES), 2)
+            row["vl_previsto"] = round(row["vl_total_emp"] * 1.1, 2)
+            rows.append(row)
+        return rows
+
+    def _begin(self, key, rows=0, timeout=False):
+        """
+        Registra a requisição, espera a latência (mais row_latency por linha) e sorteia
+        a falha ("524", "500" ou None); timeout força o 524
+        """
+        with self._lock:
+            now = time.perf_counter()
+            self._first = now if self._first is None else self._first
+            self.stats["requisicoes"] += 1
+            self._requested.add(key)
+            delay = self.latency * (1 + self.jitter * self._random.uniform(-1, 1)) + self.row_latency * rows
+            draw = self._random.random()
+        time.sleep(max(delay, 0))
+        if timeout or draw < self.p524:
+            failure = "524"
+        elif draw < self.p524 + self.p_error:
+            failure = "500"
+        else:
+            failure = None
+        with self._lock:
+            if failure:
+                self.stats[f"erros_{failure}"] += 1
+            self._last = time.perf_counter()
+        return failure
+
+    def handle_filter(self, body):
+        """Página de uma visão do portal da Prefeitura"""
+        nome_visao, ano, pagina = body["NomeVisao"], int(body["Exercicio"]), int(body["Pagina"])
+        size = int(body["QuantidadeRegistros"])
+        df = self._visao_records(nome_visao, ano)
+        start = (pagina - 1) * size
+        too_large = self.max_page_size is not None and size > self.max_page_size
+        failure = self._begin((nome_visao, ano, size, pagina), max(0, min(size, len(df) - start)), too_large)
+        if failure:
+            return int(failure), None
+
+        valores = df.iloc[start:start + size].to_dict("records")
+        with self._lock:
+            self.stats["paginas"] += 1
+            self.stats["linhas"] += len(valores)
+        return 200, {
+            "Valores": valores,
+            "QuantidadePaginas": math.ceil(len(df) / size),
+            "QuantidadeRegistros": len(df),
+        }
+
+    def handle_camara(self, query):
+        """Despesas de um ano da Câmara (sem paginação)"""
+        ano = int(query["ano"][0])
+        failure = self._begin(("camara", ano))
+        if failure:
+            return int(failure), None
+
+        rows = self._camara_records(ano)
+        with self._lock:
+            self.stats["paginas"] += 1
+            self.stats["linhas"] += len(rows)
+        return 200, {"detalhamento_despesas": rows}
+
+    def start(self, host="127.0.0.1", port=0):
+        """Sobe o servidor em uma thread; retorna (URL da Prefeitura, URL da Câmara)"""
+        portal = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode() if payload is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                if urlparse(self.path).path != PREFEITURA_PATH:
+                    return self._reply(404, None)
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                self._reply(*portal.handle_filter(body))
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != CAMARA_PATH:
+                    return self._reply(404, None)
+                self._reply(*portal.handle_camara(parse_qs(url.query)))
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        base = f"http://{host}:{self._server.server_port}"
+        return base + PREFEITURA_PATH, base + CAMARA_PATH
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rows-per-year", type=int, default=10_000, help="Linhas de cada visão por ano")
+    parser.add_argument("--latency", type=float, default=0.05, help="Latência média por requisição (s)")
+    parser.add_argument("--jitter", type=float, default=0.5, help="Variação da latência (fração da média)")
+    parser.add_argument("--p524", type=float, default=0.0, help="Probabilidade de erro 524")
+    parser.add_argument("--p-error", type=float, default=0.0, help="Probabilidade de erro 500")
+    parser.add_argument("--row-latency", type=float, default=0.0, help="Latência adicional por linha da página (s)")
+    parser.add_argument("--max-page-size", type=int, help="Páginas maiores que isso dão erro 524")
+    args = parser.parse_args()
+
+    portal = MockPortal(args.rows_per_year, args.latency, args.jitter, args.p524, args.p_error,
+                        row_latency=args.row_latency, max_page_size=args.max_page_size)
+    prefeitura_url, camara_url = portal.start(port=args.port)
+    print(f"PREFEITURA_API_URL={prefeitura_url}")
+    print(f"CAMARA_API_URL={camara_url}")
+    print("Ctrl+C para encerrar")
+    try:
+        while True:
+            time.sleep(5)
+    except KeyboardInterrupt:
+        print(f"\n{portal.snapshot()}")
+        portal.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# RU4590111 Daniel Elias de Souza
+
+"""
+Gerador de dados sintéticos no formato do portal da Prefeitura: os mesmos campos
+(nomes da API) e formatos que scrape_visao recebe, como valores em "1.234,56",
+datas em "16/07/2020 00:00" e textos com espaços de preenchimento.
+"""
+
+import numpy as np
+import pandas as pd
+
+from bench_currency import generate_currency_column
+
+PALAVRAS = ["SAÚDE", "EDUCAÇÃO", "HOSPITAL", "MUNICIPAL", "SECRETARIA", "ASSISTÊNCIA", "OBRAS",
+            "MANUTENÇÃO", "TRANSPORTE", "ESCOLAR", "LIMPEZA", "URBANA", "ILUMINAÇÃO", "PÚBLICA",
+            "FUNDO", "SERVIÇOS", "MATERIAL", "CONSUMO", "COMÉRCIO", "LTDA", "MARÍLIA", "ASSOCIAÇÃO"]
+
+# O portal completa a modalidade com espaços até 50 caracteres
+MODALIDADES = [m.ljust(50) for m in ["PREGÃO PRESENCIAL", "DISPENSA", "CONVITE", "CONCORRÊNCIA",
+                                      "INEXIGÍVEL", "Outros/Não Aplicavel"]]
+
+ANOS = range(2020, 2026)
+
+
+def _vocabulary(rng, size, words, prefix=""):
+    """`size` textos distintos com `words` palavras de PALAVRAS cada"""
+    picks = rng.integers(0, len(PALAVRAS), size=(size, words))
+    return np.array([prefix.format(n) + " ".join(PALAVRAS[i] for i in row) for n, row in enumerate(picks)],
+                    dtype=object)
+
+
+def generate_portal_records(rows, seed=42):
+    """
+    DataFrame com `rows` empenhos como chegam da API (colunas com os nomes de origem,
+    tudo como texto), com a cardinalidade típica de cada campo
+    """
+    rng = np.random.default_rng(seed)
+
+    def pick(values):
+        return values[rng.integers(0, len(values), size=rows)]
+
+    # Datas sorteadas de um calendário pronto: formatar milhões de datas é lento
+    calendar = pd.date_range(f"{ANOS[0]}-01-01", f"{ANOS[-1]}-12-31", freq="D")
+    days = rng.integers(0, len(calendar), size=rows)
+    ids = np.arange(1, rows + 1)
+
+    return pd.DataFrame({
+        "NroEmpenho": ids.astype(str),
+        "UG": pick(np.array(["PREFEITURA MUNICIPAL DE MARÍLIA", "FUNDO MUNICIPAL DE SAÚDE"], dtype=object)),
+        "Modalidade": pick(np.array(MODALIDADES, dtype=object)),
+        "NomeFornecedor": pick(_vocabulary(rng, 50_000, 3)),
+        "DataEmp": calendar.strftime("%d/%m/%Y 00:00").to_numpy(dtype=object)[days],
+        "ValorEmpenhado": generate_currency_column(rows, seed=seed).to_numpy(),
+        "ValorLiquidado": generate_currency_column(rows, seed=seed + 1).to_numpy(),
+        "ValorPago": generate_currency_column(rows, seed=seed + 2).to_numpy(),
+        "Programa": pick(_vocabulary(rng, 300, 3, prefix="{:03d} - ")),
+        "UnidadeOrcamentaria": pick(_vocabulary(rng, 60, 2, prefix="02.{:02d}.00 - ")),
+        "ID": (ids + 600_000).astype(str),
+        "Id": pd.Series(ids).map("{:032x}".format).to_numpy(),
+        "Ano": calendar.year.to_numpy()[days].astype(str),
+    })
@@ -1,6 +1,41 @@
 # RU4590111 Daniel Elias de Souza
 
 import os
+from urllib.parse import urlparse
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(BASE_DIR, "data")
+# Pasta dos dados; pode ser trocada (ex.: benchmarks/bench_scraper.py usa uma temporária)
+DATA_DIR = os.environ.get("DASHBOARD_DATA_DIR", os.path.join(BASE_DIR, "data"))
+
+# Endereços das APIs; podem apontar para o servidor simulado de benchmarks/mock_portal.py
+PREFEITURA_API_URL = os.environ.get(
+    "PREFEITURA_API_URL", "https://transparencia.marilia.sp.gov.br/paiportalserver/modulovisao/filter")
+CAMARA_API_URL = os.environ.get(
+    "CAMARA_API_URL",
+    "https://cmmarilia.geosiap.net.br/portal-transparencia/api/default/execucao/detalhamento_despesas/detalhamento_despesas")
+
+# Número máximo de páginas buscadas em paralelo por visão no portal da Prefeitura
+SCRAPER_MAX_WORKERS = int(os.environ.get("SCRAPER_MAX_WORKERS", "4"))
+
+# Número máximo de tarefas (conjunto de dados, ano) executadas em paralelo por run_scraping.py
+SCRAPER_MAX_JOBS = int(os.environ.get("SCRAPER_MAX_JOBS", "6"))
+
+# Limite global de conexões simultâneas por servidor, somando todos os scrapers em execução.
+# É o teto: scraping/host_budget ajusta o limite efetivo conforme as respostas do servidor.
+# A Prefeitura vem por último: se as duas URLs apontarem para o mesmo servidor (simulado),
+# vale o limite dela.
+HOST_CONCURRENCY = {
+    urlparse(CAMARA_API_URL).hostname: int(os.environ.get("CAMARA_MAX_CONEXOES", "2")),
+    urlparse(PREFEITURA_API_URL).hostname: int(os.environ.get("PREFEITURA_MAX_CONEXOES", "4")),
+}
+
+# Cache em disco das respostas dos portais (DATA_DIR/cache_http), desligado por padrão.
+# Também pode ser ligado com run_scraping.py --cache. Exercícios fechados não expiram;
+# os demais valem por SCRAPER_CACHE_TTL_HORAS.
+SCRAPER_CACHE = os.environ.get("SCRAPER_CACHE", "0") == "1"
+SCRAPER_CACHE_TTL_HORAS = float(os.environ.get("SCRAPER_CACHE_TTL_HORAS", "24"))
+SCRAPER_CACHE_MAX_MB = int(os.environ.get("SCRAPER_CACHE_MAX_MB", "1024"))
+
+# Perfil de desempenho do dashboard (tempo e memória de cada seção), desligado por
+# padrão; também pode ser ligado por sessão com ?perfil=1 na URL
+DASHBOARD_PROFILE = os.environ.get("DASHBOARD_PROFILE", "0") == "1"
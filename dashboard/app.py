@@ -7,30 +7,65 @@ import os
 import duckdb
 import altair as alt
 import sys
+from functools import partial
 import matplotlib  # Garantir que matplotlib seja importado para estilização
 
 # Adicionar diretório pai ao caminho para importar config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import DATA_DIR
-from utils import rename_columns, convert_numeric_columns
+from config import DASHBOARD_PROFILE, DATA_DIR
+from schemas import get_rollup_spec
+from data_loader import load_dataset, get_cache_stats, register_dataset, register_rollups, dataset_version
+from query_engine import column_range, count_filtered, distinct_values, fetch_filtered, fetch_page, filtered_query
+from search_index import register_matches
+from exports import EXPORT_FORMATS, XLSX_MAX_ROWS, export_query
+from aggregations import (SCATTER_MAX_POINTS, category_counts, category_counts_with_others, correlation_matrix,
+                          describe_numeric, histogram, periodic_series, scatter_sample, yearly_series)
+from profiling import NullProfiler, RerunProfiler, add_to_history, aggregate, last_rerun_rows, to_json
 
 st.set_page_config(page_title="Dashboard Marília", layout="wide")
 st.title("📊 Dashboard de Dados Públicos de Marília")
 
+# Cache por sessão (o cache por processo fica em data_loader)
+if "dataset_cache" not in st.session_state:
+    st.session_state["dataset_cache"] = {}
+
+# Perfil de desempenho (opcional): DASHBOARD_PROFILE=1 ou ?perfil=1 na URL.
+# O cProfile é ligado só na execução seguinte ao clique no painel
+if DASHBOARD_PROFILE or st.query_params.get("perfil") == "1":
+    perf = RerunProfiler(cprofile=st.session_state.pop("perfil_cprofile", False))
+else:
+    perf = NullProfiler()
+# Gráficos passam por aqui para que o tempo de renderização do Altair seja medido
+altair_chart = perf.wrap(st.altair_chart, "Renderização (Altair)")
+
 def load_csv(name):
-    path = os.path.join(DATA_DIR, name)
-    if os.path.exists(path):
-        df = pd.read_csv(path)
-        # Determina o tipo do dataset e renomeia colunas
-        dataset_type = get_dataset_type(name)
-        df = rename_columns(df, dataset_type)
-        # Converte colunas numéricas automaticamente
-        df = convert_numeric_columns(df)
-        return df
-    return None
+    return load_dataset(name, session_cache=st.session_state["dataset_cache"])
+
+def render_profile_panel(perf):
+    """Painel na barra lateral: seções desta execução, média da sessão, JSON e cProfile"""
+    record = perf.finish()
+    history = st.session_state.setdefault("perfil_execucoes", [])
+    add_to_history(history, record)
+
+    with st.sidebar.expander("⏱️ Perfil de Desempenho", expanded=True):
+        st.write(f"Esta execução: {record['total'] * 1000:,.0f} ms")
+        st.dataframe(last_rerun_rows(record), hide_index=True)
+        st.write(f"Média das últimas {len(history)} execuções:")
+        st.dataframe(aggregate(history), hide_index=True)
+        st.download_button("📥 Baixar Perfil (JSON)", data=to_json(history),
+                           file_name="perfil_dashboard.json", mime="application/json", on_click="ignore")
+        st.button("Perfilar a próxima execução (cProfile)",
+                  on_click=lambda: st.session_state.update(perfil_cprofile=True))
+        if st.button("Limpar histórico"):
+            history.clear()
+        if "cprofile" in record:
+            st.code(record["cprofile"])
+            st.download_button("📥 Baixar cProfile (.prof)", data=record["cprofile_dump"],
+                               file_name="dashboard.prof", mime="application/octet-stream", on_click="ignore")
 
 datasets = {
     "Despesas da Câmara (2020-2023)": "camara_despesas_2020_2023.csv",
+    "Despesas da Câmara por Mês (2020-2023)": "camara_despesas_mensal_2020_2023.parquet",
     "Receita Analítica da Prefeitura": "ReceitaAnalitica_dados.csv",
     "Despesas COVID da Prefeitura": "despesacovid_dados.csv",
     "Passagens da Prefeitura": "passagenslocomocao_dados.csv",
@@ -38,26 +73,26 @@ datasets = {
     "Emendas Parlamentares da Prefeitura": "EmendasParlamentares_dados.csv"
 }
 
-# Determina o tipo do dataset para renomear colunas
-def get_dataset_type(filename):
-    if 'camara' in filename:
-        return 'camara'
-    elif 'covid' in filename:
-        return 'covid'
-    elif 'passagens' in filename:
-        return 'passagens'
-    elif 'investimentos' in filename:
-        return 'investimentos'
-    return 'unknown'
-
 # Criar conexão DuckDB e registrar tabelas
 conn = duckdb.connect(database=':memory:', read_only=False)
 
+available_tables = []
+rollup_views = {}
+# DataFrames registrados com conn.register: as exportações (em um cursor) os registram de novo
+registered_frames = {}
 for label, file in datasets.items():
-    df = load_csv(file)
+    with perf.section("Carga dos conjuntos"):
+        df = load_csv(file)
     if df is not None:
-        table_name = file.replace('.csv', '').replace('-', '_').replace(' ', '_').lower()
-        conn.register(table_name, df)
+        table_name = os.path.splitext(file)[0].replace('-', '_').replace(' ', '_').lower()
+        with perf.section("Registro no DuckDB"):
+            # Parquet é lido diretamente pelo DuckDB; CSV é registrado a partir do DataFrame
+            frame = register_dataset(conn, table_name, file, df)
+            if frame is not None:
+                registered_frames[table_name] = frame
+            # Agregados mensais/trimestrais gravados junto com o Parquet (aba Temporal)
+            rollup_views[table_name] = register_rollups(conn, table_name, file)
+        available_tables.append(table_name)
 
 # Barra lateral para controles
 st.sidebar.header("🎛️ Controles")
@@ -70,9 +105,21 @@ selected_dataset = st.sidebar.selectbox(
 )
 
 # Carregar conjunto de dados selecionado
-df = load_csv(datasets[selected_dataset])
-
-table_name = datasets[selected_dataset].replace('.csv', '').replace('-', '_').replace(' ', '_').lower()
+with perf.section("Carga dos conjuntos"):
+    df = load_csv(datasets[selected_dataset])
+
+# Contadores do cache de dados
+with st.sidebar.expander("⚙️ Cache de Dados"):
+    cache_stats = get_cache_stats()
+    st.write(f"Hits (sessão): {cache_stats['hits_sessao']}")
+    st.write(f"Hits (processo): {cache_stats['hits_processo']}")
+    st.write(f"Misses: {cache_stats['misses']}")
+    st.write(f"Tempo total de carga: {cache_stats['tempo_total_carga']:.2f}s")
+    st.write(f"Memória dos dados em cache: {sum(cache_stats['memoria'].values()) / 1e6:.1f} MB")
+
+table_name = os.path.splitext(datasets[selected_dataset])[0].replace('-', '_').replace(' ', '_').lower()
+# Versão do arquivo: compõe a chave do cache das agregações dos gráficos
+dataset_key = dataset_version(datasets[selected_dataset])
 
 if df is not None:
     st.header(f"📋 {selected_dataset}")
@@ -103,91 +150,136 @@ if df is not None:
         selected_columns = df.columns.tolist()[:1]
 
     # Opções de filtragem
+    perf.begin("Filtros")
     st.subheader("🎯 Filtros")
 
-    # Sempre começar com df_filtered baseado apenas nas colunas selecionadas
-    # Todas as métricas e gráficos devem usar apenas df_filtered
-    df_filtered = df[selected_columns].copy()
+    # Os filtros são acumulados em um dicionário e aplicados de uma vez pelo DuckDB.
+    # Métricas, tabela e gráficos consultam o DuckDB com esses filtros; as linhas
+    # filtradas não são trazidas inteiras para o pandas
+    filtros = {}
 
     # Filtro de ano (apenas se 'Ano' estiver nas colunas selecionadas)
-    if 'Ano' in df_filtered.columns:
-        years = sorted(df_filtered['Ano'].unique())
+    if 'Ano' in selected_columns:
+        years = distinct_values(conn, table_name, 'Ano')
         selected_years = st.multiselect("Selecionar Anos:", years, default=years)
         if selected_years:
-            # Filtrar o dataframe já filtrado
-            df_filtered = df_filtered[df_filtered['Ano'].isin(selected_years)]
+            filtros["anos"] = selected_years
     else:
         # Se 'Ano' não está nas colunas selecionadas, mostrar aviso
         if 'Ano' in df.columns:
             st.info("💡 Para filtrar por ano, inclua a coluna 'Ano' na seleção acima.")
 
     # Filtro de busca de texto (apenas em colunas de texto selecionadas)
-    search_term = st.text_input("Buscar em colunas de texto:")
+    search_term = st.text_input(
+        "Buscar em colunas de texto:",
+        help="Sem diferenciar maiúsculas e acentos. Vários termos: todos precisam aparecer. "
+             "Termo terminado em * busca pelo início das palavras (ex.: hosp*)."
+    )
     if search_term:
-        text_columns = df_filtered.select_dtypes(include=['object']).columns
+        text_columns = list(df[selected_columns].select_dtypes(include=['object', 'category']).columns)
         if len(text_columns) > 0:
-            mask = pd.Series(False, index=df_filtered.index)
-            for col in text_columns:
-                mask |= df_filtered[col].astype(str).str.contains(search_term, case=False, na=False)
-            df_filtered = df_filtered[mask]
+            filtros["busca"] = search_term
+            filtros["colunas_busca"] = text_columns
+            # Valores que casam com cada termo, vindos do índice (construído na primeira busca)
+            search_table = f"busca_{table_name}"
+            indexed_columns = register_matches(conn, search_table, dataset_key, df, search_term, text_columns)
+            if indexed_columns:
+                filtros["tabela_busca"] = search_table
+                filtros["colunas_indexadas"] = indexed_columns
+                registered_frames[search_table] = conn.execute(f"SELECT * FROM {search_table}").arrow()
         else:
             st.info("💡 Para busca de texto, inclua colunas de texto na seleção acima.")
 
     # Filtros numéricos (apenas em colunas numéricas selecionadas)
-    numeric_columns = df_filtered.select_dtypes(include=['number']).columns
+    numeric_columns = df[selected_columns].select_dtypes(include=['number']).columns
     if len(numeric_columns) > 0:
         filter_col = st.selectbox("Filtrar por coluna numérica:", ["Nenhuma"] + list(numeric_columns))
-        if filter_col != "Nenhuma" and filter_col in df_filtered.columns:
-            min_val = float(df_filtered[filter_col].min())
-            max_val = float(df_filtered[filter_col].max())
-            value_range = st.slider(
-                f"Faixa para {filter_col}:",
-                min_val, max_val,
-                (min_val, max_val)
-            )
-            df_filtered = df_filtered[
-                (df_filtered[filter_col] >= value_range[0]) &
-                (df_filtered[filter_col] <= value_range[1])
-            ]
+        if filter_col != "Nenhuma":
+            # Faixa calculada já com os filtros de ano e texto aplicados
+            min_val, max_val = column_range(conn, table_name, filter_col, **filtros)
+            if min_val is not None:
+                min_val, max_val = float(min_val), float(max_val)
+                value_range = st.slider(
+                    f"Faixa para {filter_col}:",
+                    min_val, max_val,
+                    (min_val, max_val)
+                )
+                filtros["faixa"] = (filter_col, value_range[0], value_range[1])
     else:
         st.info("💡 Para filtros numéricos, inclua colunas numéricas na seleção acima.")
 
+    # Colunas selecionadas do conjunto completo: usadas só pelos tipos (os mesmos das linhas filtradas)
+    df_selected = df[selected_columns]
+
+    with perf.section("Consulta filtrada (DuckDB)"):
+        total_rows = count_filtered(conn, table_name, selected_columns, **filtros)
+    perf.begin("Tabela de dados")
+
     # Informações atualizadas após filtros
     st.subheader("📊 Dados Filtrados")
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Linhas Filtradas", len(df_filtered))
+        st.metric("Linhas Filtradas", total_rows)
     with col2:
-        st.metric("Colunas Selecionadas", len(df_filtered.columns))
+        st.metric("Colunas Selecionadas", len(selected_columns))
     with col3:
         # Só mostra anos filtrados se 'Ano' estiver presente
-        if 'Ano' in df_filtered.columns and len(df_filtered) > 0:
-            anos_filtrados = len(df_filtered['Ano'].unique()) if not df_filtered['Ano'].isna().all() else 0
+        if 'Ano' in selected_columns and total_rows > 0:
+            anos_filtrados = count_filtered(conn, table_name, selected_columns, distinct='Ano', **filtros)
             st.metric("Anos Filtrados", anos_filtrados)
 
     # Exibir dados filtrados
+    # Só a página visível é buscada (e ordenada) no DuckDB e enviada ao navegador
     st.subheader("📊 Tabela de Dados")
-    st.dataframe(df_filtered, width='stretch')
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+    with col1:
+        sort_column = st.selectbox("Ordenar por:", ["(ordem original)"] + list(selected_columns), key="table_sort")
+    with col2:
+        sort_order = st.selectbox("Ordem:", ["Crescente", "Decrescente"], key="table_order")
+    with col3:
+        page_size = st.selectbox("Linhas por página:", [25, 50, 100, 500], index=1, key="table_page_size")
+    total_pages = max(1, -(-total_rows // page_size))
+    with col4:
+        # Sem key: volta à página 1 quando o número de páginas muda (novos filtros)
+        page = st.number_input(f"Página (de {total_pages}):", min_value=1, max_value=total_pages, value=1, step=1)
+
+    page_df = fetch_page(
+        conn, table_name, list(selected_columns), page_size, (page - 1) * page_size,
+        sort_column=None if sort_column == "(ordem original)" else sort_column,
+        descending=sort_order == "Decrescente", **filtros
+    )
+    page_df.index = range((page - 1) * page_size + 1, (page - 1) * page_size + len(page_df) + 1)
+    st.dataframe(page_df, width='stretch')
+    if total_rows > 0:
+        st.caption(f"Linhas {page_df.index[0]:,}–{page_df.index[-1]:,} de {total_rows:,}")
 
     # Estatísticas resumidas
     if st.checkbox("Mostrar Estatísticas Resumidas"):
         st.subheader("📈 Estatísticas Resumidas")
-        st.write(df_filtered.describe())
+        with perf.section("Estatísticas (describe)"):
+            describe_columns = list(df_selected.select_dtypes(include=['number']).columns)
+            if describe_columns:
+                # Calculadas no DuckDB, como describe() do pandas
+                st.write(describe_numeric(conn, dataset_key, table_name, describe_columns, filtros))
+            else:
+                # Só colunas de texto: describe() do pandas (contagem, distintos, moda)
+                st.write(fetch_filtered(conn, table_name, selected_columns, **filtros).describe())
 
     # Charts
     st.subheader("📊 Visualizações")
 
     # Verificar se há dados suficientes para visualizações
-    if len(df_filtered) == 0:
+    if total_rows == 0:
         st.warning("⚠️ Nenhum dado disponível após aplicação dos filtros.")
     else:
         # Criar abas para diferentes tipos de gráficos
         tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 Barras", "🥧 Pizza", "📈 Distribuição", "📉 Correlação", "📅 Temporal"])
 
         with tab1:
+            perf.begin("Aba Barras")
             st.markdown("**📊 Análise de Barras** - Distribuição de categorias")
-            # Só usa colunas categóricas presentes em df_filtered
-            categorical_cols = df_filtered.select_dtypes(include=['object']).columns
+            # Só usa colunas categóricas entre as selecionadas
+            categorical_cols = df_selected.select_dtypes(include=['object', 'category']).columns
             if len(categorical_cols) > 0:
                 col1, col2, col3 = st.columns([1.5, 1, 1])
                 with col1:
@@ -197,17 +289,16 @@ if df is not None:
                 with col3:
                     chart_type = st.selectbox("Tipo:", ["Horizontal", "Vertical", "Normalizado"], key="bar_type")
 
-                if chart_col and chart_col in df_filtered.columns:
-                    # Obter top N categorias apenas dos dados filtrados
-                    top_categories = df_filtered[chart_col].value_counts().head(top_n)
-                    if len(top_categories) > 0:
-                        chart_data = pd.DataFrame({
-                            'categoria': top_categories.index,
-                            'contagem': top_categories.values
-                        })
+                if chart_col and chart_col in selected_columns:
+                    # Top N categorias calculado no DuckDB com os mesmos filtros da tabela
+                    chart_data, total_categories = category_counts(
+                        conn, dataset_key, table_name, chart_col, top_n, filtros
+                    )
+                    if len(chart_data) > 0:
+                        chart_data = chart_data.copy()
 
                         # Calcular percentuais
-                        total = top_categories.sum()
+                        total = chart_data['contagem'].sum()
                         chart_data['percentual'] = (chart_data['contagem'] / total * 100).round(1)
 
                         if chart_type == "Horizontal":
@@ -241,18 +332,18 @@ if df is not None:
                                 tooltip=['categoria', 'contagem', 'percentual']
                             ).properties(height=400)
 
-                        st.altair_chart(chart, width='stretch')
+                        altair_chart(chart, width='stretch')
 
                         # Estatísticas resumidas baseadas apenas nos dados filtrados
                         col1, col2, col3, col4 = st.columns(4)
                         with col1:
-                            st.metric("Total de Categorias", len(df_filtered[chart_col].unique()))
+                            st.metric("Total de Categorias", total_categories)
                         with col2:
-                            st.metric("Top Categoria", top_categories.index[0])
+                            st.metric("Top Categoria", chart_data['categoria'].iloc[0])
                         with col3:
-                            st.metric("Contagem Top", int(top_categories.iloc[0]))
+                            st.metric("Contagem Top", int(chart_data['contagem'].iloc[0]))
                         with col4:
-                            top_percentage = (top_categories.iloc[0] / top_categories.sum()) * 100
+                            top_percentage = (chart_data['contagem'].iloc[0] / total) * 100
                             st.metric("Percentual Top", f"{top_percentage:.1f}%")
 
                         # Tabela de detalhamento
@@ -271,287 +362,298 @@ if df is not None:
             else:
                 st.info("💡 Não há colunas categóricas disponíveis nos dados filtrados.")
 
-    with tab2:
-        st.markdown("**🥧 Análise de Pizza** - Proporções das categorias")
-
-        categorical_cols = df_filtered.select_dtypes(include=['object']).columns
-        if len(categorical_cols) > 0:
-            col1, col2, col3 = st.columns([1.5, 1, 1])
-            with col1:
-                pie_col = st.selectbox("Coluna categórica:", categorical_cols, key="pie_chart_col", index=0)
-            with col2:
-                pie_limit = st.slider("Máximo de categorias:", 5, 15, 8, key="pie_limit")
-            with col3:
-                show_labels = st.checkbox("Mostrar rótulos", value=True, key="pie_labels")
-
-            if pie_col and pie_col in df_filtered.columns:
-                # Obter categorias principais para gráfico de pizza apenas dos dados filtrados
-                pie_data = df_filtered[pie_col].value_counts().head(pie_limit)
-                if len(pie_data) > 0:
-                    # Adicionar categoria "Outros" se houver mais categorias
-                    if len(df_filtered[pie_col].value_counts()) > pie_limit:
-                        other_count = df_filtered[pie_col].value_counts().iloc[pie_limit:].sum()
-                        pie_data = pd.concat([pie_data, pd.Series({'Outros': other_count})])
-
-                    pie_df = pd.DataFrame({
-                        'categoria': pie_data.index,
-                        'valor': pie_data.values
-                    })
+        with tab2:
+            perf.begin("Aba Pizza")
+            st.markdown("**🥧 Análise de Pizza** - Proporções das categorias")
 
-                    pie_df['percentual'] = (pie_df['valor'] / pie_df['valor'].sum() * 100).round(1)
+            categorical_cols = df_selected.select_dtypes(include=['object', 'category']).columns
+            if len(categorical_cols) > 0:
+                col1, col2, col3 = st.columns([1.5, 1, 1])
+                with col1:
+                    pie_col = st.selectbox("Coluna categórica:", categorical_cols, key="pie_chart_col", index=0)
+                with col2:
+                    pie_limit = st.slider("Máximo de categorias:", 5, 15, 8, key="pie_limit")
+                with col3:
+                    show_labels = st.checkbox("Mostrar rótulos", value=True, key="pie_labels")
 
-                    # Criar gráfico de pizza
-                    if show_labels:
-                        pie_chart = alt.Chart(pie_df).mark_arc(
-                            innerRadius=50,
-                            outerRadius=120
-                        ).encode(
-                            theta=alt.Theta('valor:Q'),
-                            color=alt.Color('categoria:N',
-                                scale=alt.Scale(scheme='category20'),
-                                legend=alt.Legend(title=pie_col, orient='bottom')
-                            ),
-                            tooltip=['categoria', 'valor', 'percentual']
-                        ).properties(height=350)
+                if pie_col and pie_col in selected_columns:
+                    # Categorias principais e fatia "Outros" calculadas no DuckDB
+                    pie_df = category_counts_with_others(
+                        conn, dataset_key, table_name, pie_col, pie_limit, filtros
+                    )
+                    if len(pie_df) > 0:
+                        pie_df = pie_df.copy()
+                        pie_df['percentual'] = (pie_df['valor'] / pie_df['valor'].sum() * 100).round(1)
+
+                        # Criar gráfico de pizza
+                        if show_labels:
+                            pie_chart = alt.Chart(pie_df).mark_arc(
+                                innerRadius=50,
+                                outerRadius=120
+                            ).encode(
+                                theta=alt.Theta('valor:Q'),
+                                color=alt.Color('categoria:N',
+                                    scale=alt.Scale(scheme='category20'),
+                                    legend=alt.Legend(title=pie_col, orient='bottom')
+                                ),
+                                tooltip=['categoria', 'valor', 'percentual']
+                            ).properties(height=350)
+                        else:
+                            pie_chart = alt.Chart(pie_df).mark_arc(
+                                innerRadius=50,
+                                outerRadius=120
+                            ).encode(
+                                theta=alt.Theta('valor:Q'),
+                                color=alt.Color('categoria:N',
+                                    scale=alt.Scale(scheme='category20'),
+                                    legend=alt.Legend(title=pie_col, orient='bottom')
+                                ),
+                                tooltip=['categoria', 'valor', 'percentual']
+                            ).properties(height=350)
+
+                        altair_chart(pie_chart, width='stretch')
+
+                        # Métricas resumidas baseadas apenas nos dados filtrados
+                        col1, col2, col3, col4 = st.columns(4)
+                        with col1:
+                            st.metric("Total de Categorias", len(pie_df))
+                        with col2:
+                            st.metric("Maior Fatia", pie_df.loc[pie_df['valor'].idxmax(), 'categoria'])
+                        with col3:
+                            st.metric("Percentual Maior", f"{pie_df['percentual'].max():.1f}%")
+                        with col4:
+                            entropy = -sum((pie_df['percentual']/100) * np.log2(pie_df['percentual']/100)) if len(pie_df) > 1 else 0
+                            st.metric("Diversidade", f"{entropy:.2f}")
+
+                        # Verificar se há categoria dominante
+                        max_pct = pie_df['percentual'].max()
+                        if max_pct > 50:
+                            st.warning(f"⚠️ **Categoria dominante:** {pie_df.loc[pie_df['percentual'].idxmax(), 'categoria']} representa {max_pct:.1f}% do total")
+
+                        # Tabela de detalhamento
+                        st.subheader("📋 Detalhamento")
+                        display_df = pie_df.copy()
+                        display_df['percentual'] = display_df['percentual'].astype(str) + '%'
+                        st.dataframe(
+                            display_df.style.background_gradient(subset=['valor'], cmap='Oranges')
+                            .format({'valor': '{:,}', 'percentual': '{}'}),
+                            width='stretch'
+                        )
                     else:
-                        pie_chart = alt.Chart(pie_df).mark_arc(
-                            innerRadius=50,
-                            outerRadius=120
+                        st.info("💡 Não há dados suficientes para gerar o gráfico de pizza.")
+                else:
+                    st.info("💡 Selecione uma coluna categórica válida para o gráfico.")
+
+            else:
+                st.info("💡 Não há colunas categóricas disponíveis nos dados filtrados.")
+
+        with tab3:
+            perf.begin("Aba Distribuição")
+            st.markdown("**📈 Distribuição** - Histogramas e análise de valores numéricos")
+
+            numeric_columns = df_selected.select_dtypes(include=['number']).columns
+            if len(numeric_columns) > 0:
+                col1, col2 = st.columns([2, 1])
+                with col1:
+                    hist_col = st.selectbox("Coluna numérica:", numeric_columns, key="hist_col", index=0)
+                with col2:
+                    bins = st.slider("Número de bins:", 10, 50, 20, key="hist_bins")
+
+                if hist_col and hist_col in selected_columns:
+                    # Faixas e estatísticas calculadas no DuckDB: o gráfico recebe só as contagens
+                    hist_df, hist_stats = histogram(conn, dataset_key, table_name, hist_col, bins, filtros)
+
+                    if hist_df is not None:
+                        hist = alt.Chart(hist_df).mark_bar(
+                            opacity=0.7,
+                            color='lightblue'
                         ).encode(
-                            theta=alt.Theta('valor:Q'),
-                            color=alt.Color('categoria:N',
-                                scale=alt.Scale(scheme='category20'),
-                                legend=alt.Legend(title=pie_col, orient='bottom')
-                            ),
-                            tooltip=['categoria', 'valor', 'percentual']
-                        ).properties(height=350)
+                            x=alt.X('inicio:Q', bin='binned', title=hist_col),
+                            x2='fim:Q',
+                            y=alt.Y('contagem:Q', title='Frequência'),
+                            tooltip=[
+                                alt.Tooltip('inicio:Q', title='De', format=',.2f'),
+                                alt.Tooltip('fim:Q', title='Até', format=',.2f'),
+                                alt.Tooltip('contagem:Q', title='Frequência')
+                            ]
+                        ).properties(height=300)
+
+                        altair_chart(hist, width='stretch')
+
+                        # Estatísticas básicas (da mesma consulta do histograma)
+                        mean_val = hist_stats["media"]
+                        median_val = hist_stats["mediana"]
+                        min_val = hist_stats["minimo"]
+                        max_val = hist_stats["maximo"]
 
-                    st.altair_chart(pie_chart, width='stretch')
-
-                    # Métricas resumidas baseadas apenas nos dados filtrados
-                    col1, col2, col3, col4 = st.columns(4)
-                    with col1:
-                        st.metric("Total de Categorias", len(pie_df))
-                    with col2:
-                        st.metric("Maior Fatia", pie_df.loc[pie_df['valor'].idxmax(), 'categoria'])
-                    with col3:
-                        st.metric("Percentual Maior", f"{pie_df['percentual'].max():.1f}%")
-                    with col4:
-                        entropy = -sum((pie_df['percentual']/100) * np.log2(pie_df['percentual']/100)) if len(pie_df) > 1 else 0
-                        st.metric("Diversidade", f"{entropy:.2f}")
-
-                    # Verificar se há categoria dominante
-                    max_pct = pie_df['percentual'].max()
-                    if max_pct > 50:
-                        st.warning(f"⚠️ **Categoria dominante:** {pie_df.loc[pie_df['percentual'].idxmax(), 'categoria']} representa {max_pct:.1f}% do total")
-
-                    # Tabela de detalhamento
-                    st.subheader("📋 Detalhamento")
-                    display_df = pie_df.copy()
-                    display_df['percentual'] = display_df['percentual'].astype(str) + '%'
-                    st.dataframe(
-                        display_df.style.background_gradient(subset=['valor'], cmap='Oranges')
-                        .format({'valor': '{:,}', 'percentual': '{}'}),
-                        width='stretch'
-                    )
-                else:
-                    st.info("💡 Não há dados suficientes para gerar o gráfico de pizza.")
+                        col1, col2, col3, col4 = st.columns(4)
+                        with col1:
+                            st.metric("Média", f"{mean_val:.2f}")
+                        with col2:
+                            st.metric("Mediana", f"{median_val:.2f}")
+                        with col3:
+                            st.metric("Mín", f"{min_val:.2f}")
+                        with col4:
+                            st.metric("Máx", f"{max_val:.2f}")
+                    else:
+                        st.warning("Não há dados suficientes para criar o histograma.")
             else:
-                st.info("💡 Selecione uma coluna categórica válida para o gráfico.")
+                st.info("Nenhuma coluna numérica disponível para histogramas.")
+
+        with tab4:
+            perf.begin("Aba Correlação")
+            st.markdown("**� Correlação** - Relacionamentos entre variáveis numéricas")
+
+            numeric_columns = df_selected.select_dtypes(include=['number']).columns
+            categorical_cols = df_selected.select_dtypes(include=['object', 'category']).columns
+
+            if len(numeric_columns) >= 2:
+                # Matriz de Correlação
+                st.subheader("Matriz de Correlação")
+                with perf.section("Matriz de correlação (corr)"):
+                    corr_matrix = correlation_matrix(conn, dataset_key, table_name, list(numeric_columns), filtros)
+
+                # Heatmap
+                corr_data = corr_matrix.reset_index().melt(id_vars='index')
+                corr_data.columns = ['Variável 1', 'Variável 2', 'Correlação']
+
+                heatmap = alt.Chart(corr_data).mark_rect().encode(
+                    x=alt.X('Variável 1:N', title=''),
+                    y=alt.Y('Variável 2:N', title=''),
+                    color=alt.Color('Correlação:Q',
+                        scale=alt.Scale(domain=(-1, 1), range=['darkred', 'white', 'darkblue']),
+                        legend=alt.Legend(title="Correlação")
+                    ),
+                    tooltip=['Variável 1', 'Variável 2', alt.Tooltip('Correlação', format='.3f')]
+                ).properties(
+                    width=400,
+                    height=400,
+                    title="Heatmap de Correlação"
+                )
 
-        else:
-            st.info("💡 Não há colunas categóricas disponíveis nos dados filtrados.")
-
-    with tab3:
-        st.markdown("**📈 Distribuição** - Histogramas e análise de valores numéricos")
-
-        numeric_columns = df_filtered.select_dtypes(include=['number']).columns
-        if len(numeric_columns) > 0:
-            col1, col2 = st.columns([2, 1])
-            with col1:
-                hist_col = st.selectbox("Coluna numérica:", numeric_columns, key="hist_col", index=0)
-            with col2:
-                bins = st.slider("Número de bins:", 10, 50, 20, key="hist_bins")
-
-            if hist_col and hist_col in df_filtered.columns:
-                # Remover valores NaN para o histograma
-                hist_data = df_filtered[hist_col].dropna()
-
-                if len(hist_data) > 0:
-                    # Histogram
-                    hist = alt.Chart(pd.DataFrame({hist_col: hist_data})).mark_bar(
-                        opacity=0.7,
-                        color='lightblue'
-                    ).encode(
-                        x=alt.X(f'{hist_col}:Q', bin=alt.Bin(maxbins=bins), title=hist_col),
-                        y=alt.Y('count()', title='Frequência'),
-                        tooltip=[alt.Tooltip(f'{hist_col}:Q', bin=True), 'count()']
-                    ).properties(height=300)
-
-                    st.altair_chart(hist, width='stretch')
-
-                    # Estatísticas básicas
-                    mean_val = hist_data.mean()
-                    median_val = hist_data.median()
-                    min_val = hist_data.min()
-                    max_val = hist_data.max()
-
-                    # Tratar valores NaN
-                    mean_val = mean_val if not pd.isna(mean_val) else 0.0
-                    median_val = median_val if not pd.isna(median_val) else 0.0
-                    min_val = min_val if not pd.isna(min_val) else 0.0
-                    max_val = max_val if not pd.isna(max_val) else 0.0
-
-                    col1, col2, col3, col4 = st.columns(4)
-                    with col1:
-                        st.metric("Média", f"{mean_val:.2f}")
-                    with col2:
-                        st.metric("Mediana", f"{median_val:.2f}")
-                    with col3:
-                        st.metric("Mín", f"{min_val:.2f}")
-                    with col4:
-                        st.metric("Máx", f"{max_val:.2f}")
-                else:
-                    st.warning("Não há dados suficientes para criar o histograma.")
-        else:
-            st.info("Nenhuma coluna numérica disponível para histogramas.")
-
-    with tab4:
-        st.markdown("**� Correlação** - Relacionamentos entre variáveis numéricas")
-
-        numeric_columns = df_filtered.select_dtypes(include=['number']).columns
-        categorical_cols = df_filtered.select_dtypes(include=['object']).columns
-
-        if len(numeric_columns) >= 2:
-            # Matriz de Correlação
-            st.subheader("Matriz de Correlação")
-            corr_matrix = df_filtered[numeric_columns].corr()
-
-            # Heatmap
-            corr_data = corr_matrix.reset_index().melt(id_vars='index')
-            corr_data.columns = ['Variável 1', 'Variável 2', 'Correlação']
-
-            heatmap = alt.Chart(corr_data).mark_rect().encode(
-                x=alt.X('Variável 1:N', title=''),
-                y=alt.Y('Variável 2:N', title=''),
-                color=alt.Color('Correlação:Q',
-                    scale=alt.Scale(domain=(-1, 1), range=['darkred', 'white', 'darkblue']),
-                    legend=alt.Legend(title="Correlação")
-                ),
-                tooltip=['Variável 1', 'Variável 2', alt.Tooltip('Correlação', format='.3f')]
-            ).properties(
-                width=400,
-                height=400,
-                title="Heatmap de Correlação"
-            )
-
-            st.altair_chart(heatmap, width='stretch')
-
-            # Tabela de Correlação
-            st.subheader("Tabela de Correlação")
-            st.dataframe(
-                corr_matrix.style.background_gradient(cmap='RdYlBu', axis=None, vmin=-1, vmax=1)
-                .format("{:.3f}"),
-                width='stretch'
-            )
-
-            # Correlações Mais Fortes
-            st.subheader("Correlações Mais Fortes")
-            # Obter triângulo superior da matriz de correlação
-            upper = corr_matrix.where(np.triu(np.ones_like(corr_matrix), k=1).astype(bool))
-            top_corr = upper.stack().sort_values(ascending=False).head(10)
-
-            if len(top_corr) > 0:
-                top_corr_df = pd.DataFrame({
-                    'Variável 1': [idx[0] for idx in top_corr.index],
-                    'Variável 2': [idx[1] for idx in top_corr.index],
-                    'Correlação': top_corr.values
-                })
+                altair_chart(heatmap, width='stretch')
 
+                # Tabela de Correlação
+                st.subheader("Tabela de Correlação")
                 st.dataframe(
-                    top_corr_df.style.background_gradient(subset=['Correlação'], cmap='RdYlBu', vmin=-1, vmax=1)
-                    .format({'Correlação': '{:.3f}'}),
+                    corr_matrix.style.background_gradient(cmap='RdYlBu', axis=None, vmin=-1, vmax=1)
+                    .format("{:.3f}"),
                     width='stretch'
                 )
 
-            # Seção de Scatter Plot
-            st.subheader("Scatter Plot Interativo")
-            col1, col2, col3 = st.columns([1, 1, 1])
-            with col1:
-                x_col = st.selectbox("Eixo X:", numeric_columns, key="scatter_x")
-            with col2:
-                y_col = st.selectbox("Eixo Y:", numeric_columns, key="scatter_y")
-            with col3:
-                color_by = st.selectbox("Colorir por:", ["Nenhum"] + list(categorical_cols), key="scatter_color")
-
-            if x_col and y_col and x_col != y_col:
-                # Criar dados de dispersão com nomes de colunas únicos
-                scatter_data = df_filtered[[x_col, y_col]].dropna().copy()
-                if len(scatter_data) > 0:
-                    if color_by != "Nenhum" and color_by in df_filtered.columns and color_by not in [x_col, y_col]:
-                        # Adição segura da coluna de cor
-                        color_values = df_filtered.loc[scatter_data.index, color_by]
-                        scatter_data = pd.concat([scatter_data, color_values.rename(color_by)], axis=1)
-
-                        scatter = alt.Chart(scatter_data).mark_circle(size=60).encode(
-                            x=alt.X(f'{x_col}:Q', title=x_col),
-                            y=alt.Y(f'{y_col}:Q', title=y_col),
-                            color=alt.Color(f'{color_by}:N', title=color_by),
-                            tooltip=[x_col, y_col, color_by]
-                        ).properties(height=400)
+                # Correlações Mais Fortes
+                st.subheader("Correlações Mais Fortes")
+                # Obter triângulo superior da matriz de correlação
+                upper = corr_matrix.where(np.triu(np.ones_like(corr_matrix), k=1).astype(bool))
+                top_corr = upper.stack().sort_values(ascending=False).head(10)
+
+                if len(top_corr) > 0:
+                    top_corr_df = pd.DataFrame({
+                        'Variável 1': [idx[0] for idx in top_corr.index],
+                        'Variável 2': [idx[1] for idx in top_corr.index],
+                        'Correlação': top_corr.values
+                    })
+
+                    st.dataframe(
+                        top_corr_df.style.background_gradient(subset=['Correlação'], cmap='RdYlBu', vmin=-1, vmax=1)
+                        .format({'Correlação': '{:.3f}'}),
+                        width='stretch'
+                    )
+
+                # Seção de Scatter Plot
+                st.subheader("Scatter Plot Interativo")
+                col1, col2, col3 = st.columns([1, 1, 1])
+                with col1:
+                    x_col = st.selectbox("Eixo X:", numeric_columns, key="scatter_x")
+                with col2:
+                    y_col = st.selectbox("Eixo Y:", numeric_columns, key="scatter_y")
+                with col3:
+                    color_by = st.selectbox("Colorir por:", ["Nenhum"] + list(categorical_cols), key="scatter_color")
+
+                if x_col and y_col and x_col != y_col:
+                    # Pontos com X e Y preenchidos, amostrados no DuckDB se passarem do limite
+                    color_col = color_by if color_by != "Nenhum" and color_by not in [x_col, y_col] else None
+                    scatter_data, scatter_points = scatter_sample(
+                        conn, dataset_key, table_name, x_col, y_col, color_col, SCATTER_MAX_POINTS, filtros
+                    )
+                    if len(scatter_data) > 0:
+                        if scatter_points > len(scatter_data):
+                            st.caption(f"Amostra aleatória de {len(scatter_data):,} de {scatter_points:,} pontos.")
+                        if color_col is not None:
+                            scatter = alt.Chart(scatter_data).mark_circle(size=60).encode(
+                                x=alt.X(f'{x_col}:Q', title=x_col),
+                                y=alt.Y(f'{y_col}:Q', title=y_col),
+                                color=alt.Color(f'{color_by}:N', title=color_by),
+                                tooltip=[x_col, y_col, color_by]
+                            ).properties(height=400)
+                        else:
+                            scatter = alt.Chart(scatter_data).mark_circle(size=60, color='coral').encode(
+                                x=alt.X(f'{x_col}:Q', title=x_col),
+                                y=alt.Y(f'{y_col}:Q', title=y_col),
+                                tooltip=[x_col, y_col]
+                            ).properties(height=400)
+
+                        altair_chart(scatter, width='stretch')
+
+                        # Estatísticas detalhadas de correlação
+                        corr = corr_matrix.loc[x_col, y_col]
+                        col1, col2, col3, col4 = st.columns(4)
+                        with col1:
+                            st.metric("Correlação Pearson", ".3f")
+                        with col2:
+                            st.metric("R²", ".3f")
+                        with col3:
+                            st.metric("Pontos", scatter_points)
+                        with col4:
+                            # Interpretar força da correlação
+                            strength = "Forte" if abs(corr) > 0.7 else "Moderada" if abs(corr) > 0.3 else "Fraca"
+                            direction = "Positiva" if corr > 0 else "Negativa" if corr < 0 else "Nenhuma"
+                            st.metric("Força", f"{strength} ({direction})")
                     else:
-                        scatter = alt.Chart(scatter_data).mark_circle(size=60, color='coral').encode(
-                            x=alt.X(f'{x_col}:Q', title=x_col),
-                            y=alt.Y(f'{y_col}:Q', title=y_col),
-                            tooltip=[x_col, y_col]
-                        ).properties(height=400)
-
-                    st.altair_chart(scatter, width='stretch')
-
-                    # Estatísticas detalhadas de correlação
-                    corr = scatter_data[x_col].corr(scatter_data[y_col])
-                    col1, col2, col3, col4 = st.columns(4)
-                    with col1:
-                        st.metric("Correlação Pearson", ".3f")
-                    with col2:
-                        st.metric("R²", ".3f")
-                    with col3:
-                        st.metric("Pontos", len(scatter_data))
-                    with col4:
-                        # Interpretar força da correlação
-                        strength = "Forte" if abs(corr) > 0.7 else "Moderada" if abs(corr) > 0.3 else "Fraca"
-                        direction = "Positiva" if corr > 0 else "Negativa" if corr < 0 else "Nenhuma"
-                        st.metric("Força", f"{strength} ({direction})")
+                        st.warning("Não há dados suficientes para criar o scatter plot.")
                 else:
-                    st.warning("Não há dados suficientes para criar o scatter plot.")
+                    st.info("Selecione variáveis diferentes para X e Y.")
             else:
-                st.info("Selecione variáveis diferentes para X e Y.")
-        else:
-            st.info("São necessárias pelo menos 2 colunas numéricas para análise de correlação.")
-
-    with tab5:
-        st.markdown("**📅 Temporal** - Evolução ao longo do tempo")
-
-        numeric_columns = df_filtered.select_dtypes(include=['number']).columns
-
-        # Só permite análise temporal se 'Ano' estiver nas colunas selecionadas
-        if 'Ano' in df_filtered.columns and len(numeric_columns) > 0:
-            col1, col2, col3 = st.columns([2, 1, 1])
-            with col1:
-                ts_col = st.selectbox("Coluna numérica:", numeric_columns, key="ts_col")
-            with col2:
-                agg_func = st.selectbox("Agregação:", ["Soma", "Média", "Contagem"], key="ts_agg")
-            with col3:
-                chart_type = st.selectbox("Tipo:", ["Linha", "Área", "Barra"], key="ts_type")
-
-            if ts_col:
-                    # Agregar dados por ano
-                    if agg_func == "Soma":
-                        ts_data = df_filtered.groupby('Ano')[ts_col].sum().reset_index()
-                    elif agg_func == "Média":
-                        ts_data = df_filtered.groupby('Ano')[ts_col].mean().reset_index()
-                    else:  # Contagem
-                        ts_data = df_filtered.groupby('Ano')[ts_col].count().reset_index()
+                st.info("São necessárias pelo menos 2 colunas numéricas para análise de correlação.")
+
+        with tab5:
+            perf.begin("Aba Temporal")
+            st.markdown("**📅 Temporal** - Evolução ao longo do tempo")
+
+            numeric_columns = df_selected.select_dtypes(include=['number']).columns
+
+            # Só permite análise temporal se 'Ano' estiver nas colunas selecionadas
+            if 'Ano' in selected_columns and len(numeric_columns) > 0:
+                # Mês e trimestre só para conjuntos com coluna de data
+                rollup_spec = get_rollup_spec(datasets[selected_dataset])
+                date_col = rollup_spec["data"] if rollup_spec is not None else None
+                granularities = {"Ano": None}
+                if date_col in df.columns:
+                    granularities.update({"Trimestre": "trimestral", "Mês": "mensal"})
+
+                col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+                with col1:
+                    ts_col = st.selectbox("Coluna numérica:", numeric_columns, key="ts_col")
+                with col2:
+                    agg_func = st.selectbox("Agregação:", ["Soma", "Média", "Contagem"], key="ts_agg")
+                with col3:
+                    granularity = st.selectbox("Granularidade:", list(granularities), key="ts_granularity")
+                with col4:
+                    chart_type = st.selectbox("Tipo:", ["Linha", "Área", "Barra"], key="ts_type")
+
+                if ts_col:
+                    # Agregação por período e variação entre períodos em uma consulta no DuckDB;
+                    # mês e trimestre saem dos agregados gravados quando os filtros permitem
+                    if granularities[granularity] is None:
+                        period_col = 'Ano'
+                        ts_data = yearly_series(conn, dataset_key, table_name, ts_col, agg_func, filtros)
+                    else:
+                        period_col = 'Período'
+                        ts_data = periodic_series(
+                            conn, dataset_key, table_name, date_col, ts_col, agg_func,
+                            granularities[granularity], filtros,
+                            rollup_table=rollup_views.get(table_name, {}).get(granularities[granularity])
+                        )
 
                     # Criar tipo de gráfico apropriado
                     if chart_type == "Linha":
@@ -560,30 +662,30 @@ if df is not None:
                             color='steelblue',
                             strokeWidth=3
                         ).encode(
-                            x=alt.X('Ano:O', title='Ano'),
+                            x=alt.X(f'{period_col}:O', title=granularity),
                             y=alt.Y(f'{ts_col}:Q', title=f'{agg_func} de {ts_col}'),
-                            tooltip=['Ano', alt.Tooltip(ts_col, format='.2f')]
+                            tooltip=[period_col, alt.Tooltip(ts_col, format='.2f')]
                         ).properties(height=350)
                     elif chart_type == "Área":
                         ts_chart = alt.Chart(ts_data).mark_area(
                             color='lightblue',
                             opacity=0.7
                         ).encode(
-                            x=alt.X('Ano:O', title='Ano'),
+                            x=alt.X(f'{period_col}:O', title=granularity),
                             y=alt.Y(f'{ts_col}:Q', title=f'{agg_func} de {ts_col}'),
-                            tooltip=['Ano', alt.Tooltip(ts_col, format='.2f')]
+                            tooltip=[period_col, alt.Tooltip(ts_col, format='.2f')]
                         ).properties(height=350)
                     else:  # Barra
                         ts_chart = alt.Chart(ts_data).mark_bar(
                             color='steelblue',
                             opacity=0.8
                         ).encode(
-                            x=alt.X('Ano:O', title='Ano'),
+                            x=alt.X(f'{period_col}:O', title=granularity),
                             y=alt.Y(f'{ts_col}:Q', title=f'{agg_func} de {ts_col}'),
-                            tooltip=['Ano', alt.Tooltip(ts_col, format='.2f')]
+                            tooltip=[period_col, alt.Tooltip(ts_col, format='.2f')]
                         ).properties(height=350)
 
-                    st.altair_chart(ts_chart, width='stretch')
+                    altair_chart(ts_chart, width='stretch')
 
                     # Análise de tendência aprimorada
                     if len(ts_data) > 1:
@@ -603,28 +705,22 @@ if df is not None:
                             trend = "📈 Crescimento" if change_pct > 0 else "📉 Declínio" if change_pct < 0 else "➡️ Estável"
                             st.metric("Tendência Geral", trend)
                         with col2:
-                            st.metric(f"Variação Total ({ts_data['Ano'].iloc[0]}→{ts_data['Ano'].iloc[-1]})", f"{change_pct:.1f}%")
+                            st.metric(f"Variação Total ({ts_data[period_col].iloc[0]}→{ts_data[period_col].iloc[-1]})", f"{change_pct:.1f}%")
                         with col3:
                             st.metric("Valor Máximo", f"{ts_data[ts_col].max():.2f}")
                         with col4:
                             st.metric("Volatilidade", f"{volatility:.1f}%")
 
-                        # Variações ano a ano
+                        # Variações entre períodos consecutivos
                         if len(ts_data) > 2:
-                            st.subheader("📊 Variações Ano a Ano")
-                            yoy_changes = []
-                            for i in range(1, len(ts_data)):
-                                prev_val = ts_data[ts_col].iloc[i-1]
-                                curr_val = ts_data[ts_col].iloc[i]
-                                if prev_val != 0:
-                                    yoy_change = ((curr_val - prev_val) / prev_val) * 100
-                                    yoy_changes.append({
-                                        'Período': f"{ts_data['Ano'].iloc[i-1]}→{ts_data['Ano'].iloc[i]}",
-                                        'Variação': yoy_change
-                                    })
-
-                            if yoy_changes:
-                                yoy_df = pd.DataFrame(yoy_changes)
+                            st.subheader("📊 Variações Ano a Ano" if period_col == 'Ano' else f"📊 Variações por {granularity}")
+                            # 'Variação %' é nula quando o período anterior vale 0
+                            yoy_df = pd.DataFrame({
+                                'Período': [f"{prev}→{curr}" for prev, curr in zip(ts_data[period_col], ts_data[period_col].iloc[1:])],
+                                'Variação': ts_data['Variação %'].iloc[1:].to_numpy()
+                            }).dropna()
+
+                            if len(yoy_df) > 0:
                                 yoy_chart = alt.Chart(yoy_df).mark_bar().encode(
                                     x='Período:O',
                                     y='Variação:Q',
@@ -636,50 +732,54 @@ if df is not None:
                                     tooltip=['Período', alt.Tooltip('Variação', format='.1f')]
                                 ).properties(height=250)
 
-                                st.altair_chart(yoy_chart, width='stretch')
+                                altair_chart(yoy_chart, width='stretch')
 
                                 # Resumo das mudanças
-                                positive_changes = sum(1 for change in yoy_changes if change['Variação'] > 0)
-                                total_changes = len(yoy_changes)
+                                positive_changes = int((yoy_df['Variação'] > 0).sum())
+                                total_changes = len(yoy_df)
                                 consistency = (positive_changes / total_changes) * 100 if total_changes > 0 else 0
 
-                                st.metric("Consistência de Crescimento", ".0f")
+                                st.metric("Consistência de Crescimento", f"{consistency:.0f}%")
 
                     # Tabela de dados com formatação aprimorada
                     st.subheader("📋 Dados Temporais Detalhados")
                     display_ts = ts_data.copy()
                     display_ts[ts_col] = display_ts[ts_col].round(2)
-
-                    # Adicionar coluna de variação percentual
-                    if len(display_ts) > 1:
-                        display_ts['Variação %'] = display_ts[ts_col].pct_change() * 100
-                        display_ts['Variação %'] = display_ts['Variação %'].round(1)
+                    display_ts['Variação %'] = display_ts['Variação %'].round(1)
 
                     st.dataframe(
                         display_ts.style.background_gradient(subset=[ts_col], cmap='YlGnBu')
                         .format({ts_col: '{:,.2f}', 'Variação %': '{:+.1f}%'}),
                         width='stretch'
                     )
+                else:
+                    st.info("Nenhuma coluna numérica disponível para análise temporal.")
             else:
-                st.info("Nenhuma coluna numérica disponível para análise temporal.")
-        else:
-            st.info("Coluna 'Ano' não encontrada para análise temporal.")
-
-    # Baixar dados filtrados
-    csv = df_filtered.to_csv(index=False)
-    st.download_button(
-        label="📥 Baixar Dados Filtrados como CSV",
-        data=csv,
-        file_name=f"{selected_dataset.replace(' ', '_').lower()}_filtrados.csv",
-        mime="text/csv"
-    )
+                st.info("Coluna 'Ano' não encontrada para análise temporal.")
+
+    # Baixar dados filtrados: o arquivo só é gerado (pelo DuckDB, em blocos) no clique
+    perf.begin("Exportação e SQL")
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        export_format = st.selectbox("Formato do arquivo:", list(EXPORT_FORMATS), key="export_format")
+    extension, mime = EXPORT_FORMATS[export_format]
+    export_sql, export_params = filtered_query(table_name, selected_columns, **filtros)
+    with col2:
+        st.download_button(
+            label=f"📥 Baixar Dados Filtrados ({export_format})",
+            data=partial(export_query, conn, export_sql, export_params, export_format, dict(registered_frames)),
+            file_name=f"{selected_dataset.replace(' ', '_').lower()}_filtrados.{extension}",
+            mime=mime,
+            on_click="ignore"
+        )
+        if extension == "xlsx" and total_rows > XLSX_MAX_ROWS:
+            st.caption(f"⚠️ O Excel aceita até {XLSX_MAX_ROWS:,} linhas; o arquivo será truncado.")
 
     # Seção de Consulta SQL (manter para usuários avançados)
     st.header("🔍 Interface Avançada de Consulta SQL")
     with st.expander("Consulta SQL (para usuários avançados)"):
         st.markdown("Use SQL para consultar seus dados. Tabelas disponíveis:")
-        table_list = [file.replace('.csv', '').replace('-', '_').replace(' ', '_').lower() for file in datasets.values() if load_csv(file) is not None]
-        st.code(", ".join(table_list), language="sql")
+        st.code(", ".join(available_tables), language="sql")
 
         query = st.text_area("Digite sua consulta SQL:", value=f"SELECT * FROM {table_name} LIMIT 10;", height=100)
 
@@ -689,16 +789,21 @@ if df is not None:
                 st.success(f"Consulta executada com sucesso! Retornou {len(result)} linhas.")
                 st.dataframe(result, width='stretch')
 
-                # Botão de download
-                csv = result.to_csv(index=False)
+                # Botão de download (a consulta é executada de novo, em blocos, só no clique)
+                extension, mime = EXPORT_FORMATS[export_format]
                 st.download_button(
-                    label="📥 Baixar Resultados SQL como CSV",
-                    data=csv,
-                    file_name="resultados_sql.csv",
-                    mime="text/csv"
+                    label=f"📥 Baixar Resultados SQL ({export_format})",
+                    data=partial(export_query, conn, query, [], export_format, dict(registered_frames)),
+                    file_name=f"resultados_sql.{extension}",
+                    mime=mime,
+                    on_click="ignore"
                 )
             except Exception as e:
                 st.error(f"Erro ao executar consulta: {str(e)}")
 
 else:
     st.error(f"Conjunto de dados '{selected_dataset}' não encontrado. Execute o script de coleta primeiro.")
+
+# Perfil de desempenho desta execução (depois de todas as seções)
+if perf.enabled:
+    render_profile_panel(perf)
@@ -0,0 +1,160 @@
+# RU4590111 Daniel Elias de Souza
+
+# Carregamento dos conjuntos de dados com cache por processo e por sessão
+import os
+import threading
+import time
+
+import pandas as pd
+
+from schemas import get_schema, read_csv_typed
+from storage import ROLLUP_GRANULARITIES, memory_usage, read_parquet, resolve_dataset_path, resolve_rollup_path
+from utils import convert_numeric_columns
+
+# Cache compartilhado entre todas as sessões do processo: nome -> (impressão digital, DataFrame)
+_process_cache = {}
+_cache_lock = threading.Lock()
+# Um lock por conjunto de dados evita que vários usuários processem o mesmo CSV ao mesmo tempo
+_dataset_locks = {}
+
+_stats = {
+    "hits_sessao": 0,
+    "hits_processo": 0,
+    "misses": 0,
+    "tempo_total_carga": 0.0,
+    "tempo_ultima_carga": {},
+    "memoria": {},
+}
+
+
+def file_fingerprint(path):
+    """Identifica a versão de um arquivo pelo caminho, data de modificação e tamanho"""
+    stat = os.stat(path)
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+
+def dataset_version(name):
+    """Impressão digital do arquivo atual de um conjunto de dados (None se não existir)"""
+    path = resolve_dataset_path(name)
+    return file_fingerprint(path) if path is not None else None
+
+
+def _parse_file(path, name):
+    """
+    Lê o Parquet tipado ou, na falta dele, o CSV com os tipos do esquema do conjunto
+    de dados (sem esquema, converte as colunas que parecem monetárias)
+    """
+    if path.endswith(".parquet"):
+        return read_parquet(path)
+    schema = get_schema(name)
+    if schema is not None:
+        return read_csv_typed(path, schema)
+    return convert_numeric_columns(pd.read_csv(path))
+
+
+def _get_dataset_lock(name):
+    with _cache_lock:
+        return _dataset_locks.setdefault(name, threading.Lock())
+
+
+def load_dataset(name, session_cache=None):
+    """
+    Retorna o DataFrame processado de um conjunto de dados em DATA_DIR (Parquet, se
+    houver, senão CSV), ou None se não existir. Só relê o arquivo quando ele muda
+    (mtime ou tamanho). O DataFrame retornado é compartilhado entre sessões e não
+    deve ser modificado.
+    """
+    path = resolve_dataset_path(name)
+    try:
+        if path is None:
+            raise FileNotFoundError(name)
+        fingerprint = file_fingerprint(path)
+    except FileNotFoundError:
+        with _cache_lock:
+            _process_cache.pop(name, None)
+        if session_cache is not None:
+            session_cache.pop(name, None)
+        return None
+
+    # 1) Cache da sessão: não precisa de lock
+    if session_cache is not None:
+        entry = session_cache.get(name)
+        if entry is not None and entry[0] == fingerprint:
+            with _cache_lock:
+                _stats["hits_sessao"] += 1
+            return entry[1]
+
+    # 2) Cache do processo
+    with _get_dataset_lock(name):
+        with _cache_lock:
+            entry = _process_cache.get(name)
+            if entry is not None and entry[0] == fingerprint:
+                _stats["hits_processo"] += 1
+                df = entry[1]
+            else:
+                df = None
+
+        # 3) Arquivo novo ou alterado: processa novamente
+        if df is None:
+            start = time.perf_counter()
+            df = _parse_file(path, name)
+            elapsed = time.perf_counter() - start
+            memory = memory_usage(df)
+            with _cache_lock:
+                _process_cache[name] = (fingerprint, df)
+                _stats["misses"] += 1
+                _stats["tempo_total_carga"] += elapsed
+                _stats["tempo_ultima_carga"][name] = elapsed
+                _stats["memoria"][name] = memory
+
+    if session_cache is not None:
+        session_cache[name] = (fingerprint, df)
+    return df
+
+
+def register_dataset(conn, table_name, name, df):
+    """
+    Registra o conjunto de dados no DuckDB: view sobre o Parquet ou o próprio DataFrame.
+    Retorna o DataFrame registrado (None no caso da view): registros feitos com
+    conn.register não aparecem nos cursores da conexão (ver exports.export_query).
+    """
+    path = resolve_dataset_path(name)
+    if path is not None and path.endswith(".parquet"):
+        escaped_path = path.replace("'", "''")
+        conn.execute(f"CREATE OR REPLACE VIEW {table_name} AS SELECT * FROM read_parquet('{escaped_path}')")
+        return None
+    conn.register(table_name, df)
+    return df
+
+
+def register_rollups(conn, table_name, name):
+    """
+    Registra os agregados por período do conjunto de dados como views
+    ("<tabela>__mensal"). Retorna granularidade -> view, só com os agregados atuais.
+    """
+    views = {}
+    for granularidade in ROLLUP_GRANULARITIES:
+        path = resolve_rollup_path(name, granularidade)
+        if path is None:
+            continue
+        view = f"{table_name}__{granularidade}"
+        escaped_path = path.replace("'", "''")
+        conn.execute(f"CREATE OR REPLACE VIEW {view} AS SELECT * FROM read_parquet('{escaped_path}')")
+        views[granularidade] = view
+    return views
+
+
+def get_cache_stats():
+    """Retorna uma cópia dos contadores de cache e tempos de carga"""
+    with _cache_lock:
+        stats = dict(_stats)
+        stats["tempo_ultima_carga"] = dict(_stats["tempo_ultima_carga"])
+        stats["memoria"] = dict(_stats["memoria"])
+        stats["datasets_em_cache"] = len(_process_cache)
+    return stats
+
+
+def clear_cache():
+    """Descarta todos os DataFrames em cache no processo"""
+    with _cache_lock:
+        _process_cache.clear()
@@ -0,0 +1,131 @@
+# RU4590111 Daniel Elias de Souza
+
+# Exportação dos dados do dashboard: o arquivo só é gerado quando o download é pedido,
+# escrito em blocos (record batches do DuckDB) em um arquivo temporário
+import datetime
+import decimal
+import os
+import tempfile
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+from schemas import PORTAL_DATE_FORMAT
+
+BATCH_ROWS = 100_000
+
+# Uma planilha do Excel tem no máximo 1.048.576 linhas (uma é o cabeçalho)
+XLSX_MAX_ROWS = 1_048_575
+
+# Formato -> (extensão, tipo MIME)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "CSV compactado (gzip)": ("csv.gz", "application/gzip"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Excel (XLSX)": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+_XLSX_TYPES = (str, int, float, bool, decimal.Decimal, datetime.date, datetime.datetime)
+
+
+def _batches(conn, sql, params, date_format=None):
+    """
+    Schema e record batches do resultado; colunas categóricas (dicionário) viram seus
+    valores. Com date_format, as colunas de data e hora viram texto nesse formato.
+    """
+    reader = conn.execute(sql, params).fetch_record_batch(BATCH_ROWS)
+    fields = []
+    for field in reader.schema:
+        if pa.types.is_dictionary(field.type):
+            field = pa.field(field.name, field.type.value_type)
+        elif date_format and pa.types.is_timestamp(field.type):
+            field = pa.field(field.name, pa.string())
+        fields.append(field)
+    schema = pa.schema(fields)
+
+    def convert(column, field):
+        if pa.types.is_timestamp(column.type) and pa.types.is_string(field.type):
+            return pc.strftime(column, format=date_format)
+        return column.cast(field.type)
+
+    def batches():
+        for batch in reader:
+            yield pa.RecordBatch.from_arrays(
+                [convert(column, field) for column, field in zip(batch.columns, schema)], schema=schema
+            )
+
+    return schema, batches()
+
+
+def _write_csv(path, schema, batches, compression=None):
+    with pa.output_stream(path, compression=compression) as sink:
+        with pacsv.CSVWriter(sink, schema, write_options=pacsv.WriteOptions(quoting_style="needed")) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+
+
+def _write_parquet(path, schema, batches):
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+
+
+def _write_xlsx(path, schema, batches):
+    """Planilha escrita linha a linha (constant_memory), truncada em XLSX_MAX_ROWS"""
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {
+        "constant_memory": True,
+        "default_date_format": "dd/mm/yyyy hh:mm",
+        "nan_inf_to_errors": True,
+        "remove_timezone": True,
+    })
+    worksheet = workbook.add_worksheet("Dados")
+    worksheet.write_row(0, 0, schema.names)
+    row_number = 1
+    for batch in batches:
+        for row in zip(*(column.to_pylist() for column in batch.columns)):
+            if row_number > XLSX_MAX_ROWS:
+                break
+            worksheet.write_row(row_number, 0, [
+                value if value is None or isinstance(value, _XLSX_TYPES) else str(value) for value in row
+            ])
+            row_number += 1
+    workbook.close()
+
+
+def export_query(conn, sql, params, formato, frames=None):
+    """
+    Executa a consulta e devolve o arquivo no formato pedido (chave de EXPORT_FORMATS)
+    como bytes. O resultado é lido em blocos de BATCH_ROWS linhas e escrito em disco,
+    sem montar o arquivo inteiro como texto em memória. Nos CSVs as datas saem no
+    formato do portal (PORTAL_DATE_FORMAT).
+
+    O download roda fora da execução do script, possivelmente junto com as consultas
+    de outra execução: a consulta usa um cursor próprio (conn.cursor()), já que a
+    conexão DuckDB não é thread-safe. frames (nome -> DataFrame/tabela Arrow) são os
+    registros feitos com conn.register que a consulta usa, refeitos no cursor.
+    """
+    extension = EXPORT_FORMATS[formato][0]
+    cursor = conn.cursor()
+    try:
+        for name, frame in (frames or {}).items():
+            cursor.register(name, frame)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, f"exportacao.{extension}")
+            date_format = PORTAL_DATE_FORMAT if extension in ("csv", "csv.gz") else None
+            schema, batches = _batches(cursor, sql, params, date_format)
+            if extension == "csv":
+                _write_csv(path, schema, batches)
+            elif extension == "csv.gz":
+                _write_csv(path, schema, batches, compression="gzip")
+            elif extension == "parquet":
+                _write_parquet(path, schema, batches)
+            else:
+                _write_xlsx(path, schema, batches)
+            with open(path, "rb") as f:
+                return f.read()
+    finally:
+        cursor.close()
@@ -0,0 +1,187 @@
+# RU4590111 Daniel Elias de Souza
+
+# Perfil de desempenho do dashboard (opcional): tempo e memória de cada seção do
+# script em cada execução (rerun), agregados ao longo da sessão
+import cProfile
+import io
+import json
+import marshal
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+# Execuções guardadas por sessão para as estatísticas agregadas
+HISTORY_SIZE = 200
+# Funções mostradas no resumo do cProfile
+CPROFILE_TOP = 30
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _rss():
+    """Memória residente do processo em bytes (None fora do Linux)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class RerunProfiler:
+    """
+    Mede as seções de uma execução do script. Cada seção registra o tempo de
+    relógio, a variação da memória alocada pelo Python/NumPy (tracemalloc) e a da
+    memória residente do processo. Seções com o mesmo nome se somam (ex.: a carga
+    de cada conjunto de dados); seções podem ficar dentro de outras, e o tempo de
+    cada uma inclui o das internas.
+    """
+
+    enabled = True
+
+    def __init__(self, cprofile=False):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.started_at = time.perf_counter()
+        self.sections = {}
+        self._current = None
+        self._cprofile = cProfile.Profile() if cprofile else None
+        if self._cprofile is not None:
+            self._cprofile.enable()
+
+    @contextmanager
+    def section(self, name):
+        start = time.perf_counter()
+        traced_before = tracemalloc.get_traced_memory()[0]
+        rss_before = _rss()
+        try:
+            yield
+        finally:
+            section = self.sections.setdefault(name, {"segundos": 0.0, "memoria": 0, "rss": 0, "chamadas": 0})
+            section["segundos"] += time.perf_counter() - start
+            section["memoria"] += tracemalloc.get_traced_memory()[0] - traced_before
+            rss_after = _rss()
+            if rss_before is not None and rss_after is not None:
+                section["rss"] += rss_after - rss_before
+            section["chamadas"] += 1
+
+    def begin(self, name):
+        """Fecha a seção aberta por begin (se houver) e abre outra: para blocos longos do script"""
+        self.end()
+        self._current = self.section(name)
+        self._current.__enter__()
+
+    def end(self):
+        if self._current is not None:
+            current, self._current = self._current, None
+            current.__exit__(None, None, None)
+
+    def wrap(self, func, name):
+        """Versão de func cujas chamadas são somadas na seção `name`"""
+        def wrapper(*args, **kwargs):
+            with self.section(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def finish(self):
+        """Encerra a execução; retorna o registro dela (para o histórico)"""
+        self.end()
+        record = {
+            "inicio": datetime.now().isoformat(timespec="seconds"),
+            "total": time.perf_counter() - self.started_at,
+            "secoes": self.sections,
+        }
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            record["cprofile"] = cprofile_summary(self._cprofile)
+            record["cprofile_dump"] = cprofile_dump(self._cprofile)
+        return record
+
+
+class NullProfiler:
+    """Perfil desligado: mesma interface, sem medir nada"""
+
+    enabled = False
+
+    @contextmanager
+    def section(self, name):
+        yield
+
+    def begin(self, name):
+        pass
+
+    def end(self):
+        pass
+
+    def wrap(self, func, name):
+        return func
+
+    def finish(self):
+        return None
+
+
+def cprofile_summary(profile, top=CPROFILE_TOP):
+    """As `top` funções com maior tempo acumulado, em texto (formato do pstats)"""
+    output = io.StringIO()
+    pstats.Stats(profile, stream=output).sort_stats("cumulative").print_stats(top)
+    return output.getvalue()
+
+
+def cprofile_dump(profile):
+    """Estatísticas completas no formato .prof de dump_stats (abre no snakeviz ou no gprof2dot)"""
+    profile.create_stats()
+    return marshal.dumps(profile.stats)
+
+
+def add_to_history(history, record, size=HISTORY_SIZE):
+    """Acrescenta a execução ao histórico (sem o .prof, que só fica na última)"""
+    history.append({k: v for k, v in record.items() if k != "cprofile_dump"})
+    del history[:-size]
+
+
+def aggregate(history):
+    """
+    Estatísticas de cada seção no histórico: execuções em que apareceu, tempo médio,
+    p50, p95 e máximo (ms) e variação média de memória (MB). Ordenadas pelo tempo médio.
+    """
+    rows = []
+    names = {name for record in history for name in record["secoes"]}
+    for name in names:
+        sections = [record["secoes"][name] for record in history if name in record["secoes"]]
+        times = np.array([s["segundos"] for s in sections]) * 1000
+        rows.append({
+            "Seção": name,
+            "Execuções": len(sections),
+            "Média (ms)": round(float(times.mean()), 1),
+            "p50 (ms)": round(float(np.percentile(times, 50)), 1),
+            "p95 (ms)": round(float(np.percentile(times, 95)), 1),
+            "Máx. (ms)": round(float(times.max()), 1),
+            "Memória Python (MB)": round(float(np.mean([s["memoria"] for s in sections])) / 1e6, 2),
+            "Memória RSS (MB)": round(float(np.mean([s["rss"] for s in sections])) / 1e6, 2),
+        })
+    return sorted(rows, key=lambda row: -row["Média (ms)"])
+
+
+def last_rerun_rows(record):
+    """Seções da última execução, da mais lenta para a mais rápida"""
+    rows = [
+        {
+            "Seção": name,
+            "Tempo (ms)": round(s["segundos"] * 1000, 1),
+            "% do total": round(100 * s["segundos"] / record["total"], 1) if record["total"] else None,
+            "Chamadas": s["chamadas"],
+            "Memória Python (MB)": round(s["memoria"] / 1e6, 2),
+            "Memória RSS (MB)": round(s["rss"] / 1e6, 2),
+        }
+        for name, s in record["secoes"].items()
+    ]
+    return sorted(rows, key=lambda row: -row["Tempo (ms)"])
+
+
+def to_json(history):
+    """Histórico e estatísticas agregadas em JSON (para download)"""
+    return json.dumps({"agregado": aggregate(history), "execucoes": history}, ensure_ascii=False, indent=2)
@@ -0,0 +1,116 @@
+# RU4590111 Daniel Elias de Souza
+
+# Consultas do dashboard executadas no DuckDB: os filtros viram uma única consulta parametrizada
+import re
+
+from search_index import PREFIX_PATTERN, parse_query
+
+
+def quote_identifier(name):
+    """Nome de coluna/tabela entre aspas duplas (as colunas têm espaços e acentos)"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def build_where(anos=None, busca=None, colunas_busca=(), faixa=None,
+                tabela_busca=None, colunas_indexadas=()):
+    """
+    Monta a cláusula WHERE e os parâmetros a partir do estado dos filtros:
+    - anos: lista de anos aceitos na coluna "Ano"
+    - busca / colunas_busca: termos procurados (sem diferenciar maiúsculas e acentos);
+      cada termo precisa aparecer em alguma das colunas
+    - tabela_busca / colunas_indexadas: relação registrada por search_index.register_matches
+      com os valores que casam com cada termo; as colunas fora do índice são varridas
+    - faixa: (coluna, mínimo, máximo) para uma coluna numérica
+    """
+    clauses = []
+    params = []
+
+    if anos:
+        clauses.append(f'{quote_identifier("Ano")} IN ({", ".join("?" for _ in anos)})')
+        params.extend(int(ano) for ano in anos)
+
+    if busca and colunas_busca:
+        for term_id, (termo, prefixo) in enumerate(parse_query(busca)):
+            alternativas = []
+            for col in colunas_busca:
+                valor = f"CAST({quote_identifier(col)} AS VARCHAR)"
+                if tabela_busca and col in colunas_indexadas:
+                    alternativas.append(
+                        f"{valor} IN (SELECT valor FROM {quote_identifier(tabela_busca)} WHERE termo = ? AND coluna = ?)"
+                    )
+                    params.extend([term_id, col])
+                elif prefixo:
+                    # Padrão como literal: passado como parâmetro, o DuckDB o recompila a cada linha
+                    padrao = PREFIX_PATTERN.format(re.escape(termo)).replace("'", "''")
+                    alternativas.append(f"regexp_matches(strip_accents(lower({valor})), '{padrao}')")
+                else:
+                    alternativas.append(f"contains(strip_accents(lower({valor})), ?)")
+                    params.append(termo)
+            clauses.append("(" + " OR ".join(alternativas) + ")")
+
+    if faixa is not None:
+        col, minimo, maximo = faixa
+        clauses.append(f"{quote_identifier(col)} BETWEEN ? AND ?")
+        params.extend([float(minimo), float(maximo)])
+
+    where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+    return where, params
+
+
+def filtered_query(table_name, columns, **filtros):
+    """SQL (e parâmetros) que seleciona as colunas e linhas que passam pelos filtros"""
+    where, params = build_where(**filtros)
+    select = ", ".join(quote_identifier(col) for col in columns)
+    return f"SELECT {select} FROM {quote_identifier(table_name)} {where}", params
+
+
+def fetch_filtered(conn, table_name, columns, **filtros):
+    """Retorna apenas as colunas e linhas que passam pelos filtros"""
+    sql, params = filtered_query(table_name, columns, **filtros)
+    return conn.execute(sql, params).fetchdf()
+
+
+def count_filtered(conn, table_name, columns, distinct=None, **filtros):
+    """
+    Número de linhas que passam pelos filtros, contado no DuckDB sem trazer as linhas;
+    com distinct, o número de valores distintos (não nulos) dessa coluna
+    """
+    sql, params = filtered_query(table_name, columns, **filtros)
+    count = f"count(DISTINCT {quote_identifier(distinct)})" if distinct is not None else "count(*)"
+    return conn.execute(f"SELECT {count} FROM ({sql})", params).fetchone()[0]
+
+
+def fetch_page(conn, table_name, columns, limit, offset=0, sort_column=None, descending=False, **filtros):
+    """
+    Uma página das linhas filtradas (LIMIT/OFFSET), ordenada no DuckDB. A ordenação
+    usa as demais colunas como desempate para que as páginas não se sobreponham.
+    Sem sort_column, mantém a ordem do arquivo.
+    """
+    where, params = build_where(**filtros)
+    select = ", ".join(quote_identifier(col) for col in columns)
+    order = ""
+    if sort_column is not None:
+        direction = "DESC" if descending else "ASC"
+        keys = [f"{quote_identifier(sort_column)} {direction} NULLS LAST"]
+        keys += [f"{quote_identifier(col)} ASC NULLS LAST" for col in columns if col != sort_column]
+        order = "ORDER BY " + ", ".join(keys)
+    return conn.execute(
+        f"SELECT {select} FROM {quote_identifier(table_name)} {where} {order} LIMIT ? OFFSET ?",
+        params + [int(limit), int(offset)]
+    ).fetchdf()
+
+
+def column_range(conn, table_name, column, **filtros):
+    """Mínimo e máximo de uma coluna dentro dos filtros (None, None se não houver linhas)"""
+    where, params = build_where(**filtros)
+    col = quote_identifier(column)
+    return conn.execute(f"SELECT min({col}), max({col}) FROM {quote_identifier(table_name)} {where}", params).fetchone()
+
+
+def distinct_values(conn, table_name, column):
+    """Valores distintos (não nulos) de uma coluna, ordenados"""
+    col = quote_identifier(column)
+    rows = conn.execute(
+        f"SELECT DISTINCT {col} FROM {quote_identifier(table_name)} WHERE {col} IS NOT NULL ORDER BY 1"
+    ).fetchall()
+    return [row[0] for row in rows]
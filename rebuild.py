@@ -0,0 +1,168 @@
+# RU4590111 Daniel Elias de Souza
+
+# Refaz os conjuntos de dados (CSV, Parquet, agregados) a partir do arquivo de
+# registros brutos (data/bruto), sem acessar os portais: útil depois de mudar
+# rename_columns, os esquemas ou o pós-processamento
+import argparse
+import gzip
+import itertools
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.json as pa_json
+
+from schemas import get_schema, rename_to_display
+from scraping import raw_archive
+from scraping.universal_scraper import SAVE_CHUNK_ROWS
+from storage import save_dataset, save_dataset_chunks
+
+# Bloco de leitura do leitor JSON do Arrow (os blocos são interpretados em paralelo)
+READ_BLOCK_BYTES = 8 * 1024 * 1024
+
+
+def read_partition(meta, ano):
+    """
+    Lê um ano do arquivo bruto como tabela Arrow (o leitor JSON do Arrow descompacta
+    e interpreta os blocos em paralelo), com a coluna do ano no fim.
+    Se o Arrow não conseguir (tipos que mudam entre blocos) ou converter textos em
+    datas, lê com o json da biblioteca padrão, como na coleta, e retorna um DataFrame.
+    """
+    path = raw_archive.partition_path(meta["fonte"], meta["visao"], ano)
+    try:
+        with pa.input_stream(path, compression="gzip") as stream:
+            table = pa_json.read_json(stream, read_options=pa_json.ReadOptions(block_size=READ_BLOCK_BYTES))
+        if not any(pa.types.is_temporal(field.type) for field in table.schema):
+            return table.append_column(meta["coluna_ano"], pa.array([ano] * table.num_rows, pa.int64()))
+    except pa.ArrowInvalid:
+        pass
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        df = pd.DataFrame([json.loads(line) for line in f])
+    df[meta["coluna_ano"]] = ano
+    return df
+
+
+def _num_rows(partition):
+    return partition.num_rows if isinstance(partition, pa.Table) else len(partition)
+
+
+def _slice(partition, start, length):
+    if isinstance(partition, pa.Table):
+        return partition.slice(start, length).to_pandas()
+    return partition.iloc[start:start + length]
+
+
+def dataset_chunks(partitions, columns, chunk_rows=SAVE_CHUNK_ROWS):
+    """
+    Blocos de DataFrame de chunk_rows linhas (colunas na ordem do conjunto), cruzando
+    os anos como na coleta (mesmos blocos, mesmos tipos e categorias no Parquet)
+    """
+    buffer, buffered = [], 0
+    for partition in partitions:
+        start, total = 0, _num_rows(partition)
+        while start < total:
+            length = min(chunk_rows - buffered, total - start)
+            buffer.append(_slice(partition, start, length).reindex(columns=columns))
+            buffered += length
+            start += length
+            if buffered == chunk_rows:
+                yield pd.concat(buffer, ignore_index=True)
+                buffer, buffered = [], 0
+    if buffer:
+        yield pd.concat(buffer, ignore_index=True)
+
+
+def _column_names(partition):
+    return partition.column_names if isinstance(partition, pa.Table) else list(partition.columns)
+
+
+def read_partitions(datasets, workers):
+    """
+    Lê os anos de todos os conjuntos em paralelo, um processo por núcleo (a leitura
+    alternativa com json não libera o GIL), mantendo no máximo `workers` anos à
+    frente do que já foi gravado. Produz (meta, ano, partição) na ordem.
+    """
+    tasks = [(meta, ano) for meta in datasets for ano in meta["anos"]]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for meta, ano in tasks:
+            pending.append((meta, ano, executor.submit(read_partition, meta, ano)))
+            if len(pending) > workers:
+                meta_, ano_, future = pending.popleft()
+                yield meta_, ano_, future.result()
+        while pending:
+            meta_, ano_, future = pending.popleft()
+            yield meta_, ano_, future.result()
+
+
+def rebuild_dataset(meta, partitions):
+    """Grava o conjunto de dados a partir dos anos lidos; retorna o número de linhas"""
+    partitions = [partition for _, _, partition in partitions]
+    schema = get_schema(meta["csv"])
+
+    # União das colunas de todos os anos (na ordem em que aparecem), com o ano no fim
+    columns = {}
+    for partition in partitions:
+        columns.update(dict.fromkeys(_column_names(partition)))
+    columns.pop(meta["coluna_ano"], None)
+    columns = list(columns) + [meta["coluna_ano"]]
+
+    chunks = (rename_to_display(chunk, schema) for chunk in dataset_chunks(partitions, columns))
+    if meta["em_blocos"]:
+        _, total = save_dataset_chunks(chunks, meta["csv"])
+        return total
+
+    df = pd.concat(list(chunks), ignore_index=True) if partitions else pd.DataFrame()
+    save_dataset(df, meta["csv"])
+    return len(df)
+
+
+def rebuild(conjuntos=None, workers=None, forcar=False):
+    """
+    Refaz os conjuntos de dados arquivados (todos ou os de `conjuntos`: nome da
+    visão ou do CSV). Conjuntos com anos sem registro bruto (ex.: coletados antes do
+    arquivo existir) são pulados, a menos que forcar, para não perder esses anos.
+    Retorna o resumo de cada conjunto.
+    """
+    workers = workers or os.cpu_count() or 4
+    datasets = []
+    for meta in raw_archive.list_datasets():
+        if conjuntos and meta["visao"] not in conjuntos and meta["csv"] not in conjuntos:
+            continue
+        if meta["faltando"] and not forcar:
+            print(f"{meta['csv']}: anos sem registro bruto {meta['faltando']}; "
+                  f"faça uma coleta completa (ou use --forcar para refazer sem eles)")
+            continue
+        datasets.append(meta)
+
+    summary = []
+    inicio = time.perf_counter()
+    partitions = read_partitions(datasets, workers)
+    for _, grupo in itertools.groupby(partitions, key=lambda item: id(item[0])):
+        grupo = list(grupo)
+        meta = grupo[0][0]
+        comeco = time.perf_counter()
+        linhas = rebuild_dataset(meta, grupo)
+        segundos = time.perf_counter() - comeco
+        print(f"{meta['csv']}: {linhas} linhas refeitas em {segundos:.2f}s")
+        summary.append({"conjunto": meta["csv"], "anos": meta["anos"], "linhas": linhas,
+                        "segundos": round(segundos, 2)})
+    print(f"\nTotal: {len(summary)} conjuntos em {time.perf_counter() - inicio:.2f}s")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refaz os conjuntos de dados a partir de data/bruto, sem coletar")
+    parser.add_argument("conjuntos", nargs="*", help="Visões ou arquivos CSV a refazer (padrão: todos)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Anos lidos em paralelo (padrão: número de núcleos)")
+    parser.add_argument("--forcar", action="store_true",
+                        help="Refaz também conjuntos com anos que não estão no arquivo bruto")
+    args = parser.parse_args()
+
+    rebuild(args.conjuntos, args.workers, args.forcar)
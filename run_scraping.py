@@ -1,56 +1,72 @@
 # RU4590111 Daniel Elias de Souza
 
-from scraping.camara_api import scrape_camara_despesas_2020_2023
-
-# Scrapers da Prefeitura (cada um chama o universal_scraper)
-from scraping.prefeitura.despesa_covid import scrape_despesa_covid
-from scraping.prefeitura.passagens import scrape_passagens
-from scraping.prefeitura.investimentos import scrape_investimentos
-from scraping.prefeitura.receita_analitica import scrape_receita_analitica
-from scraping.prefeitura.emendas_parlamentares import scrape_emendas_parlamentares
-
-print("Iniciando scraping...\n")
-
-# Câmara Municipal
-try:
-    scrape_camara_despesas_2020_2023()
-    print("Câmara Municipal (2020–2023): OK")
-except Exception as e:
-    print("Erro na Câmara:", e)
-
-# Receita Analítica (versão limitada para evitar timeouts)
-try:
-    scrape_receita_analitica()
-    print("Prefeitura - Receita Analítica: OK")
-except Exception as e:
-    print("Erro:", e)
-
-# Emendas Parlamentares
-try:
-    scrape_emendas_parlamentares()
-    print("Prefeitura - Emendas Parlamentares: OK")
-except Exception as e:
-    print("Erro:", e)
-
-# Prefeitura – Covid
-try:
-    scrape_despesa_covid()
-    print("Prefeitura - Despesas Covid: OK")
-except Exception as e:
-    print("Erro:", e)
-
-# Prefeitura – Passagens e Locomoção
-try:
-    scrape_passagens()
-    print("Prefeitura - Passagens e Locomoção: OK")
-except Exception as e:
-    print("Erro:", e)
-
-# Prefeitura – Investimentos (mensal)
-try:
-    scrape_investimentos(periodo="JANEIRO")
-    print("Prefeitura - Investimentos (Janeiro): OK")
-except Exception as e:
-    print("Erro:", e)
-
-print("\nScraping finalizado.")
+import argparse
+import json
+
+from scraping import http_cache, metrics
+from scraping.orchestrator import camara_job, prefeitura_job, run_jobs, print_summary
+
+# Scrapers da Prefeitura (cada visão é coletada pelo universal_scraper)
+from scraping.prefeitura import despesa_covid
+from scraping.prefeitura import passagens
+from scraping.prefeitura import investimentos
+from scraping.prefeitura import receita_analitica
+from scraping.prefeitura import emendas_parlamentares
+
+
+def build_jobs(incremental=False):
+    """Conjuntos de dados coletados por run_scraping.py"""
+    return [
+        # Câmara Municipal
+        camara_job(),
+        # Receita Analítica (versão limitada para evitar timeouts)
+        prefeitura_job("Prefeitura - Receita Analítica", receita_analitica.VISAO, incremental),
+        # Emendas Parlamentares
+        prefeitura_job("Prefeitura - Emendas Parlamentares", emendas_parlamentares.VISAO, incremental),
+        # Prefeitura – Covid
+        prefeitura_job("Prefeitura - Despesas Covid", despesa_covid.VISAO, incremental),
+        # Prefeitura – Passagens e Locomoção
+        prefeitura_job("Prefeitura - Passagens e Locomoção", passagens.VISAO, incremental),
+        # Prefeitura – Investimentos (mensal)
+        prefeitura_job("Prefeitura - Investimentos (Janeiro)", {**investimentos.VISAO, "periodo": "JANEIRO"}, incremental),
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa todos os scrapers em paralelo")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Tarefas (conjunto, ano) simultâneas (padrão: SCRAPER_MAX_JOBS)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Reaproveita exercícios fechados e busca só as páginas novas dos recentes")
+    parser.add_argument("--cache", action="store_true",
+                        help="Reaproveita as respostas guardadas em data/cache_http (ver SCRAPER_CACHE)")
+    parser.add_argument("--resumo", help="Salva o resumo da execução neste arquivo JSON")
+    parser.add_argument("--metricas", help="Salva as métricas das requisições (por conjunto e ano) neste arquivo JSON")
+    parser.add_argument("--prometheus",
+                        help="Salva as métricas neste arquivo .prom (textfile collector do node_exporter)")
+    args = parser.parse_args()
+    if args.cache:
+        http_cache.enable()
+
+    print("Iniciando scraping...\n")
+
+    summary = run_jobs(build_jobs(args.incremental), max_workers=args.workers)
+    print_summary(summary)
+    relatorio = metrics.report()
+    metrics.print_report(relatorio)
+    if http_cache.is_enabled():
+        print()
+        http_cache.print_stats()
+
+    if args.resumo:
+        with open(args.resumo, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"\nResumo salvo em: {args.resumo}")
+    if args.metricas:
+        metrics.write_report(args.metricas, relatorio)
+        print(f"Métricas salvas em: {args.metricas}")
+    if args.prometheus:
+        metrics.write_prometheus(args.prometheus, relatorio)
+        print(f"Métricas do Prometheus salvas em: {args.prometheus}")
+
+    print("\nScraping finalizado.")
@@ -0,0 +1,250 @@
+# RU4590111 Daniel Elias de Souza
+
+# Esquema declarativo de cada conjunto de dados: nome do campo na fonte, nome exibido,
+# natureza (moeda, data, categoria...), tipo final e se aceita nulos.
+# Coletores e carregadores usam o mesmo esquema, então os tipos não são adivinhados.
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils import convert_brazilian_currency_series
+
+# Formato de data usado pelo portal da Prefeitura ("16/07/2020 00:00")
+PORTAL_DATE_FORMAT = "%d/%m/%Y %H:%M"
+
+# Natureza do campo -> dtype final no pandas
+KINDS = {
+    "moeda": "float64",            # valor no formato brasileiro ("1.234,56")
+    "numero": "float64",           # número já em formato decimal (API da Câmara)
+    "inteiro": "Int64",
+    "data": "datetime64[ns]",      # data no formato PORTAL_DATE_FORMAT
+    "categoria": "category",       # texto com poucos valores distintos
+    "texto": "object",
+}
+# Em categoria e texto, os espaços de preenchimento do portal são removidos e
+# valores vazios viram nulos
+
+# Tipo usado ao ler o CSV; moeda e data são lidas como texto e convertidas depois
+_CSV_DTYPES = {
+    "moeda": "object",
+    "numero": "float64",
+    "inteiro": "Int64",
+    "data": "object",
+    "categoria": "category",
+    "texto": "object",
+}
+
+
+def field(origem, nome, natureza, nulo=True):
+    """Campo do esquema: origem (nome na API), nome exibido, natureza e nulidade"""
+    dtype = "int64" if natureza == "inteiro" and not nulo else KINDS[natureza]
+    return {"origem": origem, "nome": nome, "natureza": natureza, "dtype": dtype, "nulo": nulo}
+
+
+# Despesas da Câmara (API do GeoSIAP): valores já vêm como números
+_MESES = ["jan", "fev", "mar", "abr", "mai", "jun", "jul", "ago", "set", "out", "nov", "dez"]
+_FASES = [("emp", "Empenhado"), ("liq", "Liquidado"), ("pag", "Pago")]
+
+CAMARA = [
+    field("natureza", "Natureza da Despesa", "categoria"),
+    field("elemento", "Elemento", "categoria"),
+    field("vl_previsto", "Valor Previsto", "numero"),
+    field("vl_total_emp", "Total Empenhado", "numero"),
+    field("vl_total_liq", "Total Liquidado", "numero"),
+    field("vl_total_pag", "Total Pago", "numero"),
+] + [
+    field(f"vl_{mes}_{fase}", f"{mes.capitalize()} {nome_fase}", "numero")
+    for fase, nome_fase in _FASES for mes in _MESES
+] + [
+    field("ano", "Ano", "inteiro", nulo=False),
+]
+
+# Formato longo das despesas da Câmara, derivado da tabela larga: uma linha por
+# (ano, mês, natureza, elemento, fase), gravada só em Parquet e ordenada por (Ano, Mês)
+CAMARA_MENSAL = [
+    field("ano", "Ano", "inteiro", nulo=False),
+    field("mes", "Mês", "inteiro", nulo=False),
+    field("natureza", "Natureza da Despesa", "categoria"),
+    field("elemento", "Elemento", "categoria"),
+    field("fase", "Fase", "categoria"),
+    field("valor", "Valor", "numero"),
+]
+
+# Coluna mensal da tabela larga ("Jan Empenhado") -> (mês, fase)
+CAMARA_COLUNAS_MENSAIS = {
+    f"{mes.capitalize()} {nome_fase}": (numero, nome_fase)
+    for _, nome_fase in _FASES for numero, mes in enumerate(_MESES, start=1)
+}
+
+# Empenhos das visões da Prefeitura (COVID, passagens, investimentos, emendas)
+EMPENHOS = [
+    field("NroEmpenho", "Número do Empenho", "inteiro", nulo=False),
+    field("UG", "Unidade Gestora", "categoria"),
+    field("Modalidade", "Modalidade", "categoria"),
+    field("NomeFornecedor", "Nome do Fornecedor", "categoria"),
+    field("DataEmp", "Data do Empenho", "data"),
+    field("ValorEmpenhado", "Valor Empenhado", "moeda"),
+    field("ValorLiquidado", "Valor Liquidado", "moeda"),
+    field("ValorPago", "Valor Pago", "moeda"),
+    field("Programa", "Programa", "categoria"),
+    field("UnidadeOrcamentaria", "Unidade Orçamentária", "categoria"),
+    field("ID", "ID", "inteiro", nulo=False),
+    field("Id", "ID Secundário", "texto"),
+    field("Ano", "Ano", "inteiro", nulo=False),
+    field("DataMovEmp", "Data do Movimento", "data"),
+    field("TipEmpenho", "Tipo de Empenho", "categoria"),
+    field("CNPJ", "CNPJ", "texto"),
+    field("Evento", "Evento", "categoria"),
+    field("Vinculo", "Vínculo", "categoria"),
+    field("FonteRecurso", "Fonte de Recurso", "categoria"),
+    field("Categoria", "Categoria", "categoria"),
+    field("Elemento", "Elemento", "categoria"),
+    field("BemouServico", "Bem ou Serviço", "texto"),
+    field("Itens", "Itens", "texto"),
+    field("Liquidacoes", "Liquidações", "texto"),
+    field("Documentos", "Documentos", "texto"),
+    field("Pagamentos", "Pagamentos", "texto"),
+]
+
+EMENDAS = EMPENHOS + [
+    field("Parlamentar", "Parlamentar", "categoria"),
+    field("Partido", "Partido", "categoria"),
+    field("Emenda", "Número da Emenda", "texto"),
+    field("ValorEmenda", "Valor da Emenda", "moeda"),
+    field("Localidade", "Localidade", "categoria"),
+    field("Objetivo", "Objetivo", "texto"),
+    field("StatusEmenda", "Status da Emenda", "categoria"),
+]
+
+RECEITA = [
+    field("UnidadeGestora", "Unidade Gestora", "categoria"),
+    field("FonteRecursos", "Fonte de Recursos", "categoria"),
+    field("NaturezaReceita", "Natureza da Receita", "categoria"),
+    field("ValorArrecadado", "Valor Arrecadado", "moeda"),
+    field("ValorPrevisto", "Valor Previsto", "moeda"),
+    field("PercentualArrecadacao", "Percentual de Arrecadação", "moeda"),
+    field("Ano", "Ano", "inteiro", nulo=False),
+]
+
+# Arquivo em DATA_DIR -> esquema (os conjuntos gravados só em Parquet, como o formato
+# longo, são registrados pelo nome do .parquet)
+DATASETS = {
+    "camara_despesas_2020_2023.csv": CAMARA,
+    "despesacovid_dados.csv": EMPENHOS,
+    "passagenslocomocao_dados.csv": EMPENHOS,
+    "DespesaseInvestimentos_dados.csv": EMPENHOS,
+    "EmendasParlamentares_dados.csv": EMENDAS,
+    "ReceitaAnalitica_dados.csv": RECEITA,
+    "camara_despesas_mensal_2020_2023.parquet": CAMARA_MENSAL,
+}
+
+# Tabelas largas que também são gravadas no formato longo:
+# arquivo -> (conjunto de dados derivado, coluna larga -> (mês, fase))
+LONG_FORMATS = {
+    "camara_despesas_2020_2023.csv": ("camara_despesas_mensal_2020_2023.parquet", CAMARA_COLUNAS_MENSAIS),
+}
+
+# Agregados mensais e trimestrais gravados junto com o Parquet (storage.write_rollups):
+# soma e contagem de cada valor por período e pelas dimensões
+ROLLUP_EMPENHOS = {
+    "data": "Data do Empenho",
+    "dimensoes": ["Ano", "Programa", "Unidade Orçamentária"],
+    "valores": ["Valor Empenhado", "Valor Liquidado", "Valor Pago"],
+}
+
+ROLLUPS = {
+    "despesacovid_dados.csv": ROLLUP_EMPENHOS,
+    "passagenslocomocao_dados.csv": ROLLUP_EMPENHOS,
+    "DespesaseInvestimentos_dados.csv": ROLLUP_EMPENHOS,
+    "EmendasParlamentares_dados.csv": ROLLUP_EMPENHOS,
+}
+
+
+def get_schema(csv_name):
+    """Esquema de um conjunto de dados pelo nome do arquivo (None se não registrado)"""
+    return DATASETS.get(os.path.basename(csv_name))
+
+
+def get_rollup_spec(csv_name):
+    """Especificação dos agregados por período de um conjunto de dados (None se não houver)"""
+    return ROLLUPS.get(os.path.basename(csv_name))
+
+
+def get_long_format(csv_name):
+    """Formato longo derivado de um conjunto de dados (None se não houver)"""
+    return LONG_FORMATS.get(os.path.basename(csv_name))
+
+
+def rename_to_display(df, schema):
+    """Renomeia os campos da fonte para os nomes exibidos (os desconhecidos ficam como estão)"""
+    if schema is None:
+        return df
+    return df.rename(columns={f["origem"]: f["nome"] for f in schema if f["origem"] in df.columns})
+
+
+def strip_text(series):
+    """
+    Remove os espaços das bordas de uma coluna de texto ("PREGÃO PRESENCIAL      ")
+    e troca textos vazios por nulos. Em colunas categóricas só as categorias são
+    tratadas, e as que ficarem iguais são unidas.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories.astype(str).str.strip()
+        unique = pd.Index(categories.unique()).drop("", errors="ignore")
+        remap = unique.get_indexer(categories)
+        codes = series.cat.codes.to_numpy()
+        new_codes = np.where(codes >= 0, remap[codes], -1)
+        return pd.Series(pd.Categorical.from_codes(new_codes, categories=unique),
+                         index=series.index, name=series.name)
+    stripped = series.where(series.isna(), series.astype(str).str.strip())
+    return stripped.where(stripped != "", None).astype("object")
+
+
+def convert_field(series, f):
+    """Converte uma coluna (texto do CSV/API ou já tipada) para o dtype do campo"""
+    natureza = f["natureza"]
+    if natureza == "moeda":
+        if pd.api.types.is_numeric_dtype(series):
+            return series.astype("float64")
+        return convert_brazilian_currency_series(series)[0]
+    if natureza == "numero":
+        return pd.to_numeric(series, errors="coerce").astype("float64")
+    if natureza == "inteiro":
+        return pd.to_numeric(series, errors="coerce").astype("Int64")
+    if natureza == "data":
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return series
+        return pd.to_datetime(series, format=PORTAL_DATE_FORMAT, errors="coerce")
+    if natureza == "categoria":
+        # Converte antes de tirar os espaços: só os valores distintos são tratados
+        return strip_text(series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype("category"))
+    return strip_text(series)
+
+
+def apply_schema(df, schema):
+    """
+    Aplica os tipos do esquema a um DataFrame com nomes exibidos. Colunas fora do
+    esquema ficam como estão. Nulos em campos que não os aceitam geram um aviso e o
+    campo fica com o tipo inteiro que aceita nulos (Int64).
+    """
+    typed = df.copy()
+    for f in schema:
+        col = f["nome"]
+        if col not in typed.columns:
+            continue
+        converted = convert_field(typed[col], f)
+        if f["dtype"] == "int64":
+            if converted.isna().any():
+                print(f"Aviso: {converted.isna().sum()} valores nulos em '{col}', que não aceita nulos")
+            else:
+                converted = converted.astype("int64")
+        typed[col] = converted
+    return typed
+
+
+def read_csv_typed(path, schema):
+    """Lê um CSV de DATA_DIR já com os tipos do esquema (categorias montadas na leitura)"""
+    header = pd.read_csv(path, nrows=0).columns
+    dtypes = {f["nome"]: _CSV_DTYPES[f["natureza"]] for f in schema if f["nome"] in header}
+    return apply_schema(pd.read_csv(path, dtype=dtypes), schema)
@@ -11,13 +11,14 @@ from scraping.prefeitura.receita_analitica import scrape_receita_analitica_compl
 if __name__ == "__main__":
     print("Iniciando scraping COMPLETO da Receita Analítica (2020-2025)...")
     print("Isso pode levar muito tempo devido ao grande volume de dados.")
-    print("Pressione Ctrl+C para interromper e salvar dados parciais.\n")
+    print("Pressione Ctrl+C para interromper; rode novamente para continuar de onde parou.\n")
 
     try:
-        result = scrape_receita_analitica_completa()
-        print(f"\n✅ Scraping concluído! {len(result)} registros coletados.")
+        total = scrape_receita_analitica_completa()
+        print(f"\n✅ Scraping concluído! {total} registros coletados.")
     except KeyboardInterrupt:
-        print("\n⚠️  Scraping interrompido pelo usuário. Dados parciais foram salvos.")
+        print("\n⚠️  Scraping interrompido pelo usuário. As páginas já coletadas estão no spool (data/spool).")
+        print("Rode novamente para continuar de onde parou.")
     except Exception as e:
         print(f"\n❌ Erro durante scraping: {e}")
-        print("Dados parciais podem ter sido salvos.")
\ No newline at end of file
+        print("As páginas já coletadas estão no spool; rode novamente para continuar.")
\ No newline at end of file
@@ -2,11 +2,13 @@
 
 import requests
 import pandas as pd
-import os
-from config import DATA_DIR
-from utils import rename_columns
+from config import CAMARA_API_URL
+from scraping import http_cache, metrics, raw_archive
+from scraping.retry import send_with_retry
+from storage import save_dataset
+from schemas import CAMARA, rename_to_display
 
-BASE_URL = "https://cmmarilia.geosiap.net.br/portal-transparencia/api/default/execucao/detalhamento_despesas/detalhamento_despesas"
+BASE_URL = CAMARA_API_URL
 
 HEADERS = {
     "Accept": "application/json",
@@ -14,6 +16,13 @@ HEADERS = {
     "Referer": "https://cmmarilia.geosiap.net.br/portal-transparencia/execucao/detalhamento-despesas"
 }
 
+ANOS = range(2020, 2024)
+
+REQUEST_TIMEOUT = 120  # segundos
+
+# Nome do conjunto de dados nas métricas da coleta (scraping/metrics)
+METRICS_NAME = "camara_despesas"
+
 def fetch_despesas_ano(ano):
     """Coleta despesas da Câmara para um ano específico usando GET."""
     params = {
@@ -22,10 +31,18 @@ def fetch_despesas_ano(ano):
         "dias": 0
     }
 
-    response = requests.get(BASE_URL, params=params, headers=HEADERS)
-    response.raise_for_status()
-
-    data = response.json()
+    data = http_cache.get(BASE_URL, params=params)
+    origem = "cache"
+    if data is None:
+        # Mesma política da Prefeitura: novas tentativas, disjuntor e limite de conexões
+        response = send_with_retry(
+            lambda: requests.get(BASE_URL, params=params, headers=HEADERS, timeout=REQUEST_TIMEOUT),
+            BASE_URL, f"Câmara {ano}", (METRICS_NAME, ano)
+        )
+        data = response.json()
+        http_cache.put(BASE_URL, data, params=params, ano=ano)
+        origem = "portal"
+    metrics.record_page(METRICS_NAME, ano, len(data.get("detalhamento_despesas", [])), origem)
 
     # A API retorna um dicionário com chave "detalhamento_despesas"
     if "detalhamento_despesas" in data:
@@ -34,25 +51,45 @@ def fetch_despesas_ano(ano):
     return []
 
 
-def scrape_camara_despesas_2020_2023():
-    os.makedirs(DATA_DIR, exist_ok=True)
+def scrape_camara_ano(ano):
+    """Coleta as despesas de um ano já com a coluna "ano" preenchida."""
+    print(f"Coletando dados da Câmara para {ano}...")
+    rows = fetch_despesas_ano(ano)
+
+    for r in rows:
+        r["ano"] = ano
 
+    return rows
+
+
+def scrape_camara_despesas_2020_2023():
     all_rows = []
 
-    for ano in range(2020, 2024):
-        print(f"Coletando dados da Câmara para {ano}...")
-        rows = fetch_despesas_ano(ano)
+    for ano in ANOS:
+        all_rows.extend(scrape_camara_ano(ano))
 
-        for r in rows:
-            r["ano"] = ano
+    return save_camara(all_rows)
 
-        all_rows.extend(rows)
 
+def save_camara(all_rows):
+    """Monta o DataFrame da Câmara, renomeia as colunas e salva em DATA_DIR"""
+    archive_camara(all_rows)
     df = pd.DataFrame(all_rows)
 
     # Renomeia colunas para português antes de salvar
-    df = rename_columns(df, "camara")
+    df = rename_to_display(df, CAMARA)
 
-    df.to_csv(f"{DATA_DIR}/camara_despesas_2020_2023.csv", index=False, encoding="utf-8")
+    # CSV + Parquet tipado (lido diretamente pelo dashboard)
+    save_dataset(df, "camara_despesas_2020_2023.csv")
 
     return df
+
+
+def archive_camara(all_rows):
+    """Guarda os registros brutos de cada ano (sem a coluna "ano", acrescentada na coleta)"""
+    por_ano = {}
+    for row in all_rows:
+        por_ano.setdefault(row["ano"], []).append({k: v for k, v in row.items() if k != "ano"})
+    for ano, registros in por_ano.items():
+        raw_archive.write_year("camara", "detalhamento_despesas", ano, [registros])
+    raw_archive.write_meta("camara", "detalhamento_despesas", "camara_despesas_2020_2023.csv", "ano", False, por_ano)
@@ -0,0 +1,107 @@
+# RU4590111 Daniel Elias de Souza
+
+# Limite global de requisições simultâneas por servidor (compartilhado entre threads),
+# ajustado por AIMD conforme as respostas: sobe devagar enquanto o servidor responde
+# bem e cai pela metade quando ele dá sinal de sobrecarga
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from config import HOST_CONCURRENCY
+
+# Resposta mais lenta que isso vezes a latência de referência conta como sobrecarga
+LATENCY_TOLERANCE = 3.0
+# Peso de cada resposta na latência de referência (média móvel exponencial)
+LATENCY_SMOOTHING = 0.1
+# Intervalo mínimo entre duas reduções: uma rajada de erros reduz o limite só uma vez
+DECREASE_COOLDOWN = 2.0  # segundos
+
+_lock = threading.Lock()
+_limits = {}
+
+
+class AdaptiveLimit:
+    """
+    Limite de requisições simultâneas a um servidor, entre 1 e o teto configurado.
+    Aumento aditivo: +1 a cada `limite` respostas normais (cerca de +1 por rodada).
+    Redução multiplicativa: metade em erro 524/429/503, tempo esgotado ou resposta
+    LATENCY_TOLERANCE vezes mais lenta que a referência.
+    """
+
+    def __init__(self, ceiling):
+        self.ceiling = ceiling
+        self.limit = float(ceiling)
+        self.in_flight = 0
+        self.reference_latency = None
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, latency):
+        """Resposta normal: aumenta o limite, a menos que tenha sido lenta demais"""
+        with self._condition:
+            reference = self.reference_latency
+            if reference is not None and latency > reference * LATENCY_TOLERANCE:
+                self._decrease()
+            else:
+                self.limit = min(self.ceiling, self.limit + 1 / self.limit)
+            self.reference_latency = latency if reference is None else (
+                (1 - LATENCY_SMOOTHING) * reference + LATENCY_SMOOTHING * latency
+            )
+            self._condition.notify_all()
+
+    def on_overload(self):
+        """Sinal de sobrecarga do servidor: reduz o limite pela metade"""
+        with self._condition:
+            self._decrease()
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease < DECREASE_COOLDOWN:
+            return
+        self._last_decrease = now
+        previous = int(self.limit)
+        self.limit = max(1.0, self.limit / 2)
+        if int(self.limit) < previous:
+            print(f"Servidor sobrecarregado: limite de conexões reduzido de {previous} para {int(self.limit)}")
+
+
+def host_limit(url):
+    """Limite adaptativo do servidor da URL (None se o servidor não tem teto configurado)"""
+    host = urlparse(url).hostname
+    with _lock:
+        if host not in _limits:
+            ceiling = HOST_CONCURRENCY.get(host)
+            _limits[host] = AdaptiveLimit(ceiling) if ceiling else None
+        return _limits[host]
+
+
+def reset_limits():
+    """Volta todos os limites ao teto (o ajuste recomeça do zero)"""
+    with _lock:
+        _limits.clear()
+
+
+@contextmanager
+def host_slot(url):
+    """Ocupa uma das conexões permitidas para o servidor da URL enquanto durar o bloco"""
+    limit = host_limit(url)
+    if limit is None:
+        yield
+        return
+    limit.acquire()
+    try:
+        yield
+    finally:
+        limit.release()
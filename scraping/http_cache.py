@@ -0,0 +1,197 @@
+# RU4590111 Daniel Elias de Souza
+
+# Cache em disco (opcional) das respostas dos portais: uma nova execução dos scrapers
+# (ex.: depois de mudar rename_columns ou o pós-processamento) lê as páginas já
+# baixadas em vez de buscá-las de novo
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import date
+
+from config import DATA_DIR, SCRAPER_CACHE, SCRAPER_CACHE_MAX_MB, SCRAPER_CACHE_TTL_HORAS
+
+CACHE_DIR = "cache_http"
+
+# Exercícios fechados (antes do anterior ao atual) não mudam mais: não expiram
+OPEN_YEARS = 2
+
+# Ao passar do limite de tamanho, remove as entradas menos usadas até sobrar esta fração
+EVICT_TO = 0.9
+
+_lock = threading.Lock()
+_state = {"ativo": SCRAPER_CACHE, "bytes": None}
+_stats = {"acertos": 0, "faltas": 0, "expiradas": 0, "alteradas": 0, "inalteradas": 0, "removidas": 0}
+
+
+def enable(ativo=True):
+    """Liga (ou desliga) o cache nesta execução, além do SCRAPER_CACHE do ambiente"""
+    _state["ativo"] = ativo
+
+
+def is_enabled():
+    return _state["ativo"]
+
+
+def _cache_path():
+    return os.path.join(DATA_DIR, CACHE_DIR)
+
+
+def _canonical(value):
+    """Forma canônica da requisição: chaves ordenadas e valores como texto (2024 == "2024")"""
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return None if value is None else str(value)
+
+
+def request_key(url, payload=None, params=None):
+    """Chave da requisição: hash da URL com o corpo (POST) ou os parâmetros (GET)"""
+    canonical = json.dumps(_canonical({"url": url, "payload": payload, "params": params}),
+                           ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def content_hash(data):
+    """Hash do conteúdo da resposta, independente da ordem das chaves"""
+    return hashlib.sha256(json.dumps(data, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _entry_path(key):
+    return os.path.join(_cache_path(), key[:2], f"{key}.json.gz")
+
+
+def _read_entry(path):
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, EOFError, OSError, json.JSONDecodeError):
+        return None
+
+
+def _is_fresh(entry, current_year=None):
+    ano = entry.get("ano")
+    current_year = current_year or date.today().year
+    if ano is not None and int(ano) <= current_year - OPEN_YEARS:
+        return True
+    return time.time() - entry["gravado_em"] < SCRAPER_CACHE_TTL_HORAS * 3600
+
+
+def get(url, payload=None, params=None):
+    """
+    Resposta guardada da requisição, ou None (cache desligado, ausente ou expirada).
+    Exercícios fechados nunca expiram; os demais valem por SCRAPER_CACHE_TTL_HORAS.
+    """
+    if not is_enabled():
+        return None
+    path = _entry_path(request_key(url, payload, params))
+    entry = _read_entry(path)
+    if entry is None or not _is_fresh(entry):
+        with _lock:
+            _stats["expiradas" if entry is not None else "faltas"] += 1
+        return None
+
+    # O mtime marca o último uso: é a ordem de remoção (LRU)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    with _lock:
+        _stats["acertos"] += 1
+    return entry["resposta"]
+
+
+def put(url, data, payload=None, params=None, ano=None):
+    """
+    Guarda a resposta (JSON compactado com gzip). Compara o hash do conteúdo com o
+    da entrada anterior da mesma requisição; retorna True se mudou (ou era nova).
+    """
+    if not is_enabled():
+        return True
+    path = _entry_path(request_key(url, payload, params))
+    digest = content_hash(data)
+    previous = _read_entry(path)
+    changed = previous is None or previous.get("hash") != digest
+
+    entry = {
+        "url": url,
+        "payload": payload,
+        "params": params,
+        "ano": ano,
+        "gravado_em": time.time(),
+        "hash": digest,
+        "resposta": data,
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump(entry, f, ensure_ascii=False)
+    size = os.path.getsize(tmp_path)
+    old_size = os.path.getsize(path) if os.path.exists(path) else 0
+    os.replace(tmp_path, path)
+
+    with _lock:
+        if previous is not None:
+            _stats["alteradas" if changed else "inalteradas"] += 1
+        if _state["bytes"] is not None:
+            _state["bytes"] += size - old_size
+    _evict_if_needed()
+    return changed
+
+
+def _entries():
+    """(caminho, bytes, mtime) de todas as entradas do cache"""
+    entries = []
+    for root, _, files in os.walk(_cache_path()):
+        for name in files:
+            if name.endswith(".json.gz"):
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+    return entries
+
+
+def _evict_if_needed():
+    """Remove as entradas usadas há mais tempo quando o cache passa de SCRAPER_CACHE_MAX_MB"""
+    limit = SCRAPER_CACHE_MAX_MB * 1024 * 1024
+    with _lock:
+        if _state["bytes"] is None:
+            _state["bytes"] = sum(size for _, size, _ in _entries())
+        if _state["bytes"] <= limit:
+            return
+
+        entries = sorted(_entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= limit * EVICT_TO:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            _stats["removidas"] += 1
+        _state["bytes"] = total
+
+
+def stats():
+    """Contadores desta execução e tamanho atual do cache"""
+    with _lock:
+        result = dict(_stats)
+    entries = _entries()
+    result["entradas"] = len(entries)
+    result["megabytes"] = round(sum(size for _, size, _ in entries) / 1024 / 1024, 2)
+    return result
+
+
+def print_stats():
+    s = stats()
+    print(f"Cache HTTP: {s['acertos']} acertos, {s['faltas']} faltas, {s['expiradas']} expiradas; "
+          f"{s['alteradas']} respostas alteradas e {s['inalteradas']} inalteradas desde a última coleta; "
+          f"{s['removidas']} removidas (LRU); {s['entradas']} entradas, {s['megabytes']} MB")
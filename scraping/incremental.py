@@ -0,0 +1,178 @@
+# RU4590111 Daniel Elias de Souza
+
+# Atualização incremental das visões da Prefeitura: reaproveita os exercícios fechados
+# e busca apenas as páginas novas dos exercícios recentes
+import os
+from datetime import date
+
+import pandas as pd
+
+from config import DATA_DIR
+from schemas import get_schema, rename_to_display
+from scraping import metrics, raw_archive
+from scraping.page_size import DEFAULT_PAGE_SIZE, remembered_size
+from scraping.universal_scraper import SAVE_CHUNK_ROWS, build_payload, fetch_page
+from storage import save_dataset_chunks
+
+# Exercícios ainda abertos: o atual e o anterior (restos a pagar ainda mudam)
+RECENT_YEARS = 2
+
+
+def dataset_csv_name(visao):
+    return f"{visao['nome_visao']}_dados.csv"
+
+
+def _ordered_by_empenho(visao):
+    """As páginas só podem ser percorridas do fim se a visão vier ordenada por NroEmpenho"""
+    return bool(visao["ordenacao"]) and visao["ordenacao"][0].get("ColunaOrdem") == "NroEmpenho"
+
+
+def plan_refresh(visao, current_year=None):
+    """
+    Decide, a partir do conjunto de dados já salvo, quais anos são reaproveitados
+    (exercícios fechados já coletados) e quais são buscados no portal. Para os anos
+    buscados, devolve os IDs já conhecidos (como texto, a forma lida do CSV).
+    """
+    current_year = current_year or date.today().year
+    path = os.path.join(DATA_DIR, dataset_csv_name(visao))
+
+    linhas = {}
+    ids = {}
+    if os.path.exists(path):
+        header = pd.read_csv(path, nrows=0).columns
+        usecols = [col for col in ("ID", "Ano") if col in header]
+        if "Ano" in usecols:
+            existing = pd.read_csv(path, usecols=usecols, dtype=str, keep_default_na=False)
+            anos = existing["Ano"].astype(int)
+            linhas = existing.groupby(anos).size().to_dict()
+            if "ID" in usecols:
+                ids = existing.groupby(anos)["ID"].agg(set).to_dict()
+
+    reutilizar = [ano for ano in visao["anos"] if ano in linhas and ano <= current_year - RECENT_YEARS]
+    buscar = [ano for ano in visao["anos"] if ano not in reutilizar]
+    return {
+        "reutilizar": reutilizar,
+        "buscar": buscar,
+        "linhas": linhas,
+        "ids": {ano: ids.get(ano, set()) for ano in buscar},
+    }
+
+
+def fetch_year(session, executor, visao, ano, known_ids, batch_size):
+    """
+    Busca um exercício recente. A página 1 informa o total de páginas; como os
+    empenhos novos ficam no fim (ordem por NroEmpenho), as páginas são buscadas do
+    fim para o começo, em lotes de batch_size, até aparecer uma página só com IDs
+    já conhecidos (known_ids: IDs como texto). Retorna (linhas, completo), onde
+    completo indica que todas as páginas do ano foram buscadas.
+    """
+    tamanho = remembered_size(visao["chave_modulo"]) or DEFAULT_PAGE_SIZE
+
+    def payload(pagina):
+        return build_payload(visao["chave_modulo"], visao["nome_visao"], visao["periodicidade"],
+                             visao.get("periodo"), ano, pagina, visao["ordenacao"], tamanho)
+
+    first = fetch_page(session, payload(1))
+    pages = {1: first.get("Valores", [])}
+    if not pages[1]:
+        return [], True
+    total_paginas = first.get("QuantidadePaginas", 1)
+
+    early_stop = bool(known_ids) and _ordered_by_empenho(visao)
+    pagina = total_paginas
+    while pagina > 1:
+        batch = list(range(pagina, max(1, pagina - batch_size), -1))
+        for p, data in zip(batch, executor.map(lambda p: fetch_page(session, payload(p)), batch)):
+            pages[p] = data.get("Valores", [])
+            print(f"  Página {p}/{total_paginas}")
+        pagina -= batch_size
+
+        if early_stop and any(
+            pages[p] and all(str(row.get("ID")) in known_ids for row in pages[p]) for p in batch
+        ):
+            break
+
+    completo = len(pages) == total_paginas
+    if not completo:
+        print(f"  {ano}: {len(pages)} de {total_paginas} páginas buscadas (restante já conhecido)")
+        metrics.record_skipped(visao["nome_visao"], ano, total_paginas - len(pages), "conhecida")
+
+    rows = []
+    for p in sorted(pages):
+        for row in pages[p]:
+            row["Ano"] = ano
+        rows.extend(pages[p])
+    return rows, completo
+
+
+def _merge_year(existing, fetched, completo):
+    """
+    Junta as linhas buscadas com as já salvas de um ano (existing: lidas do CSV como
+    texto). Ano buscado por completo substitui o anterior; busca parcial faz upsert
+    pelo ID (a versão nova vence).
+    """
+    if completo or existing is None or existing.empty or "ID" not in fetched or "ID" not in existing:
+        return fetched
+    kept = existing[~existing["ID"].isin(fetched["ID"].astype(str))]
+    merged = pd.concat([kept, fetched], ignore_index=True)
+    if "Número do Empenho" in merged:
+        merged = merged.sort_values("Número do Empenho", kind="stable",
+                                    key=lambda col: pd.to_numeric(col, errors="coerce"))
+    return merged
+
+
+def save_incremental(visao, fetched):
+    """
+    Regrava o conjunto de dados: os anos não buscados são copiados do arquivo atual
+    em blocos, lidos como texto para passarem sem alteração (inclusive "N/A", "null"
+    etc.); os buscados (fetched: ano -> (linhas, completo)) são mesclados.
+    Retorna o número de linhas salvas.
+    """
+    csv_name = dataset_csv_name(visao)
+    path = os.path.join(DATA_DIR, csv_name)
+    schema = get_schema(csv_name)
+
+    novos = {ano: rename_to_display(pd.DataFrame(rows), schema) for ano, (rows, _) in fetched.items()}
+
+    # Colunas do arquivo atual seguidas das que aparecerem só nos dados novos
+    columns = list(pd.read_csv(path, nrows=0).columns) if os.path.exists(path) else []
+    use_existing = "Ano" in columns
+    for df in novos.values():
+        columns += [col for col in df.columns if col not in columns]
+
+    anos_salvos = set()
+
+    def chunks():
+        recentes = []
+        if use_existing:
+            buscados = [str(ano) for ano in fetched]
+            for chunk in pd.read_csv(path, chunksize=SAVE_CHUNK_ROWS, dtype=str, keep_default_na=False):
+                buscado = chunk["Ano"].isin(buscados)
+                if (~buscado).any():
+                    anos_salvos.update(chunk.loc[~buscado, "Ano"].astype(int).unique().tolist())
+                    yield chunk[~buscado].reindex(columns=columns)
+                if buscado.any():
+                    recentes.append(chunk[buscado])
+        existing = pd.concat(recentes, ignore_index=True) if recentes else None
+
+        for ano in visao["anos"]:
+            if ano in novos:
+                anteriores = existing[existing["Ano"] == str(ano)] if existing is not None else None
+                merged = _merge_year(anteriores, novos[ano], fetched[ano][1])
+                if not merged.empty:
+                    anos_salvos.add(ano)
+                    yield merged.reindex(columns=columns)
+
+    # CSV + Parquet tipado (lido diretamente pelo dashboard)
+    filename, total = save_dataset_chunks(chunks(), csv_name)
+    print(f"Arquivo salvo em: {filename} ({total} linhas, atualização incremental)")
+
+    # Registros brutos: ano buscado por completo substitui o arquivado; busca parcial é mesclada
+    for ano, (rows, completo) in fetched.items():
+        registros = [{k: v for k, v in row.items() if k != "Ano"} for row in rows]
+        if completo:
+            raw_archive.write_year("prefeitura", visao["nome_visao"], ano, [registros])
+        else:
+            raw_archive.merge_year("prefeitura", visao["nome_visao"], ano, registros, ordem="NroEmpenho")
+    raw_archive.write_meta("prefeitura", visao["nome_visao"], csv_name, "Ano", True, anos_salvos)
+    return total
@@ -0,0 +1,266 @@
+# RU4590111 Daniel Elias de Souza
+
+# Métricas da coleta por conjunto de dados e ano: cada requisição (latência, bytes,
+# status, nova tentativa), linhas por página, páginas puladas e requisições da
+# sondagem do tamanho de página. Exportadas como relatório JSON e como arquivo
+# texto do Prometheus (textfile collector)
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_lock = threading.Lock()
+_series = {}
+_started_at = {"execucao": time.time()}
+
+
+def _serie(conjunto, ano):
+    key = (conjunto, str(ano))
+    if key not in _series:
+        _series[key] = {
+            "latencias": [],
+            "bytes": 0,
+            "status": {},
+            "novas_tentativas": 0,
+            "paginas": {},
+            "linhas": {},
+            "puladas": {},
+            "sondagem": {"requisicoes": 0, "status": {}, "segundos": 0.0, "bytes": 0},
+            "inicio": None,
+            "fim": None,
+        }
+    return _series[key]
+
+
+def reset():
+    """Zera as métricas (nova execução)"""
+    with _lock:
+        _series.clear()
+        _started_at["execucao"] = time.time()
+
+
+def record_request(conjunto, ano, status, latencia, tamanho=0, tentativa=1, sondagem=False):
+    """
+    Uma requisição enviada ao portal: status HTTP (ou "tempo_esgotado"/"conexao"/"erro"),
+    latência em segundos, bytes da resposta e número da tentativa (1 = primeira).
+    Requisições da sondagem do tamanho de página (sondagem=True) são contadas à
+    parte: não entram nas latências, na duração nem na vazão da coleta.
+    """
+    now = time.time()
+    with _lock:
+        serie = _serie(conjunto, ano)
+        if sondagem:
+            probe = serie["sondagem"]
+            probe["requisicoes"] += 1
+            probe["status"][str(status)] = probe["status"].get(str(status), 0) + 1
+            probe["segundos"] += latencia
+            probe["bytes"] += tamanho
+            return
+        serie["latencias"].append(latencia)
+        serie["bytes"] += tamanho
+        serie["status"][str(status)] = serie["status"].get(str(status), 0) + 1
+        if tentativa > 1:
+            serie["novas_tentativas"] += 1
+        inicio = now - latencia
+        serie["inicio"] = inicio if serie["inicio"] is None else min(serie["inicio"], inicio)
+        serie["fim"] = now if serie["fim"] is None else max(serie["fim"], now)
+
+
+def record_page(conjunto, ano, linhas, origem="portal", paginas=1):
+    """
+    Página(s) obtida(s) e o número de linhas delas. Origem: "portal", "cache" ou
+    "spool" (já gravadas por uma execução anterior interrompida, retomadas agora)
+    """
+    with _lock:
+        serie = _serie(conjunto, ano)
+        serie["paginas"][origem] = serie["paginas"].get(origem, 0) + paginas
+        serie["linhas"][origem] = serie["linhas"].get(origem, 0) + linhas
+
+
+def record_skipped(conjunto, ano, paginas, motivo):
+    """
+    Páginas que faltam no resultado ou que não precisaram ser buscadas (motivo:
+    "conhecida" = atualização incremental parou antes, "pendente" = falharam)
+    """
+    if not paginas:
+        return
+    with _lock:
+        serie = _serie(conjunto, ano)
+        serie["puladas"][motivo] = serie["puladas"].get(motivo, 0) + paginas
+
+
+def _latency_summary(latencias):
+    if not latencias:
+        return {f"p{int(q * 100)}": None for q in QUANTILES} | {"media": None, "max": None}
+    values = np.percentile(latencias, [q * 100 for q in QUANTILES])
+    summary = {f"p{int(q * 100)}": round(float(v), 4) for q, v in zip(QUANTILES, values)}
+    summary["media"] = round(float(np.mean(latencias)), 4)
+    summary["max"] = round(float(np.max(latencias)), 4)
+    return summary
+
+
+def _summarize(series):
+    """Resumo de uma ou mais séries (conjunto, ano) juntas"""
+    latencias = [lat for serie in series for lat in serie["latencias"]]
+    status, paginas, linhas_origem, puladas, sondagem_status = {}, {}, {}, {}, {}
+    for serie in series:
+        for target, source in ((status, serie["status"]), (paginas, serie["paginas"]),
+                               (linhas_origem, serie["linhas"]), (puladas, serie["puladas"]),
+                               (sondagem_status, serie["sondagem"]["status"])):
+            for key, value in source.items():
+                target[key] = target.get(key, 0) + value
+    inicios = [serie["inicio"] for serie in series if serie["inicio"] is not None]
+    fins = [serie["fim"] for serie in series if serie["fim"] is not None]
+    duracao = max(fins) - min(inicios) if inicios else 0.0
+    linhas = sum(linhas_origem.values())
+    # A vazão conta só as linhas recebidas nesta execução (não as retomadas do spool)
+    linhas_recebidas = linhas - linhas_origem.get("spool", 0)
+    total_bytes = sum(serie["bytes"] for serie in series)
+    return {
+        "requisicoes": len(latencias),
+        "novas_tentativas": sum(serie["novas_tentativas"] for serie in series),
+        "status": dict(sorted(status.items())),
+        "erros_524": status.get("524", 0),
+        "bytes": total_bytes,
+        "paginas": paginas,
+        "paginas_puladas": puladas,
+        "linhas": linhas,
+        "linhas_por_origem": linhas_origem,
+        "linhas_por_pagina": round(linhas / sum(paginas.values()), 1) if paginas else None,
+        "latencia": _latency_summary(latencias),
+        "duracao": round(duracao, 3),
+        "linhas_por_segundo": round(linhas_recebidas / duracao, 1) if duracao else None,
+        "bytes_por_segundo": round(total_bytes / duracao, 1) if duracao else None,
+        "sondagem": {
+            "requisicoes": sum(serie["sondagem"]["requisicoes"] for serie in series),
+            "status": dict(sorted(sondagem_status.items())),
+            "segundos": round(sum(serie["sondagem"]["segundos"] for serie in series), 3),
+            "bytes": sum(serie["sondagem"]["bytes"] for serie in series),
+        },
+    }
+
+
+def report():
+    """Relatório da execução: totais e detalhes por conjunto de dados e por ano"""
+    with _lock:
+        series = {key: {**serie, "latencias": list(serie["latencias"])} for key, serie in _series.items()}
+
+    conjuntos = {}
+    for conjunto in sorted({key[0] for key in series}):
+        anos = {ano: series[(c, ano)] for c, ano in sorted(series) if c == conjunto}
+        conjuntos[conjunto] = {
+            **_summarize(list(anos.values())),
+            "anos": {ano: _summarize([serie]) for ano, serie in anos.items()},
+        }
+    return {
+        "inicio": datetime.fromtimestamp(_started_at["execucao"]).isoformat(timespec="seconds"),
+        "fim": datetime.now().isoformat(timespec="seconds"),
+        "total": _summarize(list(series.values())),
+        "conjuntos": conjuntos,
+    }
+
+
+def _write_atomic(path, text):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(path + ".tmp", path)
+
+
+def write_report(path, data=None):
+    """Grava o relatório JSON da execução"""
+    _write_atomic(path, json.dumps(data or report(), ensure_ascii=False, indent=2))
+
+
+def _labels(**labels):
+    escaped = {k: str(v).replace("\\", "\\\\").replace('"', '\\"') for k, v in labels.items()}
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped.items()) + "}"
+
+
+# Métricas do arquivo do Prometheus: nome -> (tipo, descrição)
+PROMETHEUS_METRICS = {
+    "scraper_requests_total": ("counter", "Requisições enviadas, por status"),
+    "scraper_retries_total": ("counter", "Requisições que eram novas tentativas"),
+    "scraper_response_bytes_total": ("counter", "Bytes recebidos nas respostas"),
+    "scraper_pages_total": ("counter", "Páginas obtidas, por origem"),
+    "scraper_pages_skipped_total": ("counter", "Páginas faltando ou não necessárias, por motivo"),
+    "scraper_rows_total": ("counter", "Linhas obtidas, por origem"),
+    "scraper_probe_requests_total": ("counter", "Requisições da sondagem do tamanho de página, por status"),
+    "scraper_probe_seconds_total": ("counter", "Tempo gasto nas requisições da sondagem"),
+    "scraper_request_latency_seconds": ("summary", "Latência das requisições"),
+    "scraper_rows_per_second": ("gauge", "Linhas recebidas por segundo de coleta"),
+    "scraper_duration_seconds": ("gauge", "Duração da coleta"),
+}
+
+
+def _prometheus_samples(s):
+    """(métrica, rótulos além de conjunto e ano, valor) do resumo de um ano"""
+    for status, count in s["status"].items():
+        yield "scraper_requests_total", {"status": status}, count
+    yield "scraper_retries_total", {}, s["novas_tentativas"]
+    yield "scraper_response_bytes_total", {}, s["bytes"]
+    for origem, count in s["paginas"].items():
+        yield "scraper_pages_total", {"origem": origem}, count
+    for motivo, count in s["paginas_puladas"].items():
+        yield "scraper_pages_skipped_total", {"motivo": motivo}, count
+    for origem, count in s["linhas_por_origem"].items():
+        yield "scraper_rows_total", {"origem": origem}, count
+    for status, count in s["sondagem"]["status"].items():
+        yield "scraper_probe_requests_total", {"status": status}, count
+    if s["sondagem"]["requisicoes"]:
+        yield "scraper_probe_seconds_total", {}, s["sondagem"]["segundos"]
+    if s["requisicoes"]:
+        for q in QUANTILES:
+            yield "scraper_request_latency_seconds", {"quantile": q}, s["latencia"][f"p{int(q * 100)}"]
+        yield "scraper_request_latency_seconds_sum", {}, round(s["latencia"]["media"] * s["requisicoes"], 4)
+        yield "scraper_request_latency_seconds_count", {}, s["requisicoes"]
+    if s["linhas_por_segundo"] is not None:
+        yield "scraper_rows_per_second", {}, s["linhas_por_segundo"]
+    yield "scraper_duration_seconds", {}, s["duracao"]
+
+
+def prometheus_text(data=None):
+    """Métricas no formato texto do Prometheus, por conjunto de dados e ano"""
+    data = data or report()
+    samples = {name: [] for name in PROMETHEUS_METRICS}
+    for conjunto, detalhes in data["conjuntos"].items():
+        for ano, s in detalhes["anos"].items():
+            for name, labels, value in _prometheus_samples(s):
+                family = name.removesuffix("_sum").removesuffix("_count")
+                samples[family].append(f"{name}{_labels(conjunto=conjunto, ano=ano, **labels)} {value}")
+
+    lines = []
+    for name, (kind, help_text) in PROMETHEUS_METRICS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"] + samples[name]
+    lines += [
+        "# HELP scraper_last_run_timestamp_seconds Fim da última execução",
+        "# TYPE scraper_last_run_timestamp_seconds gauge",
+        f"scraper_last_run_timestamp_seconds {time.time():.0f}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path, data=None):
+    """Grava o arquivo .prom (troca atômica, como pede o textfile collector do node_exporter)"""
+    _write_atomic(path, prometheus_text(data))
+
+
+def _cell(value, width, spec):
+    return f"{value:>{width}{spec}}" if value is not None else f"{'-':>{width}}"
+
+
+def print_report(data=None):
+    """Tabela curta por conjunto de dados: requisições, 524, latências e vazão"""
+    data = data or report()
+    print(f"\n{'Conjunto':<28} {'Req.':>6} {'Ret.':>5} {'524':>4} {'p50 (s)':>8} {'p95 (s)':>8} "
+          f"{'p99 (s)':>8} {'linhas/s':>9} {'MB':>7}")
+    for conjunto, s in data["conjuntos"].items():
+        lat = s["latencia"]
+        print(f"{conjunto:<28} {s['requisicoes']:>6} {s['novas_tentativas']:>5} {s['erros_524']:>4} "
+              f"{_cell(lat['p50'], 8, '.3f')} {_cell(lat['p95'], 8, '.3f')} {_cell(lat['p99'], 8, '.3f')} "
+              f"{_cell(s['linhas_por_segundo'], 9, ',.0f')} {s['bytes'] / 1024 / 1024:>7.1f}")
@@ -0,0 +1,229 @@
+# RU4590111 Daniel Elias de Souza
+
+# Execução paralela dos scrapers: cada (conjunto de dados, ano) é uma tarefa independente
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+from config import HOST_CONCURRENCY, SCRAPER_MAX_JOBS, SCRAPER_MAX_WORKERS
+from scraping import camara_api, incremental, universal_scraper
+
+
+class IncompleteYearError(Exception):
+    """O ano terminou com páginas pendentes; linhas: as que já foram coletadas"""
+
+    def __init__(self, mensagem, linhas=0):
+        super().__init__(mensagem)
+        self.linhas = linhas
+
+
+def prefeitura_job(nome, visao, incremental=False):
+    """
+    Descreve a coleta de uma visão do portal da Prefeitura (ver VISAO em
+    scraping/prefeitura). As páginas vão para o spool da visão e são gravadas no
+    conjunto de dados final só quando todos os anos terminam.
+    """
+    if incremental:
+        return incremental_job(nome, visao)
+
+    # O spool é aberto na primeira tarefa, com a sessão compartilhada, porque o
+    # tamanho de página pode precisar ser sondado antes
+    estado = {"spool": None}
+    lock = threading.Lock()
+
+    def abrir_spool(sessao):
+        with lock:
+            if estado["spool"] is None:
+                tamanho = universal_scraper.choose_page_size(
+                    sessao, visao["chave_modulo"], visao["nome_visao"], visao["periodicidade"],
+                    visao.get("periodo"), visao["anos"], visao["ordenacao"]
+                )
+                estado["spool"] = universal_scraper.open_spool(
+                    visao["chave_modulo"], visao["nome_visao"], visao["periodicidade"],
+                    visao.get("periodo"), visao["ordenacao"], tamanho
+                )
+            return estado["spool"]
+
+    def coletar_ano(contexto, ano):
+        spool = abrir_spool(contexto["sessao"])
+        linhas = universal_scraper.scrape_ano(
+            contexto["sessao"], contexto["executor_paginas"], spool,
+            visao["chave_modulo"], visao["nome_visao"], visao["periodicidade"],
+            visao.get("periodo"), ano, visao["ordenacao"]
+        )
+        # scrape_ano desiste sem levantar exceção: o ano incompleto é reportado como erro
+        if spool.total_paginas(ano) is None:
+            raise IncompleteYearError("total de páginas desconhecido (páginas pendentes no spool)", linhas)
+        pendentes = spool.missing_pages(ano)
+        if pendentes:
+            raise IncompleteYearError(f"{len(pendentes)} páginas pendentes no spool", linhas)
+        return linhas
+
+    def salvar():
+        if estado["spool"] is None:
+            return 0
+        return universal_scraper.save_visao(visao["nome_visao"], estado["spool"], visao["anos"])
+
+    return {
+        "nome": nome,
+        "host": urlparse(universal_scraper.URL).hostname,
+        "anos": list(visao["anos"]),
+        "coletar_ano": coletar_ano,
+        "salvar": salvar,
+    }
+
+
+def incremental_job(nome, visao):
+    """
+    Variante de prefeitura_job que reaproveita os exercícios fechados já salvos e
+    busca só as páginas novas dos exercícios recentes (ver scraping/incremental.py).
+    """
+    plano = incremental.plan_refresh(visao)
+    buscados = {}
+
+    def coletar_ano(contexto, ano):
+        if ano in plano["reutilizar"]:
+            print(f"{visao['nome_visao']} {ano}: exercício fechado, reaproveitando dados salvos")
+            return plano["linhas"][ano]
+        print(f"Coletando {visao['nome_visao']} para {ano} (incremental)...")
+        buscados[ano] = incremental.fetch_year(
+            contexto["sessao"], contexto["executor_paginas"], visao, ano,
+            plano["ids"][ano], SCRAPER_MAX_WORKERS
+        )
+        return len(buscados[ano][0])
+
+    return {
+        "nome": nome,
+        "host": urlparse(universal_scraper.URL).hostname,
+        "anos": list(visao["anos"]),
+        "coletar_ano": coletar_ano,
+        "salvar": lambda: incremental.save_incremental(visao, buscados),
+    }
+
+
+def camara_job(nome="Câmara Municipal (2020–2023)"):
+    """
+    Descreve a coleta das despesas da Câmara Municipal (poucas linhas, ficam em
+    memória). Como não há spool nem coleta incremental, o conjunto só é salvo se
+    todos os anos derem certo: com um ano faltando, o arquivo anterior é mantido.
+    """
+    dados = {}
+
+    def coletar_ano(contexto, ano):
+        dados[ano] = camara_api.scrape_camara_ano(ano)
+        return len(dados[ano])
+
+    return {
+        "nome": nome,
+        "host": urlparse(camara_api.BASE_URL).hostname,
+        "anos": list(camara_api.ANOS),
+        "coletar_ano": coletar_ano,
+        "salvar": lambda: len(camara_api.save_camara(
+            [row for ano in camara_api.ANOS for row in dados.get(ano, [])]
+        )),
+        "tudo_ou_nada": True,
+    }
+
+
+def _run_unit(job, contexto, ano):
+    """Executa a coleta de um ano e devolve o número de linhas, duração e erro (se houver)"""
+    inicio = time.perf_counter()
+    try:
+        linhas = job["coletar_ano"](contexto, ano)
+        erro = None
+    except Exception as e:
+        linhas = getattr(e, "linhas", 0)
+        erro = str(e)
+    return {"ano": ano, "linhas": linhas, "segundos": time.perf_counter() - inicio, "erro": erro}
+
+
+def _finalize_job(job, resultados, inicio):
+    """
+    Salva o conjunto de dados (anos na ordem original) e monta o resumo. Sem nenhuma
+    linha coletada o conjunto não é salvo, e jobs "tudo_ou_nada" (dados só em
+    memória) também não se algum ano falhou: nos dois casos o arquivo anterior é
+    mantido em vez de substituído por um vazio ou com anos faltando.
+    """
+    anos = [resultados[ano] for ano in job["anos"]]
+    total = sum(resultado["linhas"] for resultado in anos)
+    erros = [resultado for resultado in anos if resultado["erro"]]
+
+    if not total:
+        status = "erro"
+        erros.append({"ano": None, "erro": "Nenhuma linha coletada; arquivo anterior mantido"})
+    elif erros and job.get("tudo_ou_nada"):
+        status = "erro"
+        total = 0
+        erros.append({"ano": None, "erro": "Conjunto não salvo (anos com erro); arquivo anterior mantido"})
+    else:
+        status = "parcial" if erros else "ok"
+        try:
+            total = job["salvar"]()
+        except Exception as e:
+            status = "erro"
+            erros.append({"ano": None, "erro": f"Erro ao salvar: {e}"})
+
+    return {
+        "conjunto": job["nome"],
+        "host": job["host"],
+        "status": status,
+        "linhas": total,
+        "segundos": round(time.perf_counter() - inicio, 2),
+        "anos": [
+            {"ano": r["ano"], "linhas": r["linhas"], "segundos": round(r["segundos"], 2), "erro": r["erro"]}
+            for r in anos
+        ],
+        "erros": [e["erro"] for e in erros],
+    }
+
+
+def run_jobs(jobs, max_workers=None):
+    """
+    Executa todos os (conjunto de dados, ano) em um pool de threads. O número de
+    requisições simultâneas a cada servidor é limitado por HOST_CONCURRENCY (teto
+    do limite adaptativo de host_budget), independentemente de quantas tarefas
+    estejam rodando. Cada conjunto é salvo
+    assim que todos os seus anos terminam. Retorna o resumo por conjunto.
+    """
+    max_workers = max_workers or SCRAPER_MAX_JOBS
+    page_workers = max(sum(HOST_CONCURRENCY.values()), 1)
+
+    summary = []
+    resultados = {job["nome"]: {} for job in jobs}
+    inicio = {}
+
+    with universal_scraper.create_session(page_workers) as sessao, \
+            ThreadPoolExecutor(max_workers=page_workers) as executor_paginas, \
+            ThreadPoolExecutor(max_workers=max_workers) as executor:
+        contexto = {"sessao": sessao, "executor_paginas": executor_paginas}
+
+        futures = {}
+        for job in jobs:
+            inicio[job["nome"]] = time.perf_counter()
+            for ano in job["anos"]:
+                futures[executor.submit(_run_unit, job, contexto, ano)] = job
+
+        for future in as_completed(futures):
+            job = futures[future]
+            resultado = future.result()
+            resultados[job["nome"]][resultado["ano"]] = resultado
+            if resultado["erro"]:
+                print(f"Erro em {job['nome']} ({resultado['ano']}): {resultado['erro']}")
+
+            if len(resultados[job["nome"]]) == len(job["anos"]):
+                job_summary = _finalize_job(job, resultados[job["nome"]], inicio[job["nome"]])
+                print(f"{job['nome']}: {job_summary['status'].upper()} ({job_summary['linhas']} linhas, {job_summary['segundos']}s)")
+                summary.append(job_summary)
+
+    return summary
+
+
+def print_summary(summary):
+    """Imprime o resumo da execução em formato de tabela"""
+    print(f"\n{'Conjunto':<45} {'Status':<8} {'Linhas':>8} {'Tempo (s)':>10}")
+    for job in summary:
+        print(f"{job['conjunto']:<45} {job['status']:<8} {job['linhas']:>8} {job['segundos']:>10.2f}")
+        for ano in job["anos"]:
+            erro = f"  erro: {ano['erro']}" if ano["erro"] else ""
+            print(f"    {ano['ano']:<41} {'':<8} {ano['linhas']:>8} {ano['segundos']:>10.2f}{erro}")
@@ -0,0 +1,145 @@
+# RU4590111 Daniel Elias de Souza
+
+# Tamanho de página (QuantidadeRegistros) de cada visão do portal da Prefeitura:
+# sondado na primeira coleta (e de novo a cada PROBE_TTL), do menor para o maior, e
+# lembrado por chave_modulo
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from config import DATA_DIR
+from scraping.retry import backoff_delay
+
+PAGE_SIZES = [100, 250, 500, 1000, 2000, 5000]
+DEFAULT_PAGE_SIZE = PAGE_SIZES[0]
+
+# Um tamanho maior só é adotado se render pelo menos 10% mais linhas por segundo
+MIN_GAIN = 1.1
+
+# Tentativas de cada tamanho na sondagem: um erro isolado (524) não define o teto
+PROBE_ATTEMPTS = 3
+
+# A sondagem é refeita depois desse prazo, para voltar a testar tamanhos maiores
+# (step_down só diminui o tamanho)
+PROBE_TTL = timedelta(days=30)
+
+MEMORY_FILE = "tamanhos_pagina.json"
+
+_lock = threading.Lock()
+
+
+def _memory_path():
+    return os.path.join(DATA_DIR, MEMORY_FILE)
+
+
+def _read_memory():
+    try:
+        with open(_memory_path(), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def remembered_size(chave_modulo):
+    """Tamanho de página já escolhido para a visão (None se ainda não sondado)"""
+    with _lock:
+        entry = _read_memory().get(chave_modulo)
+    return entry["tamanho"] if entry else None
+
+
+def probe_due(chave_modulo):
+    """A visão precisa ser sondada: nunca foi, ou a última sondagem passou de PROBE_TTL"""
+    with _lock:
+        entry = _read_memory().get(chave_modulo)
+    if not entry:
+        return True
+    sondado_em = entry.get("sondado_em") or entry["atualizado_em"]
+    return datetime.now() - datetime.fromisoformat(sondado_em) > PROBE_TTL
+
+
+def remember(chave_modulo, tamanho, linhas_por_segundo=None, sondado=False):
+    """
+    Grava o tamanho de página da visão e a vazão medida com ele. A data da sondagem
+    (sondado=True) é mantida nas atualizações seguintes, para que PROBE_TTL conte a
+    partir dela e não da última coleta.
+    """
+    with _lock:
+        memory = _read_memory()
+        agora = datetime.now().isoformat(timespec="seconds")
+        anterior = memory.get(chave_modulo) or {}
+        memory[chave_modulo] = {
+            "tamanho": tamanho,
+            "linhas_por_segundo": round(linhas_por_segundo, 1) if linhas_por_segundo else None,
+            "atualizado_em": agora,
+            "sondado_em": agora if sondado else anterior.get("sondado_em", anterior.get("atualizado_em", agora)),
+        }
+        os.makedirs(DATA_DIR, exist_ok=True)
+        tmp_path = _memory_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(memory, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, _memory_path())
+
+
+def step_down(chave_modulo, tamanho):
+    """
+    Páginas desse tamanho continuaram falhando: a próxima coleta da visão usa o
+    tamanho anterior da escala
+    """
+    smaller = [size for size in PAGE_SIZES if size < tamanho]
+    if smaller:
+        print(f"Páginas de {tamanho} registros falharam; próxima coleta de {chave_modulo} usa {smaller[-1]}")
+        remember(chave_modulo, smaller[-1])
+
+
+def probe_page_size(fetch_first_page, anos):
+    """
+    Sonda o maior tamanho de página que compensa: busca a primeira página de um ano
+    com tamanhos crescentes (PAGE_SIZES) e para no primeiro tamanho que falha
+    PROBE_ATTEMPTS vezes seguidas (524, tempo esgotado...), quando o ganho em
+    linhas/s fica abaixo de MIN_GAIN ou quando nenhum ano tem linhas suficientes
+    para uma página maior.
+    fetch_first_page(ano, tamanho) retorna (linhas da página, total de linhas do ano)
+    e levanta exceção em caso de erro. Retorna (tamanho, linhas/s).
+    """
+    best_size, best_rate = DEFAULT_PAGE_SIZE, None
+    totals = {}
+    index = 0
+    while index < len(PAGE_SIZES):
+        size = PAGE_SIZES[index]
+        # Ano que ainda pode encher uma página desse tamanho (total desconhecido ou maior)
+        ano = next((a for a in anos if totals.get(a, size) >= size), None)
+        if ano is None:
+            break
+
+        for tentativa in range(1, PROBE_ATTEMPTS + 1):
+            start = time.perf_counter()
+            try:
+                linhas, total = fetch_first_page(ano, size)
+                break
+            except Exception as e:
+                if tentativa < PROBE_ATTEMPTS:
+                    delay = backoff_delay(tentativa)
+                    print(f"  {size} registros por página: erro ({e}), "
+                          f"tentativa {tentativa + 1}/{PROBE_ATTEMPTS} em {delay:.1f}s")
+                    time.sleep(delay)
+                else:
+                    print(f"  {size} registros por página: erro ({e}), mantendo {best_size}")
+        else:
+            break
+        elapsed = time.perf_counter() - start
+        totals[ano] = total if linhas == size else linhas
+
+        if linhas < size:
+            # Página incompleta: a vazão não é comparável; tenta o mesmo tamanho em outro ano
+            continue
+
+        rate = linhas / elapsed
+        print(f"  {size} registros por página: {rate:,.0f} linhas/s")
+        if best_rate is not None and rate < best_rate * MIN_GAIN:
+            break
+        best_size, best_rate = size, rate
+        index += 1
+
+    return best_size, best_rate
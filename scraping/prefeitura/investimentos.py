@@ -2,12 +2,14 @@
 
 from scraping.universal_scraper import scrape_visao
 
+VISAO = {
+    "chave_modulo": "DespesaAgrupada",
+    "nome_visao": "DespesaseInvestimentos",
+    "periodicidade": "MENSAL",
+    "periodo": "JANEIRO",
+    "anos": [2024, 2025, 2026],
+    "ordenacao": [{"ColunaOrdem": "NroEmpenho", "Ordem": 1}]
+}
+
 def scrape_investimentos(periodo="JANEIRO"):
-    return scrape_visao(
-        chave_modulo="DespesaAgrupada",
-        nome_visao="DespesaseInvestimentos",
-        periodicidade="MENSAL",
-        periodo=periodo,
-        anos=[2024, 2025, 2026],
-        ordenacao=[{"ColunaOrdem": "NroEmpenho", "Ordem": 1}]
-    )
+    return scrape_visao(**{**VISAO, "periodo": periodo})
@@ -0,0 +1,115 @@
+# RU4590111 Daniel Elias de Souza
+
+# Arquivo dos registros brutos recebidos dos portais (JSON Lines compactado com gzip),
+# separado por fonte/visão/ano: rebuild.py refaz os conjuntos de dados a partir
+# dele, sem acessar a rede
+import gzip
+import json
+import os
+import threading
+from datetime import datetime
+
+from config import DATA_DIR
+
+ARCHIVE_DIR = "bruto"
+META_FILE = "meta.json"
+
+_lock = threading.Lock()
+
+
+def dataset_path(fonte, visao):
+    return os.path.join(DATA_DIR, ARCHIVE_DIR, fonte, visao)
+
+
+def partition_path(fonte, visao, ano):
+    return os.path.join(dataset_path(fonte, visao), f"{ano}.jsonl.gz")
+
+
+def write_year(fonte, visao, ano, pages):
+    """
+    Grava os registros de um ano (pages: listas de registros, na ordem das páginas),
+    substituindo o arquivo anterior. Retorna o número de registros gravados.
+    """
+    path = partition_path(fonte, visao, ano)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    total = 0
+    with gzip.open(path + ".tmp", "wt", encoding="utf-8", compresslevel=6) as f:
+        for registros in pages:
+            for registro in registros:
+                f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            total += len(registros)
+    os.replace(path + ".tmp", path)
+    return total
+
+
+def read_year(fonte, visao, ano):
+    """Registros de um ano, um de cada vez"""
+    with gzip.open(partition_path(fonte, visao, ano), "rt", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def merge_year(fonte, visao, ano, registros, chave="ID", ordem=None):
+    """
+    Junta registros novos aos já arquivados de um ano (upsert pela chave: a versão
+    nova vence), ordenando por `ordem` se a coluna existir. Retorna False se o ano
+    ainda não está no arquivo (registros parciais sozinhos não o representam).
+    """
+    if not os.path.exists(partition_path(fonte, visao, ano)):
+        return False
+    novos = {registro.get(chave) for registro in registros}
+    merged = [r for r in read_year(fonte, visao, ano) if r.get(chave) not in novos] + list(registros)
+    if ordem and all(ordem in r for r in merged):
+        merged.sort(key=lambda r: r[ordem])
+    write_year(fonte, visao, ano, [merged])
+    return True
+
+
+def read_meta(fonte, visao):
+    try:
+        with open(os.path.join(dataset_path(fonte, visao), META_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_meta(fonte, visao, csv_name, coluna_ano, em_blocos, anos):
+    """
+    Registra como refazer o conjunto de dados: arquivo de saída, coluna do ano
+    acrescentada pelo scraper, se é salvo em blocos (save_dataset_chunks) e os anos
+    do conjunto. Anos do conjunto sem arquivo bruto ficam em "faltando".
+    """
+    anos = sorted(set(anos))
+    with _lock:
+        path = os.path.join(dataset_path(fonte, visao), META_FILE)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        meta = {
+            "fonte": fonte,
+            "visao": visao,
+            "csv": csv_name,
+            "coluna_ano": coluna_ano,
+            "em_blocos": em_blocos,
+            "anos": [ano for ano in anos if os.path.exists(partition_path(fonte, visao, ano))],
+            "faltando": [ano for ano in anos if not os.path.exists(partition_path(fonte, visao, ano))],
+            "atualizado_em": datetime.now().isoformat(timespec="seconds"),
+        }
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(path + ".tmp", path)
+    return meta
+
+
+def list_datasets():
+    """Metadados de todos os conjuntos de dados arquivados"""
+    root = os.path.join(DATA_DIR, ARCHIVE_DIR)
+    datasets = []
+    if not os.path.isdir(root):
+        return datasets
+    for fonte in sorted(os.listdir(root)):
+        if not os.path.isdir(os.path.join(root, fonte)):
+            continue
+        for visao in sorted(os.listdir(os.path.join(root, fonte))):
+            meta = read_meta(fonte, visao)
+            if meta is not None:
+                datasets.append(meta)
+    return datasets
@@ -0,0 +1,158 @@
+# RU4590111 Daniel Elias de Souza
+
+# Política de novas tentativas das requisições aos portais: espera exponencial com
+# sorteio (jitter), disjuntor (circuit breaker) por servidor e retorno das respostas
+# para o limite adaptativo de conexões (host_budget)
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+from scraping import metrics
+from scraping.host_budget import host_limit, host_slot
+
+# Respostas que valem nova tentativa; as de sobrecarga também reduzem o limite de conexões
+RETRY_STATUS = {429, 500, 502, 503, 504, 524}
+OVERLOAD_STATUS = {429, 503, 524}
+# Exceções que valem nova tentativa (resposta cortada no meio também é temporária)
+TRANSIENT_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError)
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 1.0  # segundos
+BACKOFF_MAX = 60.0
+
+# Falhas seguidas que abrem o disjuntor e tempo até a requisição de teste
+BREAKER_FAILURES = 5
+BREAKER_RESET = 30.0  # segundos
+
+_lock = threading.Lock()
+_breakers = {}
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """O disjuntor do servidor está aberto: a requisição nem é enviada"""
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """Espera antes da nova tentativa `attempt` (1, 2, ...): sorteada entre 0 e base * 2^attempt, até cap"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Disjuntor de um servidor. Fechado: as requisições passam. Depois de
+    BREAKER_FAILURES falhas seguidas abre, e as requisições falham na hora
+    (CircuitOpenError) por BREAKER_RESET segundos. Então deixa passar uma
+    requisição de teste (meio aberto): se ela der certo, fecha; se não, abre de novo.
+    """
+
+    def __init__(self, failures=BREAKER_FAILURES, reset=BREAKER_RESET):
+        self.failures = failures
+        self.reset = reset
+        self.state = "fechado"
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "aberto" and time.monotonic() - self._opened_at >= self.reset:
+                self.state = "meio aberto"
+                return True
+            return self.state == "fechado"
+
+    def retry_after(self):
+        """Segundos até o disjuntor deixar passar a requisição de teste (0 se fechado)"""
+        with self._lock:
+            if self.state != "aberto":
+                return 0.0
+            return max(0.0, self.reset - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.state = "fechado"
+            self._consecutive = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self.state == "meio aberto" or (self.state == "fechado" and self._consecutive >= self.failures):
+                self.state = "aberto"
+                self._opened_at = time.monotonic()
+                print(f"Disjuntor aberto após {self._consecutive} falhas seguidas; "
+                      f"nova tentativa em {self.reset:.0f}s")
+
+
+def breaker(url):
+    """Disjuntor do servidor da URL (um por servidor, compartilhado entre threads)"""
+    host = urlparse(url).hostname
+    with _lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker()
+        return _breakers[host]
+
+
+def reset_breakers():
+    with _lock:
+        _breakers.clear()
+
+
+def send_with_retry(send, url, label, serie=None):
+    """
+    Executa send() (que faz a requisição para a URL e retorna a resposta) com a
+    política do servidor: respeita o disjuntor e o limite de conexões, tenta de novo
+    até MAX_ATTEMPTS vezes nos erros temporários (RETRY_STATUS, TRANSIENT_ERRORS)
+    com espera exponencial, e informa cada resultado ao limite adaptativo.
+    Cada tentativa é registrada em scraping/metrics sob serie = (conjunto, ano).
+    Retorna a resposta; levanta requests.exceptions.RequestException se não conseguir.
+    """
+    circuit = breaker(url)
+    limit = host_limit(url)
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        if not circuit.allow():
+            raise CircuitOpenError(f"{label}: servidor indisponível (disjuntor aberto)")
+
+        overload = False
+        start = time.perf_counter()
+        try:
+            with host_slot(url):
+                start = time.perf_counter()
+                response = send()
+                latency = time.perf_counter() - start
+        except TRANSIENT_ERRORS as e:
+            error = e
+            overload = isinstance(e, requests.exceptions.Timeout)
+            if serie is not None:
+                metrics.record_request(*serie, "tempo_esgotado" if overload else "conexao",
+                                       time.perf_counter() - start, tentativa=attempt)
+        except Exception as e:
+            # Erro que não vale nova tentativa (ex.: TooManyRedirects): ainda assim conta
+            # como falha, para que a requisição de teste do disjuntor meio aberto se resolva
+            circuit.record_failure()
+            if serie is not None:
+                metrics.record_request(*serie, "erro", time.perf_counter() - start, tentativa=attempt)
+            raise
+        else:
+            if serie is not None:
+                metrics.record_request(*serie, response.status_code, latency, len(response.content), attempt)
+            if response.status_code not in RETRY_STATUS:
+                # Mesmo um erro definitivo (ex.: 404) mostra que o servidor está respondendo
+                circuit.record_success()
+                if response.ok and limit is not None:
+                    limit.on_success(latency)
+                response.raise_for_status()
+                return response
+            error = requests.exceptions.HTTPError(f"Erro {response.status_code} em {label}", response=response)
+            overload = response.status_code in OVERLOAD_STATUS
+
+        circuit.record_failure()
+        if overload and limit is not None:
+            limit.on_overload()
+        if attempt == MAX_ATTEMPTS:
+            raise error
+        delay = backoff_delay(attempt)
+        print(f"{label}: {error}; tentativa {attempt + 1}/{MAX_ATTEMPTS} em {delay:.1f}s")
+        time.sleep(delay)
@@ -0,0 +1,128 @@
+# RU4590111 Daniel Elias de Souza
+
+# Spool em disco das páginas coletadas, com checkpoint para retomar coletas interrompidas
+import json
+import os
+import shutil
+import threading
+
+from config import DATA_DIR
+
+SPOOL_DIR = "spool"
+CHECKPOINT_FILE = "checkpoint.jsonl"
+
+
+class PageSpool:
+    """
+    Guarda cada página (ano, página) de uma visão em um arquivo próprio assim que ela
+    chega. O checkpoint é um log JSON Lines só de acréscimos: a primeira linha guarda os
+    parâmetros da coleta e as seguintes registram o total de páginas de cada ano e cada
+    página gravada. Uma linha truncada por interrupção é simplesmente ignorada.
+    """
+
+    def __init__(self, nome, parametros):
+        self.path = os.path.join(DATA_DIR, SPOOL_DIR, nome)
+        self.parametros = parametros
+        self._lock = threading.Lock()
+        self._total_paginas = {}
+        self._paginas = {}
+        self._load()
+
+    def _checkpoint_path(self):
+        return os.path.join(self.path, CHECKPOINT_FILE)
+
+    def _load(self):
+        entries = []
+        if os.path.exists(self._checkpoint_path()):
+            with open(self._checkpoint_path(), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        break
+
+        # Parâmetros diferentes (ex.: outro tamanho de página) invalidam o spool
+        if not entries or entries[0].get("parametros") != self.parametros:
+            self.clear()
+            os.makedirs(self.path, exist_ok=True)
+            self._append({"parametros": self.parametros})
+            return
+
+        for entry in entries[1:]:
+            ano = entry["ano"]
+            if "total_paginas" in entry:
+                self._total_paginas[ano] = entry["total_paginas"]
+            elif os.path.exists(self._page_path(ano, entry["pagina"])):
+                self._paginas.setdefault(ano, {})[entry["pagina"]] = entry["linhas"]
+
+    def _append(self, entry):
+        with open(self._checkpoint_path(), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _page_path(self, ano, pagina):
+        return os.path.join(self.path, str(ano), f"{pagina:06d}.json")
+
+    def total_paginas(self, ano):
+        """Total de páginas do ano, se já conhecido"""
+        return self._total_paginas.get(ano)
+
+    def set_total_paginas(self, ano, total_paginas):
+        with self._lock:
+            self._total_paginas[ano] = total_paginas
+            self._append({"ano": ano, "total_paginas": total_paginas})
+
+    def has_page(self, ano, pagina):
+        return pagina in self._paginas.get(ano, {})
+
+    def missing_pages(self, ano):
+        """Páginas do ano ainda não gravadas (exige total de páginas conhecido)"""
+        total = self._total_paginas.get(ano, 0)
+        return [p for p in range(1, total + 1) if not self.has_page(ano, p)]
+
+    def is_complete(self, ano):
+        return ano in self._total_paginas and not self.missing_pages(ano)
+
+    def write_page(self, ano, pagina, valores):
+        """Grava a página (de forma atômica) e registra no checkpoint"""
+        path = self._page_path(ano, pagina)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(valores, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._paginas.setdefault(ano, {})[pagina] = len(valores)
+            self._append({"ano": ano, "pagina": pagina, "linhas": len(valores)})
+
+    def read_page(self, ano, pagina):
+        with open(self._page_path(ano, pagina), encoding="utf-8") as f:
+            return json.load(f)
+
+    def row_count(self, ano):
+        return sum(self._paginas.get(ano, {}).values())
+
+    def page_count(self, ano):
+        return len(self._paginas.get(ano, {}))
+
+    def iter_pages(self, anos):
+        """Percorre as páginas gravadas em ordem de ano e página, uma de cada vez"""
+        for ano in anos:
+            for pagina in sorted(self._paginas.get(ano, {})):
+                yield ano, self.read_page(ano, pagina)
+
+    def clear(self):
+        """Apaga o spool (chamado depois que o conjunto de dados completo foi salvo)"""
+        shutil.rmtree(self.path, ignore_errors=True)
+        self._total_paginas = {}
+        self._paginas = {}
+
+
+def stored_parametros(nome):
+    """Parâmetros da coleta em andamento no spool `nome` (None se não houver spool)"""
+    try:
+        with open(os.path.join(DATA_DIR, SPOOL_DIR, nome, CHECKPOINT_FILE), encoding="utf-8") as f:
+            return json.loads(f.readline()).get("parametros")
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
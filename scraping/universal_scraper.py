@@ -1,12 +1,22 @@
 # RU4590111 Daniel Elias de Souza
 
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
-import os
-from config import DATA_DIR
-from utils import rename_columns
+from config import PREFEITURA_API_URL, SCRAPER_MAX_WORKERS
+from scraping import http_cache, metrics, raw_archive
+from scraping.host_budget import host_slot
+from scraping.retry import CircuitOpenError, backoff_delay, breaker, send_with_retry
+from scraping.page_size import (DEFAULT_PAGE_SIZE, probe_due, probe_page_size, remember, remembered_size,
+                                step_down)
+from scraping.spool import PageSpool, stored_parametros
+from storage import save_dataset_chunks
+from schemas import get_schema, rename_to_display
 
-URL = "https://transparencia.marilia.sp.gov.br/paiportalserver/modulovisao/filter"
+URL = PREFEITURA_API_URL
 
 HEADERS = {
     "Accept": "application/json",
@@ -16,117 +26,286 @@ HEADERS = {
     "User-Agent": "Mozilla/5.0"
 }
 
-def get_dataset_type_from_visao(nome_visao):
-    """Determina o tipo do dataset baseado no nome da visão"""
-    if "covid" in nome_visao.lower():
-        return "covid"
-    elif "passagens" in nome_visao.lower():
-        return "passagens"
-    elif "investimentos" in nome_visao.lower():
-        return "investimentos"
-    elif "receita" in nome_visao.lower():
-        return "receita"
-    elif "emendas" in nome_visao.lower():
-        return "emendas"
-    else:
-        return "unknown"
+REQUEST_TIMEOUT = 120  # segundos
+PROBE_TIMEOUT = 60  # segundos; na sondagem, passar disso é sinal de página grande demais
+MAX_DISCOVERY_ERRORS = 5  # Páginas com erro antes de desistir de descobrir o total de páginas
+RETRY_ROUNDS = 3  # Rodadas da fila de novas tentativas (páginas que falharam)
+SAVE_CHUNK_ROWS = 50_000  # Linhas por bloco ao gravar o conjunto de dados final
+
+def create_session(max_workers):
+    """Sessão HTTP com pool de conexões reaproveitadas entre as páginas"""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def build_payload(chave_modulo, nome_visao, periodicidade, periodo, ano, pagina, ordenacao,
+                  tamanho_pagina=DEFAULT_PAGE_SIZE):
+    """Monta o corpo da requisição de uma página da visão"""
+    return {
+        "ChaveModulo": chave_modulo,
+        "NomeVisao": nome_visao,
+        "Filtros": [],
+        "Periodicidade": periodicidade,
+        "Periodo": periodo if periodicidade == "MENSAL" else None,
+        "Exercicio": ano,
+        "Pagina": pagina,
+        "QuantidadeRegistros": str(tamanho_pagina),
+        "Ordenacao": ordenacao,
+        "FiltroRedirecionaVisao": {
+            "Campo": None,
+            "Valor": None,
+            "TipoValor": None
+        }
+    }
+
+def post_page(session, payload):
+    """POST de uma página (uma tentativa)"""
+    return session.post(URL, json=payload, timeout=REQUEST_TIMEOUT)
 
-def scrape_visao(chave_modulo, nome_visao, periodicidade, anos, ordenacao, periodo=None):
+def fetch_page(session, payload):
     """
-    Scraper universal para qualquer visão do portal da Prefeitura de Marília.
-    Salva dados parciais mesmo em caso de erros.
+    Busca uma página da visão com a política de scraping/retry: novas tentativas com
+    espera exponencial nos erros temporários (524 etc.), disjuntor e limite adaptativo
+    de conexões ao portal. Com o cache HTTP ligado, a resposta guardada é reaproveitada.
     """
+    serie = (payload["NomeVisao"], payload["Exercicio"])
+    cached = http_cache.get(URL, payload=payload)
+    if cached is not None:
+        metrics.record_page(*serie, len(cached.get("Valores", [])), "cache")
+        return cached
+    label = f"Página {payload['Pagina']} ({payload['Exercicio']})"
+    data = send_with_retry(lambda: post_page(session, payload), URL, label, serie).json()
+    metrics.record_page(*serie, len(data.get("Valores", [])))
+    http_cache.put(URL, data, payload=payload, ano=payload["Exercicio"])
+    return data
 
-    all_data = []
+def fetch_page_to_spool(session, spool, payload):
+    """Busca uma página e grava no spool; retorna o número de linhas"""
+    valores = fetch_page(session, payload).get("Valores", [])
+    spool.write_page(payload["Exercicio"], payload["Pagina"], valores)
+    return len(valores)
 
-    for ano in anos:
-        print(f"Coletando {nome_visao} para {ano}...")
+def _spool_name(chave_modulo, nome_visao, periodicidade, periodo):
+    return f"{chave_modulo}__{nome_visao}" + (f"__{periodo}" if periodicidade == "MENSAL" else "")
 
-        pagina = 1
-        max_retries = 3
-        consecutive_errors = 0
-        max_consecutive_errors = 5  # Máximo de erros consecutivos antes de parar
+def open_spool(chave_modulo, nome_visao, periodicidade, periodo, ordenacao, tamanho_pagina=DEFAULT_PAGE_SIZE):
+    """Abre (ou retoma) o spool de páginas da visão em DATA_DIR/spool"""
+    nome = _spool_name(chave_modulo, nome_visao, periodicidade, periodo)
+    # Tudo o que define o conteúdo de cada página, menos o ano e o número da página
+    parametros = build_payload(chave_modulo, nome_visao, periodicidade, periodo, None, None, ordenacao, tamanho_pagina)
+    return PageSpool(nome, parametros)
 
-        while True:
-            try:
-                payload = {
-                    "ChaveModulo": chave_modulo,
-                    "NomeVisao": nome_visao,
-                    "Filtros": [],
-                    "Periodicidade": periodicidade,
-                    "Periodo": periodo if periodicidade == "MENSAL" else None,
-                    "Exercicio": ano,
-                    "Pagina": pagina,
-                    "QuantidadeRegistros": "100",
-                    "Ordenacao": ordenacao,
-                    "FiltroRedirecionaVisao": {
-                        "Campo": None,
-                        "Valor": None,
-                        "TipoValor": None
-                    }
-                }
-
-                response = requests.post(URL, json=payload, headers=HEADERS)
-                
-                # Tentar novamente em caso de erro 524 (temporário)
-                if response.status_code == 524:
-                    if consecutive_errors < max_retries:
-                        print(f"Erro 524 na página {pagina}, tentando novamente ({consecutive_errors + 1}/{max_retries})...")
-                        import time
-                        time.sleep(3)  # Esperar 3 segundos
-                        response = requests.post(URL, json=payload, headers=HEADERS)
-                    else:
-                        print(f"Erro 524 persistente na página {pagina}, pulando...")
-                        pagina += 1
-                        consecutive_errors = 0
-                        continue
-                
-                response.raise_for_status()
-                consecutive_errors = 0  # Reset contador de erros
-                
-                data = response.json()
-
-                valores = data.get("Valores", [])
-                total_paginas = data.get("QuantidadePaginas", 1)
-
-                if not valores:
-                    break
-
-                for row in valores:
-                    row["Ano"] = ano
-
-                all_data.extend(valores)
-
-                print(f"  Página {pagina}/{total_paginas}")
-
-                if pagina >= total_paginas:
-                    break
+def choose_page_size(session, chave_modulo, nome_visao, periodicidade, periodo, anos, ordenacao):
+    """
+    Tamanho de página da visão: o da coleta em andamento no spool (a numeração das
+    páginas depende dele), o já escolhido para chave_modulo ou, na primeira coleta,
+    o sondado agora (e lembrado em page_size.MEMORY_FILE). A sondagem é refeita
+    depois de page_size.PROBE_TTL.
+    """
+    parametros = stored_parametros(_spool_name(chave_modulo, nome_visao, periodicidade, periodo))
+    if parametros is not None:
+        return int(parametros["QuantidadeRegistros"])
+    tamanho = remembered_size(chave_modulo)
+    if tamanho is not None and not probe_due(chave_modulo):
+        return tamanho
+
+    def fetch_first_page(ano, tamanho):
+        payload = build_payload(chave_modulo, nome_visao, periodicidade, periodo, ano, 1, ordenacao, tamanho)
+        with host_slot(URL):
+            start = time.perf_counter()
+            response = session.post(URL, json=payload, timeout=PROBE_TIMEOUT)
+            metrics.record_request(nome_visao, ano, response.status_code, time.perf_counter() - start,
+                                   len(response.content), sondagem=True)
+        response.raise_for_status()
+        data = response.json()
+        valores = data.get("Valores", [])
+        return len(valores), data.get("QuantidadeRegistros", len(valores))
 
+    print(f"Sondando o tamanho de página de {nome_visao}...")
+    tamanho, linhas_por_segundo = probe_page_size(fetch_first_page, anos)
+    print(f"Tamanho de página de {nome_visao}: {tamanho} registros")
+    remember(chave_modulo, tamanho, linhas_por_segundo, sondado=True)
+    return tamanho
+
+
+def scrape_ano(session, executor, spool, chave_modulo, nome_visao, periodicidade, periodo, ano, ordenacao):
+    """
+    Coleta as páginas de um ano que ainda não estão no spool. Enquanto o total de
+    páginas não é conhecido, elas são buscadas em sequência; as restantes são buscadas
+    em paralelo. Cada página é gravada no spool assim que chega. Páginas que falham
+    mesmo com as novas tentativas vão para uma fila, repassada em até RETRY_ROUNDS
+    rodadas; as que sobrarem continuam pendentes no spool para a próxima execução.
+    Retorna o número de linhas do ano no spool.
+    """
+    tamanho = spool.parametros["QuantidadeRegistros"]
+    pagina = 1
+    errors = 0
+    resuming = spool.total_paginas(ano) is not None
+    if spool.page_count(ano):
+        metrics.record_page(nome_visao, ano, spool.row_count(ano), "spool", spool.page_count(ano))
+
+    while spool.total_paginas(ano) is None:
+        if spool.has_page(ano, pagina):
+            pagina += 1
+            continue
+
+        payload = build_payload(chave_modulo, nome_visao, periodicidade, periodo, ano, pagina, ordenacao, tamanho)
+        try:
+            data = fetch_page(session, payload)
+        except requests.exceptions.RequestException as e:
+            # A página fica pendente (entra na fila depois que o total for conhecido)
+            errors += 1
+            print(f"Erro na página {pagina}: {e}")
+            if errors >= MAX_DISCOVERY_ERRORS:
+                print(f"Muitos erros ({errors}) sem conseguir o total de páginas de {ano}, "
+                      "mantendo o spool para a próxima execução...")
+                metrics.record_skipped(nome_visao, ano, errors, "pendente")
+                return spool.row_count(ano)
+            # Como na fila de novas tentativas: espera o disjuntor (compartilhado pelo
+            # servidor) deixar passar requisições, mais um intervalo sorteado
+            time.sleep(breaker(URL).retry_after() + backoff_delay(errors))
+            if not isinstance(e, CircuitOpenError):
+                # Com o disjuntor aberto a página nem foi pedida: tenta a mesma de novo
                 pagina += 1
+            continue
+
+        valores = data.get("Valores", [])
+        if not valores:
+            # Página vazia: não há dados no ano, ou as anteriores falharam e esta já passou do fim
+            spool.set_total_paginas(ano, data.get("QuantidadePaginas") or pagina - 1)
+            break
+
+        spool.set_total_paginas(ano, data.get("QuantidadePaginas", 1))
+        spool.write_page(ano, pagina, valores)
+        print(f"  Página {pagina}/{spool.total_paginas(ano)}")
+
+    total_paginas = spool.total_paginas(ano)
+    missing = spool.missing_pages(ano)
+    if resuming and missing:
+        print(f"  Retomando: {total_paginas - len(missing)} de {total_paginas} páginas já no spool")
 
+    for rodada in range(RETRY_ROUNDS + 1):
+        missing = spool.missing_pages(ano)
+        if not missing:
+            break
+        if rodada > 0:
+            # Espera o disjuntor deixar passar requisições de novo, mais um intervalo sorteado
+            delay = breaker(URL).retry_after() + backoff_delay(rodada)
+            print(f"  {len(missing)} páginas de {ano} na fila de novas tentativas "
+                  f"(rodada {rodada}/{RETRY_ROUNDS}, em {delay:.1f}s)")
+            time.sleep(delay)
+
+        futures = {
+            executor.submit(
+                fetch_page_to_spool, session, spool,
+                build_payload(chave_modulo, nome_visao, periodicidade, periodo, ano, p, ordenacao, tamanho)
+            ): p
+            for p in missing
+        }
+        for future in as_completed(futures):
+            p = futures[future]
+            try:
+                future.result()
             except requests.exceptions.RequestException as e:
-                consecutive_errors += 1
-                print(f"Erro na página {pagina}: {e}")
-                
-                if consecutive_errors >= max_consecutive_errors:
-                    print(f"Muitos erros consecutivos ({consecutive_errors}), salvando dados parciais...")
-                    break
-                
-                pagina += 1
-                import time
-                time.sleep(2)  # Esperar antes de tentar próxima página
+                print(f"Erro na página {p}: {e}")
                 continue
+            print(f"  Página {p}/{total_paginas}")
+
+    pendentes = spool.missing_pages(ano)
+    if pendentes:
+        print(f"  {ano}: {len(pendentes)} páginas continuam pendentes no spool")
+        metrics.record_skipped(nome_visao, ano, len(pendentes), "pendente")
+    return spool.row_count(ano)
+
+def scrape_visao(chave_modulo, nome_visao, periodicidade, anos, ordenacao, periodo=None, max_workers=None):
+    """
+    Scraper universal para qualquer visão do portal da Prefeitura de Marília.
+    Busca até max_workers páginas em paralelo (padrão: SCRAPER_MAX_WORKERS).
+    Cada página vai para o spool em disco assim que chega, então uma execução
+    interrompida continua de onde parou. O tamanho de página é escolhido por
+    choose_page_size. Salva dados parciais mesmo em caso de erros e retorna o
+    número de linhas salvas.
+    """
+    max_workers = max_workers or SCRAPER_MAX_WORKERS
+
+    with create_session(max_workers) as session, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        tamanho = choose_page_size(session, chave_modulo, nome_visao, periodicidade, periodo, anos, ordenacao)
+        spool = open_spool(chave_modulo, nome_visao, periodicidade, periodo, ordenacao, tamanho)
+        linhas_antes = sum(spool.row_count(ano) for ano in anos)
+        paginas_antes = sum(spool.page_count(ano) for ano in anos)
+        inicio = time.perf_counter()
+        for ano in anos:
+            print(f"Coletando {nome_visao} para {ano}...")
+            scrape_ano(session, executor, spool, chave_modulo, nome_visao, periodicidade, periodo, ano, ordenacao)
+        segundos = time.perf_counter() - inicio
+
+    # Vazão com o tamanho de página usado (só o que foi buscado nesta execução)
+    linhas = sum(spool.row_count(ano) for ano in anos) - linhas_antes
+    paginas = sum(spool.page_count(ano) for ano in anos) - paginas_antes
+    if linhas and segundos:
+        print(f"Tamanho de página {tamanho}: {linhas} linhas em {paginas} páginas, "
+              f"{segundos:.1f}s ({linhas / segundos:,.0f} linhas/s)")
+        remember(chave_modulo, tamanho, linhas / segundos)
 
     # Salvar dados mesmo que parciais
-    df = pd.DataFrame(all_data)
+    return save_visao(nome_visao, spool, anos)
+
+def _spool_chunks(spool, anos, schema, columns, chunk_rows=SAVE_CHUNK_ROWS):
+    """Junta as páginas do spool em blocos de DataFrame já renomeados"""
+    rows = []
+    for ano, valores in spool.iter_pages(anos):
+        for row in valores:
+            row["Ano"] = ano
+        rows.extend(valores)
+        if len(rows) >= chunk_rows:
+            yield rename_to_display(pd.DataFrame(rows, columns=columns), schema)
+            rows = []
+    if rows:
+        yield rename_to_display(pd.DataFrame(rows, columns=columns), schema)
+
+def save_visao(nome_visao, spool, anos):
+    """
+    Salva em DATA_DIR as páginas do spool, em blocos, sem carregar a visão inteira
+    em memória. Se todos os anos estiverem completos, o spool é apagado; senão ele é
+    mantido para que a próxima execução busque apenas as páginas que faltam. Sem
+    nenhuma linha no spool nada é gravado (o arquivo anterior é mantido).
+    Retorna o número de linhas salvas.
+    """
+    if not sum(spool.row_count(ano) for ano in anos):
+        print(f"Nenhuma linha coletada de {nome_visao}; arquivo anterior mantido")
+        return 0
 
-    # Renomeia colunas para português antes de salvar
-    dataset_type = get_dataset_type_from_visao(nome_visao)
-    df = rename_columns(df, dataset_type)
+    # Primeira passada: união das colunas de todas as páginas (na ordem em que aparecem)
+    columns = {}
+    for _, valores in spool.iter_pages(anos):
+        for row in valores:
+            columns.update(dict.fromkeys(row))
+    columns["Ano"] = None
+    columns = list(columns)
 
-    os.makedirs(DATA_DIR, exist_ok=True)
-    filename = f"{DATA_DIR}/{nome_visao}_dados.csv"
-    df.to_csv(filename, index=False, encoding="utf-8")
+    # Renomeia colunas para português antes de salvar (os tipos vêm do mesmo esquema)
+    csv_name = f"{nome_visao}_dados.csv"
+    chunks = _spool_chunks(spool, anos, get_schema(csv_name), columns)
 
-    print(f"Arquivo salvo em: {filename} ({len(df)} linhas coletadas)")
-    return df
+    # CSV + Parquet tipado (lido diretamente pelo dashboard)
+    filename, total = save_dataset_chunks(chunks, csv_name)
+
+    print(f"Arquivo salvo em: {filename} ({total} linhas coletadas)")
+
+    # Registros brutos de cada ano, para refazer o conjunto de dados sem coletar (rebuild.py)
+    anos_salvos = [ano for ano in anos if spool.page_count(ano)]
+    for ano in anos_salvos:
+        raw_archive.write_year("prefeitura", nome_visao, ano, (valores for _, valores in spool.iter_pages([ano])))
+    raw_archive.write_meta("prefeitura", nome_visao, csv_name, "Ano", True, anos_salvos)
+
+    pendentes = {ano: len(spool.missing_pages(ano)) for ano in anos if not spool.is_complete(ano)}
+    if pendentes:
+        print(f"Coleta incompleta, spool mantido para a próxima execução (páginas pendentes: {pendentes})")
+        # As próximas coletas da visão (depois desta) usam páginas menores
+        step_down(spool.parametros["ChaveModulo"], int(spool.parametros["QuantidadeRegistros"]))
+    else:
+        spool.clear()
+    return total
@@ -0,0 +1,171 @@
+# RU4590111 Daniel Elias de Souza
+
+# Índice da busca textual do dashboard: trigramas sobre os valores distintos de cada
+# coluna de texto, sem diferenciar maiúsculas nem acentos
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache
+
+# Colunas com mais valores distintos que isso (ex.: históricos) não são indexadas;
+# nelas a busca continua sendo uma varredura no DuckDB
+INDEX_MAX_DISTINCT = 200_000
+
+# Termo terminado em "*" só casa no início de uma palavra ("hosp*")
+PREFIX_PATTERN = "(^|[^0-9a-z]){}"
+
+_EMPTY = np.array([], dtype=np.int64)
+
+# (versão do conjunto de dados, coluna) -> ColumnIndex (ou None, se a coluna não é indexável)
+_indexes = LRUCache(maxsize=64)
+_lock = threading.Lock()
+
+
+def normalize(text):
+    """Minúsculas e sem acentos ("Saúde" -> "saude"), como strip_accents(lower(...)) no DuckDB"""
+    decomposed = unicodedata.normalize("NFKD", str(text).lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def parse_query(text):
+    """
+    Divide a busca em termos normalizados: todos precisam aparecer na linha (em
+    qualquer das colunas). Retorna lista de (termo, prefixo).
+    """
+    terms = []
+    for word in str(text).split():
+        prefix = word.endswith("*")
+        term = normalize(word.rstrip("*"))
+        if term and (term, prefix) not in terms:
+            terms.append((term, prefix))
+    return terms
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class ColumnIndex:
+    """
+    Índice de uma coluna: cada valor distinto é normalizado uma vez e seus trigramas
+    apontam para ele. Uma busca intersecta as listas dos trigramas do termo e só
+    confere os candidatos; as linhas de cada valor ficam agrupadas para que os ids
+    de linha saiam sem varrer a coluna.
+    """
+
+    def __init__(self, codes, uniques):
+        self.values = [str(value) for value in uniques]
+        self.normalized = [normalize(value) for value in self.values]
+
+        postings = defaultdict(list)
+        for value_id, text in enumerate(self.normalized):
+            for gram in _trigrams(text):
+                postings[gram].append(value_id)
+        self.postings = {gram: np.array(ids, dtype=np.int64) for gram, ids in postings.items()}
+
+        # Linhas agrupadas por valor (códigos -1 = nulos ficam antes do início)
+        self._order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[self._order]
+        value_ids = np.arange(len(self.values))
+        self._starts = np.searchsorted(sorted_codes, value_ids, side="left")
+        self._ends = np.searchsorted(sorted_codes, value_ids, side="right")
+
+    def match(self, term, prefix=False):
+        """Ids dos valores distintos que contêm o termo (ou têm palavra começando por ele)"""
+        if len(term) >= 3:
+            lists = sorted((self.postings.get(gram, _EMPTY) for gram in _trigrams(term)), key=len)
+            candidates = lists[0]
+            for ids in lists[1:]:
+                if len(candidates) == 0:
+                    break
+                candidates = np.intersect1d(candidates, ids, assume_unique=True)
+        else:
+            # Termos curtos não têm trigrama: confere todos os valores distintos
+            candidates = range(len(self.values))
+
+        if prefix:
+            pattern = re.compile(PREFIX_PATTERN.format(re.escape(term)))
+            matched = [i for i in candidates if pattern.search(self.normalized[i])]
+        else:
+            matched = [i for i in candidates if term in self.normalized[i]]
+        return np.array(matched, dtype=np.int64)
+
+    def rows(self, value_ids):
+        """Posições (ordenadas) das linhas que têm algum dos valores"""
+        if len(value_ids) == 0:
+            return _EMPTY
+        rows = np.concatenate([self._order[self._starts[i]:self._ends[i]] for i in value_ids])
+        rows.sort()
+        return rows
+
+
+def column_index(dataset_key, df, column):
+    """Índice da coluna, construído na primeira busca e reaproveitado enquanto o arquivo não mudar"""
+    key = (dataset_key, column)
+    with _lock:
+        if key in _indexes:
+            return _indexes[key]
+
+    codes, uniques = pd.factorize(df[column])
+    index = ColumnIndex(codes, uniques) if len(uniques) <= INDEX_MAX_DISTINCT else None
+    with _lock:
+        _indexes[key] = index
+    return index
+
+
+def search_rows(dataset_key, df, query, columns):
+    """
+    Posições das linhas de df em que cada termo da busca aparece em alguma das
+    colunas. Colunas não indexáveis são varridas.
+    """
+    result = None
+    for term, prefix in parse_query(query):
+        found = []
+        for column in columns:
+            index = column_index(dataset_key, df, column)
+            if index is not None:
+                found.append(index.rows(index.match(term, prefix)))
+            else:
+                values = df[column].astype(str).map(normalize)
+                pattern = PREFIX_PATTERN.format(re.escape(term)) if prefix else term
+                mask = values.str.contains(pattern, regex=prefix) & df[column].notna()
+                found.append(np.flatnonzero(mask.to_numpy()))
+        rows = np.unique(np.concatenate(found)) if found else _EMPTY
+        result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+    return result if result is not None else np.arange(len(df))
+
+
+def register_matches(conn, relation, dataset_key, df, query, columns):
+    """
+    Registra no DuckDB a relação (termo, coluna, valor) com os valores distintos que
+    casam com cada termo da busca, usada por query_engine.build_where. Retorna as
+    colunas indexadas (as demais são filtradas por varredura).
+    """
+    indexed = []
+    matches = {"termo": [], "coluna": [], "valor": []}
+    for column in columns:
+        index = column_index(dataset_key, df, column)
+        if index is None:
+            continue
+        indexed.append(column)
+        for term_id, (term, prefix) in enumerate(parse_query(query)):
+            values = [index.values[i] for i in index.match(term, prefix)]
+            matches["termo"].extend([term_id] * len(values))
+            matches["coluna"].extend([column] * len(values))
+            matches["valor"].extend(values)
+
+    conn.register(relation, pd.DataFrame({
+        "termo": pd.Series(matches["termo"], dtype="int64"),
+        "coluna": pd.Series(matches["coluna"], dtype="object"),
+        "valor": pd.Series(matches["valor"], dtype="object"),
+    }))
+    return indexed
+
+
+def clear_cache():
+    with _lock:
+        _indexes.clear()
@@ -0,0 +1,482 @@
+# RU4590111 Daniel Elias de Souza
+
+# Armazenamento dos conjuntos de dados: CSV (legível) + Parquet tipado + manifesto
+import json
+import os
+import threading
+from datetime import datetime
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from config import DATA_DIR
+from query_engine import quote_identifier
+from schemas import (PORTAL_DATE_FORMAT, apply_schema, convert_field, get_long_format, get_rollup_spec,
+                     get_schema, strip_text)
+from utils import convert_brazilian_currency_series, convert_numeric_columns
+
+MANIFEST_FILE = "manifest.json"
+
+# Granularidade dos agregados por período -> unidade do date_trunc do DuckDB
+ROLLUP_GRANULARITIES = {"mensal": "month", "trimestral": "quarter"}
+
+# Linhas por row group no formato longo: ordenado por (Ano, Mês), o mínimo e o máximo
+# de cada row group deixam o DuckDB pular os que não têm o período consultado
+LONG_ROW_GROUP_ROWS = 1_024
+# Linhas lidas do DuckDB por bloco ao gravar o formato longo (múltiplo de LONG_ROW_GROUP_ROWS)
+LONG_BATCH_ROWS = 64 * LONG_ROW_GROUP_ROWS
+
+# Colunas de texto com poucos valores distintos viram categóricas (dicionário no Parquet)
+CATEGORY_MAX_RATIO = 0.5
+
+_manifest_lock = threading.Lock()
+
+
+def parquet_name(csv_name):
+    """Nome do arquivo Parquet correspondente a um CSV de DATA_DIR (um .parquet fica como está)"""
+    return os.path.splitext(csv_name)[0] + ".parquet"
+
+
+def rollup_name(csv_name, granularidade):
+    """Nome do Parquet com os agregados de um conjunto de dados ("..._dados__mensal.parquet")"""
+    return os.path.splitext(csv_name)[0] + f"__{granularidade}.parquet"
+
+
+def convert_date_columns(df):
+    """Converte colunas de data do portal ("dd/mm/aaaa hh:mm") para datetime"""
+    df_converted = df.copy()
+    for col in df_converted.columns:
+        if df_converted[col].dtype == 'object' and col.lower().startswith('data'):
+            parsed = pd.to_datetime(df_converted[col], format=PORTAL_DATE_FORMAT, errors='coerce')
+            # Mesma regra das colunas monetárias: pelo menos 80% convertidos
+            if len(parsed) > 0 and parsed.notna().sum() / len(parsed) > 0.8:
+                df_converted[col] = parsed
+    return df_converted
+
+
+def convert_categorical_columns(df, max_ratio=CATEGORY_MAX_RATIO):
+    """Tira os espaços de preenchimento das colunas de texto e converte as repetitivas para category"""
+    df_converted = df.copy()
+    for col in df_converted.columns:
+        if df_converted[col].dtype == 'object' and len(df_converted) > 0:
+            df_converted[col] = strip_text(df_converted[col])
+            if df_converted[col].nunique() / len(df_converted) <= max_ratio:
+                df_converted[col] = df_converted[col].astype('category')
+    return df_converted
+
+
+def to_typed_frame(df, schema=None):
+    """
+    Aplica os tipos finais (float64, datetime, category) a um DataFrame já renomeado:
+    os do esquema, se o conjunto de dados tiver um; senão, os deduzidos dos valores.
+    """
+    if schema is not None:
+        return apply_schema(df, schema)
+    df_typed = convert_numeric_columns(df)
+    df_typed = convert_date_columns(df_typed)
+    return convert_categorical_columns(df_typed)
+
+
+def memory_usage(df):
+    """Memória ocupada pelo DataFrame em bytes (contando o conteúdo dos textos)"""
+    return int(df.memory_usage(index=False, deep=True).sum())
+
+
+def _report_memory(csv_name, before, after):
+    reduction = (1 - after / before) * 100 if before else 0
+    print(f"Memória de {csv_name}: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB tipado ({reduction:.0f}% menor)")
+
+
+def read_manifest():
+    """Lê o manifesto dos conjuntos de dados salvos em DATA_DIR"""
+    path = os.path.join(DATA_DIR, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _update_manifest(csv_name, entry):
+    with _manifest_lock:
+        manifest = read_manifest()
+        manifest[csv_name] = entry
+        path = os.path.join(DATA_DIR, MANIFEST_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+
+def save_dataset(df, csv_name):
+    """
+    Salva o conjunto de dados em DATA_DIR como CSV (mesmo formato de antes) e como
+    Parquet tipado, registrando ambos no manifesto. Retorna o caminho do CSV.
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    csv_path = os.path.join(DATA_DIR, csv_name)
+    df.to_csv(csv_path, index=False, encoding="utf-8")
+
+    write_parquet(df, csv_name)
+    return csv_path
+
+
+def write_long_format(csv_name):
+    """
+    Grava o formato longo derivado do conjunto de dados, se houver, a partir do Parquet
+    já salvo; retorna o nome dele. As colunas de mês e fase da tabela larga viram
+    linhas com "Mês", "Fase" e "Valor" (UNPIVOT no DuckDB, que lê o Parquet em fluxo);
+    as demais colunas do esquema se repetem e valores nulos não geram linha. O
+    resultado, ordenado por (Ano, Mês), é gravado em blocos, sem carregar o conjunto
+    inteiro em memória.
+    """
+    long_format = get_long_format(csv_name)
+    parquet_path = os.path.join(DATA_DIR, parquet_name(csv_name))
+    if long_format is None or not os.path.exists(parquet_path):
+        return None
+    long_name, columns = long_format
+    schema = get_schema(long_name)
+    available = pq.read_schema(parquet_path).names
+    value_columns = [col for col in columns if col in available]
+    id_columns = [f["nome"] for f in schema if f["nome"] in available]
+    if not value_columns:
+        return None
+
+    # Coluna larga -> (mês, fase); "ordem" mantém a ordem das colunas dentro do mesmo mês
+    mapping = pa.table({
+        "coluna": value_columns,
+        "ordem": list(range(len(value_columns))),
+        "Mês": [columns[col][0] for col in value_columns],
+        "Fase": [columns[col][1] for col in value_columns],
+    })
+    derived = {"Mês": 'c."Mês"', "Fase": 'c."Fase"', "Valor": 'u."Valor"'}
+    select = ", ".join(
+        f'u.{quote_identifier(f["nome"])}' if f["nome"] in id_columns else derived[f["nome"]]
+        for f in schema if f["nome"] in id_columns or f["nome"] in derived
+    )
+    source_columns = ", ".join(quote_identifier(col) for col in id_columns + value_columns)
+    source = parquet_path.replace("'", "''")
+
+    with duckdb.connect() as conn:
+        conn.register("colunas", mapping)
+        reader = conn.execute(f"""
+            SELECT {select}
+            FROM (
+                UNPIVOT (
+                    SELECT {source_columns}, file_row_number
+                    FROM read_parquet('{source}', file_row_number = true)
+                )
+                ON {", ".join(quote_identifier(col) for col in value_columns)}
+                INTO NAME coluna VALUE "Valor"
+            ) u
+            JOIN colunas c USING (coluna)
+            ORDER BY u."Ano", c."Mês", c.ordem, u.file_row_number
+        """).fetch_record_batch(LONG_BATCH_ROWS)
+        write_parquet_chunks((batch.to_pandas() for batch in reader), long_name,
+                             row_group_size=LONG_ROW_GROUP_ROWS)
+    return long_name
+
+
+def write_parquet(df, csv_name, row_group_size=None):
+    """Grava a versão Parquet tipada de um DataFrame já renomeado e atualiza o manifesto"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    typed = to_typed_frame(df, get_schema(csv_name))
+    memory_before, memory_after = memory_usage(df), memory_usage(typed)
+    _report_memory(csv_name, memory_before, memory_after)
+    parquet_path = os.path.join(DATA_DIR, parquet_name(csv_name))
+    tmp_path = parquet_path + ".tmp"
+    typed.to_parquet(tmp_path, engine="pyarrow", index=False, compression="zstd",
+                     row_group_size=row_group_size)
+    os.replace(tmp_path, parquet_path)
+    _write_derived(csv_name, len(typed), {col: str(dtype) for col, dtype in typed.dtypes.items()},
+                   memory_before, memory_after)
+    return parquet_path
+
+
+def _write_derived(csv_name, linhas, colunas, memory_before, memory_after):
+    """
+    Passo comum a write_parquet e write_parquet_chunks depois de gravar o Parquet:
+    agregados por período e formato longo (ambos lidos do Parquet pelo DuckDB) e
+    entrada do manifesto
+    """
+    rollups = write_rollups(csv_name)
+    long_name = write_long_format(csv_name)
+    _update_manifest(csv_name, {
+        # Conjuntos só em Parquet (formato longo) não têm CSV
+        "csv": csv_name if csv_name.endswith(".csv") else None,
+        "parquet": parquet_name(csv_name),
+        "linhas": linhas,
+        "colunas": colunas,
+        "tamanho_parquet": os.path.getsize(os.path.join(DATA_DIR, parquet_name(csv_name))),
+        "memoria_bruta": memory_before,
+        "memoria_tipada": memory_after,
+        "agregados": rollups,
+        "formato_longo": long_name,
+        "atualizado_em": datetime.now().isoformat(timespec="seconds"),
+    })
+
+
+def _arrow_type(dtype):
+    """Tipo Arrow usado no Parquet para um dtype do pandas"""
+    if isinstance(dtype, pd.CategoricalDtype):
+        return pa.dictionary(pa.int32(), pa.string())
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return pa.timestamp("ns")
+    if pd.api.types.is_bool_dtype(dtype):
+        return pa.bool_()
+    if pd.api.types.is_integer_dtype(dtype):
+        return pa.int64()
+    if pd.api.types.is_float_dtype(dtype):
+        return pa.float64()
+    return pa.string()
+
+
+def _declared_schema(columns, dataset_schema):
+    """
+    Schema Arrow do Parquet gravado em blocos, tirado do esquema do conjunto de dados
+    (os dtypes que apply_schema dá em save_dataset), e não dos valores de um bloco.
+    Colunas fora do esquema são gravadas como texto. Os metadados do pandas vão junto,
+    para a leitura devolver os mesmos dtypes. Retorna (schema, coluna -> dtype).
+    """
+    fields = {f["nome"]: f for f in dataset_schema}
+    dtypes = {col: fields[col]["dtype"] if col in fields else "object" for col in columns}
+    empty = pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in dtypes.items()})
+    metadata = pa.Schema.from_pandas(empty, preserve_index=False).metadata
+    schema = pa.schema([(col, _arrow_type(empty[col].dtype)) for col in columns], metadata=metadata)
+    return schema, {col: str(empty[col].dtype) for col in columns}
+
+
+def _unify_dictionaries(path, categories):
+    """
+    Regrava o Parquet com o mesmo dicionário, ordenado, em todos os row groups de cada
+    coluna categórica (categories: coluna -> valores). Na leitura o pandas junta os
+    dicionários dos row groups na ordem em que aparecem; assim as categorias ficam
+    ordenadas como em save_dataset.
+    """
+    dictionaries = {col: pa.array(sorted(values), pa.string()) for col, values in categories.items()}
+    tmp_path = path + ".dict"
+    with pq.ParquetFile(path) as source:
+        if source.num_row_groups <= 1 or not dictionaries:
+            return
+        with pq.ParquetWriter(tmp_path, source.schema_arrow, compression="zstd") as writer:
+            for i in range(source.num_row_groups):
+                table = source.read_row_group(i)
+                for col, dictionary in dictionaries.items():
+                    index = table.schema.get_field_index(col)
+                    values = table.column(index).combine_chunks().cast(pa.string())
+                    indices = pc.index_in(values, value_set=dictionary).cast(pa.int32())
+                    table = table.set_column(index, table.schema.field(index),
+                                             pa.DictionaryArray.from_arrays(indices, dictionary))
+                writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def _apply_types(chunk, schema, fields=None):
+    """
+    Converte um bloco para o schema do Parquet. Colunas com campo no esquema do
+    conjunto de dados (fields: nome -> campo) usam a conversão dele.
+    """
+    fields = fields or {}
+    typed = pd.DataFrame(index=chunk.index)
+    for field in schema:
+        col = chunk[field.name]
+        if field.name in fields:
+            typed[field.name] = convert_field(col, fields[field.name])
+        elif fields:
+            # Fora do esquema: passa sem tratamento, como em apply_schema (gravada como texto)
+            typed[field.name] = col.where(col.isna(), col.astype(str)).astype("object")
+        elif pa.types.is_floating(field.type):
+            if col.dtype == 'object':
+                typed[field.name] = convert_brazilian_currency_series(col)[0]
+            else:
+                typed[field.name] = pd.to_numeric(col, errors='coerce')
+        elif pa.types.is_integer(field.type):
+            typed[field.name] = pd.to_numeric(col, errors='coerce').astype('Int64')
+        elif pa.types.is_timestamp(field.type):
+            typed[field.name] = pd.to_datetime(col, format=PORTAL_DATE_FORMAT, errors='coerce')
+        elif pa.types.is_boolean(field.type):
+            typed[field.name] = col.astype('boolean')
+        else:
+            typed[field.name] = strip_text(col)
+    return typed
+
+
+def write_parquet_chunks(chunks, csv_name, row_group_size=None):
+    """
+    Versão em blocos de write_parquet: cada bloco (DataFrame já renomeado, sempre com
+    as mesmas colunas) é convertido e acrescentado ao Parquet, e o manifesto é
+    atualizado no fim. Os tipos vêm do esquema do conjunto de dados (os mesmos de
+    write_parquet); só conjuntos sem esquema usam os deduzidos do primeiro bloco.
+    Retorna o total de linhas (0 sem nenhum bloco, e nada é gravado).
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    parquet_path = os.path.join(DATA_DIR, parquet_name(csv_name))
+    tmp_parquet = parquet_path + ".tmp"
+
+    dataset_schema = get_schema(csv_name)
+    fields = {f["nome"]: f for f in dataset_schema or []}
+    writer = None
+    schema = None
+    categories = {}
+    total = 0
+    memory_before = memory_after = 0
+    try:
+        for chunk in chunks:
+            if writer is None:
+                if dataset_schema is not None:
+                    schema, column_types = _declared_schema(list(chunk.columns), dataset_schema)
+                else:
+                    typed = to_typed_frame(chunk)
+                    column_types = {col: str(dtype) for col, dtype in typed.dtypes.items()}
+                    schema = pa.schema([(col, _arrow_type(dtype)) for col, dtype in typed.dtypes.items()])
+                categories = {field.name: set() for field in schema if pa.types.is_dictionary(field.type)}
+                writer = pq.ParquetWriter(tmp_parquet, schema, compression="zstd")
+            typed = _apply_types(chunk, schema, fields)
+            for col, values in categories.items():
+                values.update(typed[col].astype("category").cat.categories)
+            writer.write_table(pa.Table.from_pandas(typed, schema=schema, preserve_index=False),
+                               row_group_size=row_group_size)
+            total += len(chunk)
+            memory_before += memory_usage(chunk)
+            memory_after += memory_usage(typed)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        return 0
+
+    _unify_dictionaries(tmp_parquet, categories)
+    os.replace(tmp_parquet, parquet_path)
+    _report_memory(csv_name, memory_before, memory_after)
+    _write_derived(csv_name, total, column_types, memory_before, memory_after)
+    return total
+
+
+def save_dataset_chunks(chunks, csv_name):
+    """
+    Versão em blocos de save_dataset, para conjuntos de dados que não cabem
+    confortavelmente em memória: cada bloco (DataFrame já renomeado, sempre com as
+    mesmas colunas) é acrescentado ao CSV e ao Parquet (write_parquet_chunks).
+    Retorna (caminho do CSV, total de linhas).
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    csv_path = os.path.join(DATA_DIR, csv_name)
+    tmp_csv = csv_path + ".tmp"
+    written = []
+
+    def to_csv(chunks):
+        for chunk in chunks:
+            chunk.to_csv(tmp_csv, mode="a" if written else "w", header=not written,
+                         index=False, encoding="utf-8")
+            written.append(len(chunk))
+            yield chunk
+
+    # O CSV só substitui o anterior se houver ao menos um bloco; o temporário foi escrito
+    # antes do Parquet, então o Parquet continua não mais antigo que ele (resolve_dataset_path)
+    total = write_parquet_chunks(to_csv(chunks), csv_name)
+    if not written:
+        # Nenhuma linha: mantém o comportamento de save_dataset com um DataFrame vazio
+        return save_dataset(pd.DataFrame(), csv_name), 0
+    os.replace(tmp_csv, csv_path)
+    return csv_path, total
+
+
+def write_rollups(csv_name):
+    """
+    Grava, a partir do Parquet já salvo, os agregados mensal e trimestral do conjunto
+    de dados (soma e contagem de cada valor por período e dimensões). O DuckDB lê o
+    Parquet em fluxo, sem carregar o conjunto inteiro. Retorna granularidade -> arquivo.
+    """
+    spec = get_rollup_spec(csv_name)
+    parquet_path = os.path.join(DATA_DIR, parquet_name(csv_name))
+    if spec is None or not os.path.exists(parquet_path):
+        return {}
+    columns = pq.read_schema(parquet_path).names
+    if spec["data"] not in columns:
+        return {}
+
+    data = quote_identifier(spec["data"])
+    dimensions = [quote_identifier(col) for col in spec["dimensoes"] if col in columns]
+    values = []
+    for col in spec["valores"]:
+        if col in columns:
+            values.append(f"sum({quote_identifier(col)}) AS {quote_identifier(col + '__soma')}")
+            values.append(f"count({quote_identifier(col)}) AS {quote_identifier(col + '__contagem')}")
+    source = parquet_path.replace("'", "''")
+
+    rollups = {}
+    with duckdb.connect() as conn:
+        for granularidade, unit in ROLLUP_GRANULARITIES.items():
+            name = rollup_name(csv_name, granularidade)
+            path = os.path.join(DATA_DIR, name)
+            tmp_path = (path + ".tmp").replace("'", "''")
+            select = ", ".join([f"date_trunc('{unit}', {data}) AS \"Período\""] + dimensions
+                               + ['count(*) AS "Quantidade"'] + values)
+            conn.execute(f"""
+                COPY (
+                    SELECT {select}
+                    FROM read_parquet('{source}')
+                    WHERE {data} IS NOT NULL
+                    GROUP BY ALL
+                    ORDER BY ALL
+                ) TO '{tmp_path}' (FORMAT PARQUET, COMPRESSION ZSTD)
+            """)
+            os.replace(path + ".tmp", path)
+            rollups[granularidade] = name
+    print(f"Agregados salvos: {', '.join(rollups.values())}")
+    return rollups
+
+
+def resolve_rollup_path(csv_name, granularidade):
+    """
+    Agregado de um conjunto de dados, se existir e for da mesma versão do dado usado
+    pelo dashboard (não mais antigo que o Parquet, que por sua vez é o arquivo em uso)
+    """
+    dataset_path = resolve_dataset_path(csv_name)
+    path = os.path.join(DATA_DIR, rollup_name(csv_name, granularidade))
+    if dataset_path is None or not dataset_path.endswith(".parquet") or not os.path.exists(path):
+        return None
+    if os.path.getmtime(path) < os.path.getmtime(dataset_path):
+        return None
+    return path
+
+
+def read_parquet(path, columns=None):
+    """Lê um Parquet com memory-map (as páginas são carregadas sob demanda)"""
+    return pd.read_parquet(path, engine="pyarrow", columns=columns, memory_map=True)
+
+
+def resolve_dataset_path(csv_name):
+    """
+    Retorna o arquivo a usar para um conjunto de dados: o Parquet, se existir e não for
+    mais antigo que o CSV; senão o CSV; None se nenhum existir. Conjuntos gravados só
+    em Parquet (registrados pelo nome do .parquet) não têm CSV de reserva.
+    """
+    parquet_path = os.path.join(DATA_DIR, parquet_name(csv_name))
+    if csv_name.endswith(".parquet"):
+        return parquet_path if os.path.exists(parquet_path) else None
+    csv_path = os.path.join(DATA_DIR, csv_name)
+    if os.path.exists(parquet_path):
+        if not os.path.exists(csv_path) or os.path.getmtime(parquet_path) >= os.path.getmtime(csv_path):
+            return parquet_path
+    if os.path.exists(csv_path):
+        return csv_path
+    return None
+
+
+def convert_existing_csvs():
+    """Gera os Parquet (e o manifesto) para os CSVs já existentes em DATA_DIR"""
+    for name in sorted(os.listdir(DATA_DIR)):
+        if name.endswith(".csv"):
+            # Lido como texto, como chega da coleta (sem deduzir números: CNPJ etc.
+            # perderiam os zeros à esquerda); write_parquet aplica o esquema
+            df = pd.read_csv(os.path.join(DATA_DIR, name), dtype=str)
+            path = write_parquet(df, name)
+            print(f"Parquet salvo em: {path} ({len(df)} linhas)")
+
+
+if __name__ == "__main__":
+    convert_existing_csvs()
@@ -1,9 +1,15 @@
 # RU4590111 Daniel Elias de Souza
 
 # Funções utilitárias para processamento de dados
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 import re
 
+# Valores que o portal usa para indicar ausência de valor
+CURRENCY_NULL_VALUES = ['-', 'N/A', 'null', 'None']
+
 def convert_brazilian_currency(value):
     """Converte valor monetário brasileiro (string) para float"""
     if pd.isna(value) or value == '':
@@ -16,7 +22,7 @@ def convert_brazilian_currency(value):
     value_str = re.sub(r'[R$\s]', '', value_str)
 
     # Trata casos especiais
-    if value_str in ['-', 'N/A', 'null', 'None']:
+    if value_str in CURRENCY_NULL_VALUES:
         return None
 
     try:
@@ -26,6 +32,57 @@ def convert_brazilian_currency(value):
     except (ValueError, AttributeError):
         return None
 
+# Símbolos de moeda, pontos de milhar e os espaços considerados por \s do Python, em sintaxe RE2 (pyarrow)
+_ARROW_CURRENCY_STRIP = (r'[R$.\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0\x{1680}\x{2000}-\x{200a}'
+                         r'\x{2028}\x{2029}\x{202f}\x{205f}\x{3000}]')
+# Números simples que o pyarrow converte exatamente como float(); o resto passa pelo Python
+_ARROW_SIMPLE_NUMBER = r'^-?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$'
+
+def _parse_float(value_str):
+    """float() que retorna None em vez de lançar exceção"""
+    try:
+        return float(value_str)
+    except (ValueError, AttributeError):
+        return None
+
+def convert_brazilian_currency_series(series):
+    """
+    Versão vetorizada de convert_brazilian_currency para uma coluna inteira.
+    Retorna (valores float64, máscara de conversões válidas), com o mesmo
+    resultado da função escalar aplicada célula a célula.
+    """
+    try:
+        text = pa.array(series, type=pa.string(), from_pandas=True)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        # Coluna mista (ex.: números e textos): converte tudo para texto como a versão escalar
+        text = pa.array(series.astype(str).where(series.notna()), type=pa.string(), from_pandas=True)
+
+    # Remove símbolos de moeda, espaços e pontos de milhar numa só passada; vírgula vira ponto
+    cleaned = pc.replace_substring_regex(text, _ARROW_CURRENCY_STRIP, '')
+    cleaned = pc.replace_substring(cleaned, ',', '.')
+
+    values = np.full(len(series), np.nan)
+    valid = np.zeros(len(series), dtype=bool)
+
+    simple = pc.fill_null(pc.match_substring_regex(cleaned, _ARROW_SIMPLE_NUMBER), False)
+    simple_mask = simple.to_numpy(zero_copy_only=False)
+    values[simple_mask] = pc.cast(pc.filter(cleaned, simple), pa.float64()).to_numpy()
+    valid[simple_mask] = True
+
+    # Casos raros (ex.: "+7", "1_000", "nan") seguem a regra do float() do Python
+    special = pc.or_(pc.is_null(cleaned), pc.is_in(cleaned, value_set=pa.array(CURRENCY_NULL_VALUES + [''])))
+    rest = ~simple_mask & ~special.to_numpy(zero_copy_only=False)
+    if rest.any():
+        rest_idx = np.flatnonzero(rest)
+        rest_values = pc.take(cleaned, pa.array(rest_idx)).to_pylist()
+        for idx, value_str in zip(rest_idx, rest_values):
+            parsed = _parse_float(value_str)
+            if parsed is not None:
+                values[idx] = parsed
+                valid[idx] = True
+
+    return pd.Series(values, index=series.index), pd.Series(valid, index=series.index)
+
 def convert_numeric_columns(df):
     """Converte colunas que parecem conter valores numéricos"""
     df_converted = df.copy()
@@ -35,120 +92,16 @@ def convert_numeric_columns(df):
 
     for col in df_converted.columns:
         # Verifica se é uma coluna de texto
-        if df_converted[col].dtype == 'object':
+        if df_converted[col].dtype == 'object' and len(df_converted) > 0:
             col_lower = col.lower()
 
             # Verifica se o nome da coluna sugere valor monetário
             if any(keyword in col_lower for keyword in monetary_keywords):
-                # Tenta converter os valores
-                converted_values = []
-                for val in df_converted[col]:
-                    converted = convert_brazilian_currency(val)
-                    converted_values.append(converted)
+                # Converte a coluna inteira de uma vez
+                converted_values, valid = convert_brazilian_currency_series(df_converted[col])
 
                 # Se conseguiu converter pelo menos 80% dos valores, converte a coluna
-                valid_conversions = sum(1 for v in converted_values if v is not None)
-                if valid_conversions / len(converted_values) > 0.8:
+                if valid.sum() / len(valid) > 0.8:
                     df_converted[col] = converted_values
-                    df_converted[col] = pd.to_numeric(df_converted[col], errors='coerce')
 
     return df_converted
-
-def rename_columns(df, dataset_type):
-    """Renomeia colunas para português mais compreensível"""
-    if dataset_type == "camara":
-        column_mapping = {
-            'natureza': 'Natureza da Despesa',
-            'elemento': 'Elemento',
-            'vl_previsto': 'Valor Previsto',
-            'vl_total_emp': 'Total Empenhado',
-            'vl_total_liq': 'Total Liquidado',
-            'vl_total_pag': 'Total Pago',
-            'vl_jan_emp': 'Jan Empenhado',
-            'vl_fev_emp': 'Fev Empenhado',
-            'vl_mar_emp': 'Mar Empenhado',
-            'vl_abr_emp': 'Abr Empenhado',
-            'vl_mai_emp': 'Mai Empenhado',
-            'vl_jun_emp': 'Jun Empenhado',
-            'vl_jul_emp': 'Jul Empenhado',
-            'vl_ago_emp': 'Ago Empenhado',
-            'vl_set_emp': 'Set Empenhado',
-            'vl_out_emp': 'Out Empenhado',
-            'vl_nov_emp': 'Nov Empenhado',
-            'vl_dez_emp': 'Dez Empenhado',
-            'vl_jan_liq': 'Jan Liquidado',
-            'vl_fev_liq': 'Fev Liquidado',
-            'vl_mar_liq': 'Mar Liquidado',
-            'vl_abr_liq': 'Abr Liquidado',
-            'vl_mai_liq': 'Mai Liquidado',
-            'vl_jun_liq': 'Jun Liquidado',
-            'vl_jul_liq': 'Jul Liquidado',
-            'vl_ago_liq': 'Ago Liquidado',
-            'vl_set_liq': 'Set Liquidado',
-            'vl_out_liq': 'Out Liquidado',
-            'vl_nov_liq': 'Nov Liquidado',
-            'vl_dez_liq': 'Dez Liquidado',
-            'vl_jan_pag': 'Jan Pago',
-            'vl_fev_pag': 'Fev Pago',
-            'vl_mar_pag': 'Mar Pago',
-            'vl_abr_pag': 'Abr Pago',
-            'vl_mai_pag': 'Mai Pago',
-            'vl_jun_pag': 'Jun Pago',
-            'vl_jul_pag': 'Jul Pago',
-            'vl_ago_pag': 'Ago Pago',
-            'vl_set_pag': 'Set Pago',
-            'vl_out_pag': 'Out Pago',
-            'vl_nov_pag': 'Nov Pago',
-            'vl_dez_pag': 'Dez Pago',
-            'ano': 'Ano'
-        }
-    elif dataset_type in ["covid", "passagens", "investimentos", "receita", "emendas"]:
-        column_mapping = {
-            'NroEmpenho': 'Número do Empenho',
-            'UG': 'Unidade Gestora',
-            'Modalidade': 'Modalidade',
-            'NomeFornecedor': 'Nome do Fornecedor',
-            'DataEmp': 'Data do Empenho',
-            'ValorEmpenhado': 'Valor Empenhado',
-            'ValorLiquidado': 'Valor Liquidado',
-            'ValorPago': 'Valor Pago',
-            'Programa': 'Programa',
-            'UnidadeOrcamentaria': 'Unidade Orçamentária',
-            'ID': 'ID',
-            'Id': 'ID Secundário',
-            'Ano': 'Ano',
-            'DataMovEmp': 'Data do Movimento',
-            'TipEmpenho': 'Tipo de Empenho',
-            'CNPJ': 'CNPJ',
-            'Evento': 'Evento',
-            'Vinculo': 'Vínculo',
-            'FonteRecurso': 'Fonte de Recurso',
-            'Categoria': 'Categoria',
-            'Elemento': 'Elemento',
-            'BemouServico': 'Bem ou Serviço',
-            'Itens': 'Itens',
-            'Liquidacoes': 'Liquidações',
-            'Documentos': 'Documentos',
-            'Pagamentos': 'Pagamentos',
-            # Campos específicos para Receita Analítica
-            'UnidadeGestora': 'Unidade Gestora',
-            'FonteRecursos': 'Fonte de Recursos',
-            'NaturezaReceita': 'Natureza da Receita',
-            'ValorArrecadado': 'Valor Arrecadado',
-            'ValorPrevisto': 'Valor Previsto',
-            'PercentualArrecadacao': 'Percentual de Arrecadação',
-            # Campos específicos para Emendas Parlamentares
-            'Parlamentar': 'Parlamentar',
-            'Partido': 'Partido',
-            'Emenda': 'Número da Emenda',
-            'ValorEmenda': 'Valor da Emenda',
-            'Localidade': 'Localidade',
-            'Objetivo': 'Objetivo',
-            'StatusEmenda': 'Status da Emenda'
-        }
-    else:
-        return df  # Retorna sem alterações se não reconhecido
-
-    # Aplica o mapeamento apenas para colunas que existem
-    df_renamed = df.rename(columns={k: v for k, v in column_mapping.items() if k in df.columns})
-    return df_renamed
\ No newline at end of file